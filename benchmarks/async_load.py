@@ -0,0 +1,131 @@
+"""
+Load test of the async detail view: one uvicorn worker serving the detail page for Pokemon that
+are not in the DB yet, against a local PokeAPI stub that answers every request after a fixed delay.
+
+Each request is a cold sync: the Pokemon and its species are fetched together, then the evolution
+chain, so one request takes about two upstream delays. With the event loop free while those are
+in flight, throughput should grow with the number of concurrent clients instead of staying at
+one request per two delays, as it would for a single synchronous worker thread.
+
+    python -m benchmarks.async_load --delay 0.1 --concurrency 1 4 16 64
+
+Runs against a throwaway database and caches (benchmarks/settings.py); needs uvicorn.
+"""
+import argparse
+import asyncio
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import httpx
+
+from .stub_pokeapi import StubPokeAPIServer
+
+REPO_DIR = Path(__file__).resolve().parent.parent
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def _wait_for_port(port, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=0.5):
+                return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"The server did not start listening on port {port} within {timeout}s.")
+
+
+def _percentile(values, percent):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * percent / 100))]
+
+
+async def _run_level(base_url, concurrency, request_count, label):
+    """request_count detail requests for fresh names, at most `concurrency` at a time."""
+    latencies, errors = [], 0
+    semaphore = asyncio.Semaphore(concurrency)
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=120) as client:
+        async def one(number):
+            nonlocal errors
+            async with semaphore:
+                started_at = time.perf_counter()
+                response = await client.get(f'/pokemon/pokemon/{label}-{number}/') # reverse('pokemon_detail')
+                latencies.append(time.perf_counter() - started_at)
+                if response.status_code != 200 or b'Could not find' in response.content:
+                    errors += 1
+
+        started_at = time.perf_counter()
+        await asyncio.gather(*(one(number) for number in range(request_count)))
+        elapsed = time.perf_counter() - started_at
+    return {
+        'concurrency': concurrency,
+        'requests': request_count,
+        'throughput': request_count / elapsed,
+        'p50_ms': statistics.median(latencies) * 1000,
+        'p95_ms': _percentile(latencies, 95) * 1000,
+        'errors': errors,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--delay', type=float, default=0.1, help="Seconds the stub PokeAPI waits before each answer.")
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 4, 16, 64])
+    parser.add_argument('--requests-per-level', type=int, default=128)
+    parser.add_argument('--workers', type=int, default=1, help="uvicorn worker processes, fixed for the whole run.")
+    args = parser.parse_args(argv)
+
+    stub = StubPokeAPIServer(delay=args.delay).start()
+    with tempfile.TemporaryDirectory(prefix='pokedex-bench-') as temp_dir:
+        env = dict(
+            os.environ,
+            DJANGO_SETTINGS_MODULE='benchmarks.settings',
+            POKEDEX_BENCH_DB=str(Path(temp_dir) / 'db.sqlite3'),
+            POKEAPI_BASE_URL=stub.base_url,
+            POKEAPI_CACHE_DIR=str(Path(temp_dir) / 'pokeapi_cache'),
+            POKEDEX_LOCK_DIR=str(Path(temp_dir) / 'locks'),
+            POKEDEX_LOG_LEVEL=os.environ.get('POKEDEX_LOG_LEVEL', 'WARNING'),
+            # The upstream connection pool is sized from this; the default of 8 would cap the scaling
+            POKEAPI_MAX_CONCURRENCY=str(max(args.concurrency) * 2),
+        )
+        subprocess.run([sys.executable, 'manage.py', 'migrate', '--noinput', '-v', '0'], cwd=REPO_DIR, env=env, check=True)
+
+        port = _free_port()
+        server = subprocess.Popen(
+            [sys.executable, '-m', 'uvicorn', 'pokedex_project.asgi:application', '--host', '127.0.0.1',
+             '--port', str(port), '--workers', str(args.workers), '--log-level', 'warning'],
+            cwd=REPO_DIR, env=env, stdout=subprocess.DEVNULL,
+        )
+        try:
+            _wait_for_port(port)
+            base_url = f'http://127.0.0.1:{port}'
+            asyncio.run(_run_level(base_url, 1, 1, 'warmup')) # Imports, URLconf, templates
+            print(f"uvicorn, {args.workers} worker(s); stub PokeAPI delay {args.delay * 1000:.0f} ms; cold detail pages")
+            print(f"{'concurrency':>11} {'requests':>8} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'upstream':>8} {'errors':>6}")
+            for concurrency in args.concurrency:
+                upstream_before = stub.requests
+                result = asyncio.run(_run_level(base_url, concurrency, args.requests_per_level, f'c{concurrency}'))
+                print(
+                    f"{result['concurrency']:>11} {result['requests']:>8} {result['throughput']:>8.1f} "
+                    f"{result['p50_ms']:>8.0f} {result['p95_ms']:>8.0f} {stub.requests - upstream_before:>8} {result['errors']:>6}"
+                )
+        finally:
+            server.terminate()
+            server.wait(timeout=10)
+            stub.stop()
+
+
+if __name__ == '__main__':
+    main()
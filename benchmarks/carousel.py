@@ -0,0 +1,79 @@
+"""
+Benchmark of the home page carousel as the dex grows: picking 5 random Pokemon by loading every
+row (the previous approach) against carousel.py's in-process id list, plus the whole index view.
+
+    python -m benchmarks.carousel --sizes 150 1000 5000 10000 --repeat 50
+
+The sampler's cost should stay flat while the full-table pick grows with the row count. Runs
+in-process against a throwaway database (benchmarks/settings.py); rows are bulk-created.
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+
+def _timings(func, repeat):
+    func() # Warm: the sampler's first call builds its list
+    timings = []
+    for _ in range(repeat):
+        started_at = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - started_at) * 1000)
+    timings.sort()
+    return statistics.median(timings), timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+
+
+def run(sizes, repeat):
+    import django
+    django.setup()
+    from django.core.management import call_command
+    from django.test import Client
+
+    from pokedex_app.carousel import carousel_sampler
+    from pokedex_app.models import Pokemon
+
+    call_command('migrate', verbosity=0)
+    client = Client()
+
+    def full_table_pick():
+        return random.sample(list(Pokemon.objects.filter(sprite_url__isnull=False)), 5)
+
+    def index_view():
+        response = client.get('/')
+        assert response.status_code == 200, response.status_code
+
+    print(f"{'rows':>7} {'full table p50/p95 ms':>22} {'sampler p50/p95 ms':>20} {'index view p50/p95 ms':>23}")
+    row_count = 0
+    for size in sorted(sizes):
+        Pokemon.objects.bulk_create([
+            Pokemon(pokeapi_id=pokeapi_id, name=f'pokemon-{pokeapi_id}', sprite_url=f'https://example.com/{pokeapi_id}.png')
+            for pokeapi_id in range(row_count + 1, size + 1)
+        ], batch_size=500)
+        row_count = max(row_count, size)
+        carousel_sampler.mark_rebuild() # What signals.py does after a sync
+        columns = [_timings(full_table_pick, repeat), _timings(lambda: carousel_sampler.sample(5), repeat), _timings(index_view, repeat)]
+        print(f"{row_count:>7} " + ' '.join(f"{f'{p50:.2f} / {p95:.2f}':>{width}}" for (p50, p95), width in zip(columns, (22, 20, 23))))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[150, 1000, 5000, 10000])
+    parser.add_argument('--repeat', type=int, default=50)
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory(prefix='pokedex-bench-') as temp_dir:
+        os.environ.update(
+            DJANGO_SETTINGS_MODULE='benchmarks.settings',
+            POKEDEX_BENCH_DB=str(Path(temp_dir) / 'db.sqlite3'),
+            POKEDEX_SPRITE_DIR=str(Path(temp_dir) / 'sprites'),
+            POKEDEX_INLINE_SEEDING='0',
+        )
+        run(args.sizes, args.repeat)
+
+
+if __name__ == '__main__':
+    main()
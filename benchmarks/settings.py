@@ -0,0 +1,13 @@
+"""
+Settings for the benchmark runs: the project's settings with a throwaway database and caches,
+so a run neither reads nor pollutes db.sqlite3. The benchmark scripts fill in the environment.
+"""
+import os
+
+from pokedex_project.settings import * # noqa: F401,F403
+
+DEBUG = False # DEBUG records every query, which would skew the measurements
+ALLOWED_HOSTS = ['127.0.0.1', 'localhost', 'testserver'] # testserver: in-process runs with django.test.Client
+
+# Same engine and tuning as the project (POKEDEX_DB_BACKEND), on a throwaway file
+DATABASES = {'default': {**DATABASES['default'], 'NAME': os.environ['POKEDEX_BENCH_DB']}}
@@ -0,0 +1,259 @@
+"""
+A local stand-in for PokeAPI with a configurable delay (plus random jitter) and error rate per request.
+
+It serves a fixed dex of dex_size Pokemon, 'pokemon-1' to 'pokemon-<dex_size>', across a handful of
+types and abilities, in evolution chains of three; every resource the app and import_pokedex read
+is there: the /pokemon/, /pokemon-species/, /evolution-chain/, /type/ and /ability/ listings and
+entries, and a small PNG per sprite. Any other name is a Pokemon too: /pokemon/<name>/,
+/pokemon-species/<name>/ and /evolution-chain/<id>/ describe a single-stage species of that name,
+with an id handed out on first sight. With dex_size=0 the name list ('pokemon?limit=...') is
+empty, so every name is worth a lookup.
+
+A failed request (error_rate) answers 500 after the same delay, as an overloaded upstream would.
+"""
+import json
+import random
+import struct
+import threading
+import time
+import zlib
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+STAT_NAMES = ('hp', 'attack', 'defense', 'special-attack', 'special-defense', 'speed')
+TYPE_NAMES = ('normal', 'fire', 'water', 'grass', 'electric', 'psychic')
+ABILITY_NAMES = ('run-away', 'blaze', 'torrent', 'overgrow', 'static', 'synchronize')
+CHAIN_LENGTH = 3
+
+
+def _png(width=96, height=96):
+    """A transparent RGBA PNG, without Pillow."""
+    def chunk(kind, data):
+        return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data) & 0xffffffff)
+    rows = b''.join(b'\x00' + b'\x00' * 4 * width for _ in range(height))
+    return (
+        b'\x89PNG\r\n\x1a\n' + chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 6, 0, 0, 0))
+        + chunk(b'IDAT', zlib.compress(rows)) + chunk(b'IEND', b'')
+    )
+
+
+SPRITE_PNG = _png()
+
+
+class StubPokeAPIHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1' # Keep-alive, as with the real API
+    disable_nagle_algorithm = True # Headers and body go out in separate writes
+
+    def do_GET(self):
+        time.sleep(self.server.request_delay())
+        url = urlsplit(self.path)
+        parts = url.path.strip('/').split('/')[2:] # Drop 'api/v2'
+        self.server.count_request(parts[0] if parts else '')
+        if self.server.should_fail():
+            self._send(500, b'', 'text/plain')
+            return
+        if len(parts) == 2 and parts[0] == 'sprites':
+            self._send(200, SPRITE_PNG, 'image/png')
+            return
+        query = {name: values[0] for name, values in parse_qs(url.query).items()}
+        payload = self.server.payload(*parts, limit=query.get('limit'), offset=query.get('offset')) if 1 <= len(parts) <= 2 else None
+        if payload is None:
+            self._send(404, b'', 'text/plain')
+            return
+        self._send(200, json.dumps(payload).encode(), 'application/json')
+
+    def _send(self, status, body, content_type):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class StubPokeAPIServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024 # Load tests open many connections at once
+
+    def __init__(self, address=('127.0.0.1', 0), delay=0.1, jitter=0.0, error_rate=0.0, dex_size=0, seed=0):
+        super().__init__(address, StubPokeAPIHandler)
+        self.delay = delay
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.dex_size = dex_size
+        self.requests_by_resource = Counter()
+        self.errors = 0
+        self._extra_ids = {} # Made-up names outside the fixed dex -> id
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    @property
+    def base_url(self):
+        return f'http://127.0.0.1:{self.server_port}/api/v2/'
+
+    @property
+    def requests(self):
+        with self._lock:
+            return sum(self.requests_by_resource.values())
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, kwargs={'poll_interval': 0.05}, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def count_request(self, resource):
+        with self._lock:
+            self.requests_by_resource[resource] += 1
+
+    def request_delay(self):
+        with self._lock:
+            return self.delay + (self._random.uniform(0, self.jitter) if self.jitter else 0)
+
+    def should_fail(self):
+        with self._lock:
+            failed = self.error_rate > 0 and self._random.random() < self.error_rate
+            self.errors += failed
+            return failed
+
+    # -- the dex -------------------------------------------------------------
+
+    @staticmethod
+    def dex_name(pokeapi_id):
+        return f'pokemon-{pokeapi_id}'
+
+    def _dex_id(self, name):
+        """Id of a name of the fixed dex, else None."""
+        prefix, _, number = name.partition('-')
+        if prefix == 'pokemon' and number.isdigit() and 1 <= int(number) <= self.dex_size:
+            return int(number)
+        return None
+
+    def _id(self, name):
+        dex_id = self._dex_id(name)
+        if dex_id is not None:
+            return dex_id
+        with self._lock:
+            return self._extra_ids.setdefault(name, self.dex_size + len(self._extra_ids) + 1)
+
+    def _extra_name(self, pokeapi_id):
+        with self._lock:
+            return next((name for name, known_id in self._extra_ids.items() if known_id == pokeapi_id), None)
+
+    def _name(self, key):
+        """The Pokemon a /pokemon/ or /pokemon-species/ key (name or id) stands for, or None."""
+        if not key.isdigit():
+            return key
+        pokeapi_id = int(key)
+        return self.dex_name(pokeapi_id) if 1 <= pokeapi_id <= self.dex_size else self._extra_name(pokeapi_id)
+
+    def types_of(self, pokeapi_id):
+        if pokeapi_id > self.dex_size:
+            return ['normal']
+        first = TYPE_NAMES[pokeapi_id % len(TYPE_NAMES)]
+        # Every third Pokemon has a second type
+        return [first, TYPE_NAMES[(pokeapi_id + 1) % len(TYPE_NAMES)]] if pokeapi_id % 3 == 0 else [first]
+
+    def ability_of(self, pokeapi_id):
+        return 'run-away' if pokeapi_id > self.dex_size else ABILITY_NAMES[pokeapi_id % len(ABILITY_NAMES)]
+
+    def _chain_id(self, pokeapi_id):
+        """Dex chains are named after their first member; a made-up Pokemon is a chain of its own."""
+        if pokeapi_id > self.dex_size:
+            return pokeapi_id
+        return (pokeapi_id - 1) // CHAIN_LENGTH * CHAIN_LENGTH + 1
+
+    def _listing(self, resource, names, limit, offset):
+        start = int(offset or 0)
+        end = start + int(limit) if limit else start + 20 # PokeAPI's default page size
+        return {
+            'count': len(names),
+            'results': [{'name': name, 'url': f'{self.base_url}{resource}/{name}/'} for name in names[start:end]],
+        }
+
+    def _members(self, names):
+        return [{'pokemon': {'name': name, 'url': f'{self.base_url}pokemon/{name}/'}} for name in names]
+
+    def payload(self, resource, key=None, limit=None, offset=None):
+        dex_names = [self.dex_name(pokeapi_id) for pokeapi_id in range(1, self.dex_size + 1)]
+        if key is None:
+            if resource in ('pokemon', 'pokemon-species'):
+                return self._listing(resource, dex_names, limit, offset)
+            if resource == 'type':
+                return self._listing(resource, TYPE_NAMES, limit, offset)
+            if resource == 'ability':
+                return self._listing(resource, ABILITY_NAMES, limit, offset)
+            if resource == 'evolution-chain':
+                chain_ids = sorted({self._chain_id(pokeapi_id) for pokeapi_id in range(1, self.dex_size + 1)})
+                listing = self._listing(resource, [str(chain_id) for chain_id in chain_ids], limit, offset)
+                return {'count': listing['count'], 'results': [{'url': entry['url']} for entry in listing['results']]}
+            return None
+
+        if resource == 'pokemon':
+            name = self._name(key)
+            if name is None:
+                return None
+            pokeapi_id = self._id(name)
+            return {
+                'id': pokeapi_id, 'name': name, 'height': 7, 'weight': 69,
+                'sprites': {'front_default': f'{self.base_url}sprites/{pokeapi_id}.png' if pokeapi_id <= self.dex_size else None},
+                'types': [{'type': {'name': type_name, 'url': f'{self.base_url}type/{type_name}/'}} for type_name in self.types_of(pokeapi_id)],
+                'abilities': [{'ability': {'name': self.ability_of(pokeapi_id)}}],
+                'stats': [{'stat': {'name': stat_name}, 'base_stat': 40 + (pokeapi_id * 7 + i * 13) % 90} for i, stat_name in enumerate(STAT_NAMES)],
+                'species': {'name': name, 'url': f'{self.base_url}pokemon-species/{name}/'},
+            }
+        if resource == 'pokemon-species':
+            name = self._name(key)
+            if name is None:
+                return None
+            pokeapi_id = self._id(name)
+            return {
+                'id': pokeapi_id, 'name': name,
+                'varieties': [{'is_default': True, 'pokemon': {'name': name}}],
+                'evolution_chain': {'url': f'{self.base_url}evolution-chain/{self._chain_id(pokeapi_id)}/'},
+            }
+        if resource == 'evolution-chain':
+            if not key.isdigit():
+                return None
+            chain_id = int(key)
+            if chain_id > self.dex_size:
+                name = self._extra_name(chain_id)
+                members = [name] if name else []
+            elif self._chain_id(chain_id) == chain_id:
+                members = [self.dex_name(pokeapi_id) for pokeapi_id in range(chain_id, min(chain_id + CHAIN_LENGTH, self.dex_size + 1))]
+            else:
+                members = []
+            if not members:
+                return None
+            chain = {'species': {'name': members[-1]}, 'evolves_to': []}
+            for name in reversed(members[:-1]):
+                chain = {'species': {'name': name}, 'evolves_to': [chain]}
+            return {'id': chain_id, 'chain': chain}
+        if resource == 'type':
+            if key not in TYPE_NAMES:
+                return None
+            position = TYPE_NAMES.index(key)
+            neighbour = lambda offset: [{'name': TYPE_NAMES[(position + offset) % len(TYPE_NAMES)]}]
+            return {
+                'id': position + 1, 'name': key,
+                'pokemon': self._members(
+                    [self.dex_name(pokeapi_id) for pokeapi_id in range(1, self.dex_size + 1) if key in self.types_of(pokeapi_id)]
+                ),
+                'damage_relations': {
+                    'double_damage_to': neighbour(1), 'half_damage_to': neighbour(-1), 'no_damage_to': [],
+                    'double_damage_from': neighbour(-1), 'half_damage_from': neighbour(1), 'no_damage_from': [],
+                },
+            }
+        if resource == 'ability':
+            if key not in ABILITY_NAMES:
+                return None
+            return {
+                'id': ABILITY_NAMES.index(key) + 1, 'name': key,
+                'pokemon': self._members([self.dex_name(pokeapi_id) for pokeapi_id in range(1, self.dex_size + 1) if self.ability_of(pokeapi_id) == key]),
+            }
+        return None
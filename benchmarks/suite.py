@@ -0,0 +1,308 @@
+"""
+Benchmark suite of the page views against a local PokeAPI stub, written to a JSON file so runs
+on two commits can be compared.
+
+Each scenario (the home page, the list page in every filter mode, detail and compare pages) runs
+on its own uvicorn worker started cold: a fresh copy of the database, empty PokeAPI response,
+sprite and page caches, and no in-process indexes built yet. The scenario's URLs are requested
+once (the cold pass, every request a first visit) and then --warm-repeat more times (the warm
+pass). Per pass it records p50/p95/p99 latency, throughput, and from each response's
+Server-Timing header (pokedex_app/instrumentation.py) the DB queries and PokeAPI calls made;
+the stub's own request count includes retries and background refreshes too.
+
+    python -m benchmarks.suite --output bench.json
+    python -m benchmarks.suite --output bench-new.json --compare bench.json
+
+By default the database is filled first with `manage.py import_pokedex` from the stub, as in
+production; --seed none starts it empty, so pages seed it from the stub inline instead.
+Runs against a throwaway database and caches (benchmarks/settings.py); needs uvicorn.
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import platform
+import re
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import closing
+from datetime import datetime, timezone
+from pathlib import Path
+
+import django
+import httpx
+
+from .async_load import REPO_DIR, _free_port, _percentile, _wait_for_port
+from .stub_pokeapi import ABILITY_NAMES, STAT_NAMES, TYPE_NAMES, StubPokeAPIServer
+
+LIST_URL = '/pokemon/pokemon/' # reverse('pokemon_list'); the app's URLs are included under 'pokemon/'
+SERVER_TIMING_ENTRY = re.compile(r'([\w-]+)(?:;desc="([^"]*)")?(?:;dur=([\d.]+))?\s*(?:,\s*|$)')
+
+
+def _spread(names, count):
+    """count names spread evenly over names, in order."""
+    if count >= len(names):
+        return list(names)
+    step = len(names) / count
+    return [names[int(position * step)] for position in range(count)]
+
+
+def _scenarios(dex_size, count):
+    """Scenario name -> the URLs it requests, each at most count of them, all distinct."""
+    names = [StubPokeAPIServer.dex_name(pokeapi_id) for pokeapi_id in range(1, dex_size + 1)]
+    type_pairs = list(itertools.combinations(TYPE_NAMES, 2))
+    stat_params = [param.replace('-', '_') for param in STAT_NAMES]
+    return {
+        'index': ['/'],
+        'list': [f'{LIST_URL}?page={page}' for page in range(1, max(1, min(count, -(-dex_size // 20))) + 1)],
+        'list-search': [f'{LIST_URL}?q={name}' for name in _spread(names, count)],
+        'list-type': [f'{LIST_URL}?type_filter_name={type_name}' for type_name in TYPE_NAMES][:count],
+        'list-multi-type': [
+            f'{LIST_URL}?type_filter_name={first}&type_filter_name={second}&type_match={match}'
+            for (first, second), match in zip(type_pairs, itertools.cycle(['all', 'any']))
+        ][:count],
+        'list-ability': [
+            f'{LIST_URL}?ability_filter_name={ability_name}' + (f'&type_filter_name={type_name}' if type_name else '')
+            for type_name in (None,) + TYPE_NAMES for ability_name in ABILITY_NAMES
+        ][:count],
+        'list-stats': [
+            f'{LIST_URL}?{stat_param}_min={40 + 10 * (position // len(stat_params))}&sort=-{STAT_NAMES[(position + 1) % len(STAT_NAMES)]}'
+            for position, stat_param in zip(range(count), itertools.cycle(stat_params))
+        ],
+        'list-keyset': [f'{LIST_URL}?cursor='] + [f'{LIST_URL}?cursor=&type_filter_name={type_name}' for type_name in TYPE_NAMES][:count - 1],
+        'detail': [f'{LIST_URL}{name}/' for name in _spread(names, count)], # reverse('pokemon_detail')
+        'compare': [
+            '/pokemon/compare/?' + '&'.join(f'pokemon={name}' for name in trio) # reverse('pokemon_compare')
+            for trio in zip(*[_spread(names, count * 3)[offset::3] for offset in range(3)])
+        ],
+    }
+
+
+def _server_timing(header):
+    """A Server-Timing header as {'db_queries', 'db_ms', 'pokeapi_calls', 'pokeapi_ms', 'cache': {name: [hits, misses]}}."""
+    timing = {'db_queries': 0, 'db_ms': 0.0, 'pokeapi_calls': 0, 'pokeapi_ms': 0.0, 'cache': {}}
+    for match in SERVER_TIMING_ENTRY.finditer(header): # Descriptions are quoted and may hold commas
+        name, description, duration = match.groups()
+        numbers = [int(number) for number in re.findall(r'\d+', description or '')]
+        if name in ('db', 'pokeapi') and numbers:
+            timing['db_queries' if name == 'db' else 'pokeapi_calls'] = numbers[0]
+            timing['db_ms' if name == 'db' else 'pokeapi_ms'] = float(duration or 0)
+        elif name.startswith('cache-') and len(numbers) == 2:
+            timing['cache'][name[len('cache-'):]] = numbers
+    return timing
+
+
+async def _run_pass(base_url, paths, concurrency):
+    """Requests every path, at most `concurrency` at a time. Returns (samples, elapsed seconds)."""
+    samples = []
+    semaphore = asyncio.Semaphore(concurrency)
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=120) as client:
+        async def one(path):
+            async with semaphore:
+                started_at = time.perf_counter()
+                response = await client.get(path) # Redirects (a search hit) are not followed
+                latency = time.perf_counter() - started_at
+                samples.append({
+                    'path': path, 'status': response.status_code, 'latency': latency,
+                    **_server_timing(response.headers.get('Server-Timing', '')),
+                })
+
+        started_at = time.perf_counter()
+        await asyncio.gather(*map(one, paths))
+        return samples, time.perf_counter() - started_at
+
+
+def _summary(samples, elapsed, upstream_requests):
+    latencies = [sample['latency'] for sample in samples]
+    cache = {}
+    for sample in samples:
+        for name, (hits, misses) in sample['cache'].items():
+            totals = cache.setdefault(name, {'hits': 0, 'misses': 0})
+            totals['hits'] += hits
+            totals['misses'] += misses
+    return {
+        'requests': len(samples),
+        'errors': sum(1 for sample in samples if sample['status'] >= 400),
+        'throughput': round(len(samples) / elapsed, 2) if elapsed else None,
+        'p50_ms': round(_percentile(latencies, 50) * 1000, 2),
+        'p95_ms': round(_percentile(latencies, 95) * 1000, 2),
+        'p99_ms': round(_percentile(latencies, 99) * 1000, 2),
+        'mean_ms': round(statistics.mean(latencies) * 1000, 2),
+        'db_queries': sum(sample['db_queries'] for sample in samples),
+        'db_queries_per_request': round(statistics.mean(sample['db_queries'] for sample in samples), 2),
+        'db_ms_per_request': round(statistics.mean(sample['db_ms'] for sample in samples), 2),
+        'pokeapi_calls': sum(sample['pokeapi_calls'] for sample in samples),
+        'upstream_requests': upstream_requests,
+        'cache': cache,
+    }
+
+
+def _prepare_database(env, temp_dir, stub, seed, dex_size):
+    """Migrates a template database and, with seed='import', imports the stub's dex into it. Returns its path."""
+    template_db = Path(temp_dir) / 'template.sqlite3'
+    import_env = dict(
+        env, POKEDEX_BENCH_DB=str(template_db), POKEAPI_CACHE_DIR=str(Path(temp_dir) / 'import_cache'),
+        POKEDEX_LOG_LEVEL='WARNING',
+    )
+    subprocess.run([sys.executable, 'manage.py', 'migrate', '--noinput', '-v', '0'], cwd=REPO_DIR, env=import_env, check=True)
+    if seed == 'import' and dex_size:
+        error_rate, stub.error_rate = stub.error_rate, 0.0 # The database is the baseline, not part of the measurement
+        try:
+            subprocess.run(
+                [sys.executable, 'manage.py', 'import_pokedex', '--restart', '--checkpoint', str(Path(temp_dir) / 'checkpoint.json')],
+                cwd=REPO_DIR, env=import_env, check=True, stdout=subprocess.DEVNULL,
+            )
+        finally:
+            stub.error_rate = error_rate
+    return template_db
+
+
+def _run_scenario(name, paths, args, env, temp_dir, template_db, stub):
+    scenario_dir = Path(temp_dir) / name
+    scenario_dir.mkdir()
+    # A WAL database may have committed pages in template.sqlite3-wal still; the backup API copies them too
+    with closing(sqlite3.connect(template_db)) as source, closing(sqlite3.connect(scenario_dir / 'db.sqlite3')) as copy:
+        source.backup(copy)
+    scenario_env = dict(
+        env,
+        POKEDEX_BENCH_DB=str(scenario_dir / 'db.sqlite3'),
+        POKEAPI_CACHE_DIR=str(scenario_dir / 'pokeapi_cache'),
+        POKEDEX_SPRITE_DIR=str(scenario_dir / 'sprites'),
+        POKEDEX_LOCK_DIR=str(scenario_dir / 'locks'),
+    )
+    port = _free_port()
+    server_log = open(args.server_log, 'a') if args.server_log else subprocess.DEVNULL
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'uvicorn', 'pokedex_project.asgi:application', '--host', '127.0.0.1',
+         '--port', str(port), '--workers', '1', '--log-level', 'warning'],
+        cwd=REPO_DIR, env=scenario_env, stdout=server_log, stderr=server_log,
+    )
+    try:
+        _wait_for_port(port)
+        base_url = f'http://127.0.0.1:{port}'
+        # Loads the URLconf and the views module without touching any view's caches
+        asyncio.run(_run_pass(base_url, ['/metrics'], 1))
+        result = {'urls': len(paths)}
+        for pass_name, pass_paths in (('cold', paths), ('warm', paths * args.warm_repeat)):
+            upstream_before = stub.requests
+            samples, elapsed = asyncio.run(_run_pass(base_url, pass_paths, args.concurrency))
+            result[pass_name] = _summary(samples, elapsed, stub.requests - upstream_before)
+        return result
+    finally:
+        server.terminate()
+        server.wait(timeout=10)
+        if args.server_log:
+            server_log.close()
+
+
+def _git_revision():
+    try:
+        revision = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=REPO_DIR, capture_output=True, text=True, check=True).stdout.strip()
+        dirty = bool(subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=REPO_DIR, capture_output=True, text=True).stdout.strip())
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return revision + ('-dirty' if dirty else '')
+
+
+def _print_results(results):
+    print(f"{'scenario':<16} {'pass':<5} {'req':>5} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'queries/req':>11} {'pokeapi':>7} {'upstream':>8} {'errors':>6}")
+    for name, result in results.items():
+        for pass_name in ('cold', 'warm'):
+            summary = result[pass_name]
+            print(
+                f"{name:<16} {pass_name:<5} {summary['requests']:>5} {summary['throughput']:>8.1f} {summary['p50_ms']:>8.1f} "
+                f"{summary['p95_ms']:>8.1f} {summary['p99_ms']:>8.1f} {summary['db_queries_per_request']:>11.1f} "
+                f"{summary['pokeapi_calls']:>7} {summary['upstream_requests']:>8} {summary['errors']:>6}"
+            )
+
+
+def _print_comparison(baseline, results):
+    """Relative change of each scenario's figures against a previous run's JSON file."""
+    print(f"\nAgainst {baseline.get('git_revision') or 'the baseline'} (negative is better, except req/s):")
+    print(f"{'scenario':<16} {'pass':<5} {'req/s':>8} {'p50':>8} {'p95':>8} {'p99':>8} {'queries/req':>11} {'upstream':>8}")
+    for name, result in results.items():
+        previous = baseline['scenarios'].get(name)
+        if previous is None:
+            continue
+        for pass_name in ('cold', 'warm'):
+            before, after = previous[pass_name], result[pass_name]
+
+            def change(field):
+                if not before[field]:
+                    return f"{'n/a':>8}" if after[field] else f"{'0%':>8}"
+                return f"{(after[field] - before[field]) / before[field] * 100:>+7.0f}%"
+            print(
+                f"{name:<16} {pass_name:<5} {change('throughput')} {change('p50_ms')} {change('p95_ms')} {change('p99_ms')} "
+                f"{change('db_queries_per_request'):>11} {change('upstream_requests')}"
+            )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--output', default='bench.json', help="JSON file the results are written to.")
+    parser.add_argument('--compare', default=None, help="A previous run's JSON file to print the changes against.")
+    parser.add_argument('--scenarios', nargs='+', default=None, help="Only run these scenarios (default: all).")
+    parser.add_argument('--delay', type=float, default=0.05, help="Seconds the stub PokeAPI waits before each answer.")
+    parser.add_argument('--jitter', type=float, default=0.0, help="Up to this many seconds of random extra delay per answer.")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="Share of stub answers that are 500s, e.g. 0.05.")
+    parser.add_argument('--dex-size', type=int, default=151, help="Pokemon in the stub's dex.")
+    parser.add_argument('--seed', choices=['import', 'none'], default='import', help="Fill the database before the runs, or start empty.")
+    parser.add_argument('--urls', type=int, default=20, help="Distinct URLs per scenario, at most.")
+    parser.add_argument('--warm-repeat', type=int, default=3, help="Times the scenario's URLs are requested again once warm.")
+    parser.add_argument('--concurrency', type=int, default=4, help="Requests in flight at once.")
+    parser.add_argument('--server-log', default=None, help="Append the servers' output to this file (default: discarded).")
+    args = parser.parse_args(argv)
+
+    scenarios = _scenarios(args.dex_size, max(1, args.urls))
+    unknown = set(args.scenarios or ()) - set(scenarios)
+    if unknown:
+        parser.error(f"Unknown scenarios: {', '.join(sorted(unknown))}. Choose from: {', '.join(scenarios)}.")
+    if args.scenarios:
+        scenarios = {name: paths for name, paths in scenarios.items() if name in args.scenarios}
+    baseline = json.loads(Path(args.compare).read_text()) if args.compare else None
+
+    stub = StubPokeAPIServer(delay=args.delay, jitter=args.jitter, error_rate=args.error_rate, dex_size=args.dex_size).start()
+    results = {}
+    try:
+        with tempfile.TemporaryDirectory(prefix='pokedex-bench-') as temp_dir:
+            env = dict(
+                os.environ,
+                DJANGO_SETTINGS_MODULE='benchmarks.settings',
+                POKEAPI_BASE_URL=stub.base_url,
+                POKEDEX_LOG_LEVEL=os.environ.get('POKEDEX_LOG_LEVEL', 'WARNING'),
+                POKEDEX_INLINE_SEEDING='1' if args.seed == 'none' else '0',
+                POKEAPI_MAX_CONCURRENCY=str(max(8, args.concurrency * 2)),
+            )
+            template_db = _prepare_database(env, temp_dir, stub, args.seed, args.dex_size)
+            print(
+                f"Stub PokeAPI: {args.dex_size} Pokemon, delay {args.delay * 1000:.0f} ms (+{args.jitter * 1000:.0f} ms jitter), "
+                f"{args.error_rate:.0%} errors; database seeded by {args.seed}; concurrency {args.concurrency}"
+            )
+            for name, paths in scenarios.items():
+                results[name] = _run_scenario(name, paths, args, env, temp_dir, template_db, stub)
+    finally:
+        stub.stop()
+
+    report = {
+        'git_revision': _git_revision(),
+        'created_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'django': django.get_version(),
+        'options': {key: value for key, value in vars(args).items() if key not in ('output', 'compare', 'server_log')},
+        'scenarios': results,
+    }
+    Path(args.output).write_text(json.dumps(report, indent=2) + '\n')
+    _print_results(results)
+    if baseline is not None:
+        _print_comparison(baseline, results)
+    print(f"\nWritten to {args.output}.")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,11 @@
+#!/bin/sh
+# Applies migrations, then runs the container's command (gunicorn by default).
+# With several replicas, run `python manage.py migrate` once as its own step (a release job or
+# init container) and set POKEDEX_MIGRATE_ON_START=0, so replicas do not race to migrate.
+set -e
+
+if [ "${POKEDEX_MIGRATE_ON_START:-1}" = "1" ]; then
+    python manage.py migrate --noinput
+fi
+
+exec "$@"
@@ -0,0 +1,85 @@
+"""
+Gunicorn settings for production; `gunicorn` run from the project root picks this file up.
+
+POKEDEX_SERVER_MODE picks the application:
+  - 'asgi' (default): pokedex_project.asgi under uvicorn workers. The list, detail, compare and
+    home views are async, so one worker process per CPU serves many requests at once while they
+    wait on PokeAPI.
+  - 'wsgi': pokedex_project.wsgi under threaded sync workers, one process per CPU with
+    POKEDEX_THREADS threads each (async views then run one event loop per request).
+Each worker keeps its own in-process indexes and caches (search, filters, carousel, stats matrix,
+PokeAPI responses), so more processes cost memory as well as CPU; POKEDEX_WORKERS overrides the count.
+
+The app is imported once in the master before the workers are forked (preload_app), so they
+start at once and share its memory copy-on-write. The master logs its own startup time and
+each worker's, with the memory the worker has to itself (see instrumentation.process_memory());
+/metrics reports the latter too, per worker.
+"""
+import gc
+import os
+import time
+
+_started_at = time.monotonic()
+
+
+def _cpu_count():
+    try:
+        return len(os.sched_getaffinity(0)) # The CPUs this container may use, not the host's
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+POKEDEX_SERVER_MODE = os.environ.get('POKEDEX_SERVER_MODE', 'asgi')
+
+bind = os.environ.get('POKEDEX_BIND', '0.0.0.0:8000')
+workers = int(os.environ.get('POKEDEX_WORKERS', _cpu_count()))
+if POKEDEX_SERVER_MODE == 'wsgi':
+    wsgi_app = 'pokedex_project.wsgi:application'
+    worker_class = 'gthread'
+    threads = int(os.environ.get('POKEDEX_THREADS', 4))
+else:
+    wsgi_app = 'pokedex_project.asgi:application'
+    worker_class = 'uvicorn_worker.UvicornWorker'
+
+preload_app = True
+timeout = int(os.environ.get('POKEDEX_WORKER_TIMEOUT', 30)) # Seconds a worker may go unresponsive (a blocked event loop) before it is replaced
+graceful_timeout = 30
+keepalive = 5 # Seconds; behind a proxy, keep this above the proxy's own idle timeout
+# Restart each worker after this many requests (spread by the jitter) to bound memory growth; 0 never restarts
+max_requests = int(os.environ.get('POKEDEX_MAX_REQUESTS', 0))
+max_requests_jitter = max_requests // 10
+accesslog = None # request_metrics_middleware already logs one line per request
+errorlog = '-'
+
+
+def _megabytes(size):
+    return size / (1024 * 1024)
+
+
+def when_ready(server):
+    # The app is loaded and the workers are about to be forked: keep the collector off the objects
+    # loaded so far, so it does not write to (and copy) every page the workers share
+    gc.freeze()
+    from pokedex_app.instrumentation import process_memory
+    memory = process_memory()
+    server.log.info(
+        "Pokedex %s: app preloaded in %.2fs; master %s; %s workers.",
+        POKEDEX_SERVER_MODE, time.monotonic() - _started_at,
+        f"{_megabytes(memory[0]):.1f} MB resident" if memory else "memory unknown", server.num_workers,
+    )
+
+
+def post_fork(server, worker):
+    worker.forked_at = time.monotonic()
+    # A connection opened by the master must not be shared by the workers
+    from django.db import connections
+    connections.close_all()
+
+
+def post_worker_init(worker):
+    from pokedex_app.instrumentation import process_memory
+    memory = process_memory()
+    worker.log.info(
+        "Worker %s ready in %.3fs; %s.", worker.pid, time.monotonic() - worker.forked_at,
+        f"{_megabytes(memory[1]):.1f} MB private, {_megabytes(memory[0]):.1f} MB resident" if memory else "memory unknown",
+    )
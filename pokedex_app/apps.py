@@ -4,3 +4,8 @@ from django.apps import AppConfig
 class PokedexAppConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'pokedex_app'
+
+    def ready(self):
+        from . import signals # noqa: F401 (connects the cache invalidation receivers)
+        from . import instrumentation
+        instrumentation.install()
@@ -0,0 +1,87 @@
+"""
+Random carousel picks for the home page at a constant cost, however large the dex.
+
+Each worker keeps the pokeapi_ids of the Pokemon that have a sprite in a plain list (with each
+id's position, so removals are a swap with the last entry). A pick is random.sample() over that
+list and one in_bulk() query for the handful of rows chosen, instead of loading every row to
+sample five of them.
+
+Kept current through in_process_index.py: bulk syncs are caught up on through last_synced_at,
+any other change rebuilds the list (one query over an indexed column).
+"""
+import logging
+import random
+import time
+
+from .in_process_index import InProcessIndex
+from .models import Pokemon
+
+logger = logging.getLogger(__name__)
+
+
+
+class CarouselSampler(InProcessIndex):
+    REBUILD_KEY = 'pokedex:carousel:rebuild'
+    CHANGES_KEY = 'pokedex:carousel:changes'
+
+    def __init__(self):
+        super().__init__()
+        self._reset()
+
+    def _reset(self):
+        self._ids = [] # pokeapi_ids of Pokemon with a sprite, in no particular order
+        self._positions = {} # pokeapi_id -> index in _ids
+        self._watermark = None # Newest last_synced_at read so far
+
+    def __len__(self):
+        return len(self._ids)
+
+    # -- loading ---------------------------------------------------------------
+
+    def _build(self):
+        started_at = time.perf_counter()
+        self._reset()
+        self._load(Pokemon.objects.all())
+        logger.info("Built for %s Pokemon with sprites in %.3fs.", len(self._ids), time.perf_counter() - started_at)
+
+    def _load(self, pokemon_queryset):
+        """Adds the given Pokemon that have a sprite and drops those that lost theirs. One query."""
+        for pokeapi_id, sprite_url, last_synced_at in pokemon_queryset.values_list('pokeapi_id', 'sprite_url', 'last_synced_at'):
+            if sprite_url:
+                self._add(pokeapi_id)
+            else:
+                self._remove(pokeapi_id)
+            self._advance_watermark(last_synced_at)
+
+    def _add(self, pokeapi_id):
+        if pokeapi_id not in self._positions:
+            self._positions[pokeapi_id] = len(self._ids)
+            self._ids.append(pokeapi_id)
+
+    def _remove(self, pokeapi_id):
+        position = self._positions.pop(pokeapi_id, None)
+        if position is None:
+            return
+        last_id = self._ids.pop()
+        if last_id != pokeapi_id:
+            self._ids[position] = last_id
+            self._positions[last_id] = position
+
+    # -- queries ---------------------------------------------------------------
+
+    def sample(self, count):
+        """Up to `count` random Pokemon with a sprite, without repeats. One query for the chosen rows."""
+        self.ensure_current()
+        with self._lock:
+            chosen_ids = random.sample(self._ids, min(count, len(self._ids)))
+        if not chosen_ids:
+            return []
+        pokemon_by_id = Pokemon.objects.only('pk', 'pokeapi_id', 'name', 'sprite_url').in_bulk(chosen_ids, field_name='pokeapi_id')
+        # A row deleted, or a sprite cleared, since the list was read is simply skipped
+        return [
+            pokemon_by_id[pokeapi_id] for pokeapi_id in chosen_ids
+            if pokeapi_id in pokemon_by_id and pokemon_by_id[pokeapi_id].sprite_url
+        ]
+
+
+carousel_sampler = CarouselSampler()
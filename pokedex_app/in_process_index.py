@@ -0,0 +1,96 @@
+"""
+Upkeep shared by the in-process indexes (filter_index.py, search_index.py, stats_matrix.py,
+carousel.py, type_chart.py). Each worker keeps its own copy and keeps it current:
+- Bulk syncs (ingest.py) stamp last_synced_at, so a catch-up re-reads only the rows synced since
+  the newest stamp the copy has seen (an indexed range query).
+- Any other change (admin edits, deletes, M2M edits) triggers a full rebuild.
+signals.py flags the local copy right away and bumps one of two generation numbers in the Django
+cache on commit, which is how the other workers notice.
+
+A subclass sets REBUILD_KEY and CHANGES_KEY, implements _build() and _load(pokemon_queryset), and
+calls _advance_watermark() for every row it loads.
+"""
+import threading
+import time
+from datetime import timedelta
+
+from django.core.cache import cache
+
+from .models import Pokemon
+
+# Rows are stamped before their transaction commits, so a catch-up also re-reads this much of the
+# past: a slow transaction may commit rows older than the newest stamp already seen.
+CATCH_UP_OVERLAP = timedelta(seconds=60)
+
+
+class InProcessIndex:
+    REBUILD_KEY = None
+    CHANGES_KEY = None
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._seen_generations = (None, None) # (rebuild, changes) the copy is current for
+        self._rebuild_pending = True
+        self._changes_pending = False
+        self._watermark = None # Newest last_synced_at read so far
+
+    # -- change tracking (called from signals.py) ------------------------------
+
+    def mark_changed(self):
+        """Rows were bulk-synced in this process; catch up before the next query."""
+        self._changes_pending = True
+
+    def mark_rebuild(self):
+        self._rebuild_pending = True
+
+    def bump_changes(self):
+        cache.set(self.CHANGES_KEY, time.time_ns(), None)
+
+    def bump_rebuild(self):
+        cache.set(self.REBUILD_KEY, time.time_ns(), None)
+
+    def _shared_generations(self):
+        keys = (self.REBUILD_KEY, self.CHANGES_KEY)
+        generations = cache.get_many(keys)
+        for key in keys:
+            if key not in generations:
+                cache.add(key, time.time_ns(), None)
+                generations[key] = cache.get(key)
+        return generations[self.REBUILD_KEY], generations[self.CHANGES_KEY]
+
+    def generation(self):
+        """Changes whenever any worker's copy would: for caches of output derived from the whole copy."""
+        rebuild_generation, changes_generation = self._shared_generations()
+        return f'{rebuild_generation}.{changes_generation}'
+
+    def ensure_current(self):
+        """Brings the copy up to date: a full build, a catch-up on recently synced rows, or nothing."""
+        with self._lock:
+            rebuild_generation, changes_generation = self._shared_generations()
+            seen_rebuild, seen_changes = self._seen_generations
+            # Recorded before reading, so a change racing with the read triggers another pass
+            self._seen_generations = (rebuild_generation, changes_generation)
+            if self._rebuild_pending or rebuild_generation != seen_rebuild:
+                self._rebuild_pending = self._changes_pending = False
+                self._build()
+            elif self._changes_pending or changes_generation != seen_changes:
+                self._changes_pending = False
+                self._catch_up()
+
+    # -- loading ---------------------------------------------------------------
+
+    def _build(self):
+        raise NotImplementedError
+
+    def _load(self, pokemon_queryset):
+        raise NotImplementedError
+
+    def _catch_up(self):
+        if self._watermark is None:
+            self._build()
+            return
+        self._load(Pokemon.objects.filter(last_synced_at__gte=self._watermark - CATCH_UP_OVERLAP))
+
+    def _advance_watermark(self, last_synced_at):
+        if last_synced_at is not None and (self._watermark is None or last_synced_at > self._watermark):
+            self._watermark = last_synced_at
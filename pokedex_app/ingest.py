@@ -0,0 +1,261 @@
+"""
+Batch ingestion of PokeAPI payloads into the local DB.
+
+Writing Pokemon one at a time costs ~10 queries each (update_or_create, a get_or_create per
+type/ability and two M2M .set() calls). ingest_pokemon_payloads() writes any number of
+/pokemon/ payloads with a fixed number of queries instead. The species and evolution chain
+ingesters do the same for the evolution graph (Species / EvolutionChain / EvolutionEdge), and
+the type ingester for the type chart (TypeEffectiveness).
+"""
+import logging
+
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import STAT_FIELDS, Pokemon, Type, TypeEffectiveness, Ability, Species, EvolutionChain, EvolutionEdge
+from .signals import pokedex_data_synced
+
+logger = logging.getLogger(__name__)
+
+POKEMON_UPDATE_FIELDS = [
+    'name', 'pokeapi_id', 'height', 'weight', 'sprite_url', *STAT_FIELDS.values(), 'stat_total', 'species', 'last_synced_at',
+]
+
+
+def pokemon_fields_from_api_data(data):
+    """Maps one /pokemon/ payload onto Pokemon model field values."""
+    return {
+        'name': data.get('name').lower(),
+        'pokeapi_id': data.get('id'),
+        'height': data.get('height'),
+        'weight': data.get('weight'),
+        'sprite_url': data.get('sprites', {}).get('front_default'),
+        'stats': {stat['stat']['name']: stat['base_stat'] for stat in data.get('stats', [])}, # Sets the stat columns
+        'last_synced_at': timezone.now(),
+    }
+
+
+def resolve_names(model, names):
+    """
+    Makes sure a row exists for every name (Type, Ability or Species) and returns {name: pk}.
+    One SELECT when every name exists already; otherwise an INSERT ... ON CONFLICT DO NOTHING and
+    a SELECT of the new names follow. Only then do caches hear of a change (pokedex_data_synced),
+    so re-syncing known names leaves the page cache alone.
+    """
+    names = set(names)
+    if not names:
+        return {}
+    pk_by_name = dict(model.objects.filter(name__in=names).values_list('name', 'pk'))
+    missing_names = names - set(pk_by_name)
+    if missing_names:
+        model.objects.bulk_create([model(name=name) for name in missing_names], ignore_conflicts=True)
+        pokedex_data_synced.send(sender=model)
+        pk_by_name.update(model.objects.filter(name__in=missing_names).values_list('name', 'pk'))
+    return pk_by_name
+
+
+def _replace_m2m_rows(through_model, target_field, pokemon_pks, rows):
+    """Swaps the through-table rows of the given Pokemon for `rows` (pokemon_pk, target_pk) pairs."""
+    through_model.objects.filter(pokemon_id__in=pokemon_pks).delete()
+    through_model.objects.bulk_create(
+        [through_model(pokemon_id=pokemon_pk, **{f'{target_field}_id': target_pk}) for pokemon_pk, target_pk in rows],
+        ignore_conflicts=True
+    )
+
+
+def _upsert_pokemon(fields_by_api_id, api_ids, names):
+    """One transaction writing the Pokemon rows, their types and abilities. Returns (created, updated) instances."""
+    with transaction.atomic():
+        type_pks = resolve_names(Type, (
+            type_info['type']['name'] for _, data in fields_by_api_id.values() for type_info in data.get('types', [])
+        ))
+        ability_pks = resolve_names(Ability, (
+            ability_info['ability']['name'] for _, data in fields_by_api_id.values() for ability_info in data.get('abilities', [])
+        ))
+        species_pks = resolve_names(Species, (
+            data['species']['name'] for _, data in fields_by_api_id.values() if data.get('species')
+        ))
+
+        existing = Pokemon.objects.filter(Q(pokeapi_id__in=api_ids) | Q(name__in=names))
+        existing_by_api_id = {}
+        existing_by_name = {}
+        for pokemon_obj in existing:
+            existing_by_api_id[pokemon_obj.pokeapi_id] = pokemon_obj
+            existing_by_name[pokemon_obj.name] = pokemon_obj
+
+        to_create, to_update = [], []
+        for fields, data in fields_by_api_id.values():
+            if data.get('species'):
+                fields['species_id'] = species_pks[data['species']['name']]
+            pokemon_obj = existing_by_api_id.get(fields['pokeapi_id']) or existing_by_name.get(fields['name'])
+            if pokemon_obj is None:
+                to_create.append(Pokemon(**fields))
+                continue
+            for field_name, value in fields.items():
+                setattr(pokemon_obj, field_name, value)
+            to_update.append(pokemon_obj)
+
+        if to_update:
+            Pokemon.objects.bulk_update(to_update, POKEMON_UPDATE_FIELDS)
+        if to_create:
+            Pokemon.objects.bulk_create(to_create)
+
+        # SQLite does not hand back primary keys from bulk_create on every version, so re-read them
+        pk_by_api_id = dict(Pokemon.objects.filter(pokeapi_id__in=api_ids).values_list('pokeapi_id', 'pk'))
+        for pokemon_obj in to_create:
+            pokemon_obj.pk = pk_by_api_id[pokemon_obj.pokeapi_id]
+
+        pokemon_pks = list(pk_by_api_id.values())
+        _replace_m2m_rows(Pokemon.types.through, 'type', pokemon_pks, [
+            (pk_by_api_id[api_id], type_pks[type_info['type']['name']])
+            for api_id, (_, data) in fields_by_api_id.items() for type_info in data.get('types', [])
+        ])
+        _replace_m2m_rows(Pokemon.abilities.through, 'ability', pokemon_pks, [
+            (pk_by_api_id[api_id], ability_pks[ability_info['ability']['name']])
+            for api_id, (_, data) in fields_by_api_id.items() for ability_info in data.get('abilities', [])
+        ])
+        pokedex_data_synced.send(sender=Pokemon, pokemon_names=names)
+    return to_create, to_update
+
+
+def ingest_pokemon_payloads(payloads):
+    """
+    Upserts /pokemon/ API payloads (with their types and abilities) in bulk.
+    Existing rows are matched on pokeapi_id first, then on name.
+    Returns the saved Pokemon instances, one per distinct payload, in input order.
+    """
+    fields_by_api_id = {}
+    for data in payloads:
+        fields = pokemon_fields_from_api_data(data)
+        fields_by_api_id[fields['pokeapi_id']] = (fields, data)
+    if not fields_by_api_id:
+        return []
+
+    api_ids = list(fields_by_api_id)
+    names = [fields['name'] for fields, _ in fields_by_api_id.values()]
+
+    try:
+        to_create, to_update = _upsert_pokemon(fields_by_api_id, api_ids, names)
+    except IntegrityError:
+        # Another worker inserted one of these Pokemon between our SELECT and INSERT; the rows now
+        # exist, so a second pass updates them instead
+        logger.info("Lost an insert race for %s Pokemon, retrying.", len(fields_by_api_id))
+        to_create, to_update = _upsert_pokemon(fields_by_api_id, api_ids, names)
+
+    logger.info("%s Pokemon: %s created, %s updated.", len(fields_by_api_id), len(to_create), len(to_update))
+    saved_by_api_id = {pokemon_obj.pokeapi_id: pokemon_obj for pokemon_obj in to_create + to_update}
+    return [saved_by_api_id[api_id] for api_id in api_ids]
+
+
+def ingest_species_payloads(payloads):
+    """
+    Upserts Species rows for /pokemon-species/ payloads and links every Pokemon variety
+    they list (e.g. 'deoxys-normal' -> deoxys) that is already in the DB.
+    """
+    with transaction.atomic():
+        species_pks = resolve_names(Species, (data['name'] for data in payloads))
+        species_pk_by_variety = {
+            variety['pokemon']['name']: species_pks[data['name']]
+            for data in payloads for variety in data.get('varieties', [])
+        }
+        varieties = list(Pokemon.objects.filter(name__in=species_pk_by_variety).only('pk', 'name', 'species'))
+        for pokemon_obj in varieties:
+            pokemon_obj.species_id = species_pk_by_variety[pokemon_obj.name]
+        Pokemon.objects.bulk_update(varieties, ['species'])
+        pokedex_data_synced.send(sender=Species, pokemon_names=[pokemon_obj.name for pokemon_obj in varieties])
+    return species_pks
+
+
+def _walk_chain(stage, parent_name, species_names, edges):
+    """Flattens the nested 'chain' of an /evolution-chain/ payload into species names and (from, to) edges."""
+    species_name = stage['species']['name']
+    species_names.append(species_name)
+    if parent_name:
+        edges.append((parent_name, species_name))
+    for next_stage in stage.get('evolves_to', []):
+        _walk_chain(next_stage, species_name, species_names, edges)
+
+
+def ingest_evolution_chains(payloads):
+    """
+    Stores /evolution-chain/ payloads as EvolutionChain rows, the chain membership of every Species
+    and one EvolutionEdge per evolution step. Fixed number of queries for any number of chains.
+    """
+    walked = {}
+    for data in payloads:
+        species_names, edges = [], []
+        _walk_chain(data['chain'], None, species_names, edges)
+        walked[data['id']] = (species_names, edges)
+    if not walked:
+        return
+
+    with transaction.atomic():
+        EvolutionChain.objects.bulk_create(
+            [EvolutionChain(pokeapi_id=chain_api_id) for chain_api_id in walked], ignore_conflicts=True
+        )
+        chain_pks = dict(EvolutionChain.objects.filter(pokeapi_id__in=walked).values_list('pokeapi_id', 'pk'))
+        species_pks = resolve_names(Species, (name for species_names, _ in walked.values() for name in species_names))
+
+        Species.objects.bulk_update([
+            Species(pk=species_pks[name], name=name, chain_id=chain_pks[chain_api_id])
+            for chain_api_id, (species_names, _) in walked.items() for name in species_names
+        ], ['chain'])
+
+        EvolutionEdge.objects.filter(chain_id__in=chain_pks.values()).delete()
+        EvolutionEdge.objects.bulk_create([
+            EvolutionEdge(chain_id=chain_pks[chain_api_id], from_species_id=species_pks[from_name], to_species_id=species_pks[to_name])
+            for chain_api_id, (_, edges) in walked.items() for from_name, to_name in edges
+        ], ignore_conflicts=True)
+
+        # Pokemon synced before species were tracked: the default variety shares the species name
+        unlinked = list(Pokemon.objects.filter(species__isnull=True, name__in=species_pks).only('pk', 'name', 'species'))
+        for pokemon_obj in unlinked:
+            pokemon_obj.species_id = species_pks[pokemon_obj.name]
+        Pokemon.objects.bulk_update(unlinked, ['species'])
+        pokedex_data_synced.send(sender=EvolutionChain, chain_ids=chain_pks.values())
+
+    logger.info("%s evolution chains covering %s species.", len(walked), len(species_pks))
+
+
+# damage_relations keys of a /type/ payload -> (multiplier, whether the payload's type is the attacker)
+DAMAGE_RELATIONS = {
+    'double_damage_to': (2.0, True),
+    'half_damage_to': (0.5, True),
+    'no_damage_to': (0.0, True),
+    'double_damage_from': (2.0, False),
+    'half_damage_from': (0.5, False),
+    'no_damage_from': (0.0, False),
+}
+
+
+def ingest_type_payloads(payloads):
+    """
+    Stores the damage relations of /type/ payloads as TypeEffectiveness rows. A payload describes its type
+    both attacking and defending, so every pair involving one of these types is replaced. Payloads without
+    damage_relations are skipped. Fixed number of queries.
+    """
+    payloads = [data for data in payloads if 'damage_relations' in data]
+    multipliers = {} # (attacking name, defending name) -> multiplier
+    for data in payloads:
+        relations = data['damage_relations']
+        for key, (multiplier, is_attacker) in DAMAGE_RELATIONS.items():
+            for other in relations.get(key, []):
+                pair = (data['name'], other['name']) if is_attacker else (other['name'], data['name'])
+                multipliers[pair] = multiplier
+    synced_names = [data['name'] for data in payloads]
+    if not synced_names:
+        return
+
+    with transaction.atomic():
+        type_pks = resolve_names(Type, set(synced_names) | {name for pair in multipliers for name in pair})
+        synced_pks = [type_pks[name] for name in synced_names]
+        TypeEffectiveness.objects.filter(Q(attacking_type_id__in=synced_pks) | Q(defending_type_id__in=synced_pks)).delete()
+        TypeEffectiveness.objects.bulk_create([
+            TypeEffectiveness(attacking_type_id=type_pks[attacking], defending_type_id=type_pks[defending], multiplier=multiplier)
+            for (attacking, defending), multiplier in multipliers.items()
+        ])
+        Type.objects.filter(pk__in=synced_pks).update(relations_synced_at=timezone.now())
+        pokedex_data_synced.send(sender=TypeEffectiveness)
+
+    logger.info("Damage relations of %s types: %s non-neutral pairs.", len(synced_names), len(multipliers))
@@ -0,0 +1,332 @@
+"""
+Per-request instrumentation: DB queries, PokeAPI calls and cache lookups, per view.
+
+request_metrics_middleware gives each request a RequestMetrics in a context variable; the DB
+execute wrapper (installed on every connection), pokeapi.ClientStats and the caches add to it
+through record_query(), record_upstream() and record_cache(). Context variables follow a request
+through sync_to_async and into the thread pools that copy them with in_request_context(), so
+work done on its behalf is counted wherever it runs; background work (refresh.py) is not, nor
+are queries run while a streamed body is sent, after the middleware has returned.
+
+When the response leaves, the totals are
+  - sent back in a Server-Timing header (shown per request in the browser's network panel),
+  - logged as one line on the 'pokedex_app.requests' logger, with the numbers as record
+    attributes for JsonFormatter,
+  - added to this process's Prometheus counters, served as text by the /metrics view.
+Metrics are per worker process; scrape each worker, or sum them in Prometheus.
+"""
+import asyncio
+import contextvars
+import json
+import logging
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter, defaultdict
+
+from django.db.backends.signals import connection_created
+from django.utils.decorators import sync_and_async_middleware
+
+logger = logging.getLogger('pokedex_app.requests')
+
+UNRESOLVED_VIEW = '<unresolved>'
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_current = contextvars.ContextVar('pokedex_request_metrics', default=None)
+
+
+class RequestMetrics:
+    """Totals for one request. Async views add to it from several coroutines and threads at once."""
+
+    def __init__(self, path=''):
+        self._lock = threading.Lock()
+        self.started_at = time.perf_counter()
+        self.path = path
+        self.view = UNRESOLVED_VIEW # Known once the URL has been resolved
+        self.db_queries = 0
+        self.db_time = 0.0
+        self.upstream_calls = 0
+        self.upstream_time = 0.0
+        self.cache = Counter() # (cache name, 'hit' or 'miss') -> lookups
+
+    def add_query(self, seconds):
+        with self._lock:
+            self.db_queries += 1
+            self.db_time += seconds
+
+    def add_upstream(self, seconds):
+        with self._lock:
+            self.upstream_calls += 1
+            self.upstream_time += seconds
+
+    def add_cache(self, name, hit):
+        with self._lock:
+            self.cache[(name, 'hit' if hit else 'miss')] += 1
+
+    def elapsed(self):
+        return time.perf_counter() - self.started_at
+
+    def cache_names(self):
+        return sorted({name for name, _ in self.cache})
+
+    def server_timing(self):
+        """Server-Timing header value. Durations are in milliseconds; PokeAPI time is summed over concurrent calls."""
+        entries = [
+            f'db;desc="{self.db_queries} queries";dur={self.db_time * 1000:.1f}',
+            f'pokeapi;desc="{self.upstream_calls} calls";dur={self.upstream_time * 1000:.1f}',
+        ]
+        for name in self.cache_names():
+            entries.append(f'cache-{name};desc="{self.cache[(name, "hit")]} hits, {self.cache[(name, "miss")]} misses"')
+        entries.append(f'total;dur={self.elapsed() * 1000:.1f}')
+        return ', '.join(entries)
+
+    def as_dict(self):
+        return {
+            'view': self.view,
+            'duration_ms': round(self.elapsed() * 1000, 1),
+            'db_queries': self.db_queries,
+            'db_ms': round(self.db_time * 1000, 1),
+            'pokeapi_calls': self.upstream_calls,
+            'pokeapi_ms': round(self.upstream_time * 1000, 1),
+            'cache': {
+                name: {'hits': self.cache[(name, 'hit')], 'misses': self.cache[(name, 'miss')]}
+                for name in self.cache_names()
+            },
+        }
+
+
+def current():
+    """The RequestMetrics of the request being served, or None outside of one."""
+    return _current.get()
+
+
+def record_upstream(seconds):
+    metrics = _current.get()
+    if metrics is not None:
+        metrics.add_upstream(seconds)
+
+
+def record_cache(name, hit):
+    metrics = _current.get()
+    if metrics is not None:
+        metrics.add_cache(name, hit)
+
+
+def in_request_context(func):
+    """
+    Wraps func so that each call runs in a copy of the caller's context, for thread pools:
+    ThreadPoolExecutor does not carry context variables over, so calls would go uncounted.
+    """
+    context = contextvars.copy_context()
+    return lambda *args, **kwargs: context.copy().run(func, *args, **kwargs)
+
+
+def process_memory():
+    """
+    (resident, private) bytes of this process: all the pages it has in memory, and those it shares
+    with no other process (what a preloaded worker really costs on top of the master). Linux only;
+    None elsewhere.
+    """
+    resident = private = 0
+    try:
+        with open('/proc/self/smaps_rollup') as smaps:
+            for line in smaps:
+                field, _, value = line.partition(':')
+                if field == 'Rss':
+                    resident = int(value.split()[0]) * 1024
+                elif field in ('Private_Clean', 'Private_Dirty'):
+                    private += int(value.split()[0]) * 1024
+    except (OSError, ValueError):
+        return None
+    return resident, private
+
+
+# -- DB queries ----------------------------------------------------------------
+
+def record_query(execute, sql, params, many, context):
+    """Execute wrapper (see Django's connection.execute_wrapper()) that times each query of a request."""
+    metrics = _current.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    started_at = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.add_query(time.perf_counter() - started_at)
+
+
+def _install_query_wrapper(sender, connection, **kwargs):
+    # Fires on every (re)connect of a per-thread connection object; it keeps its wrappers across them
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+def install():
+    """Counts the queries of every DB connection opened from now on. Called from AppConfig.ready()."""
+    connection_created.connect(_install_query_wrapper, dispatch_uid='pokedex_app.instrumentation')
+
+
+# -- Prometheus registry -------------------------------------------------------
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _labels(names, values):
+    if not names:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in zip(names, values)) + '}'
+
+
+class MetricsRegistry:
+    """Thread-safe counters and histograms of this process, rendered in the Prometheus text format."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._counters = defaultdict(float) # (metric name, label values) -> value
+            self._histograms = {} # (metric name, label values) -> [bucket counts, sum, count]
+
+    def inc(self, name, labels, amount=1):
+        with self._lock:
+            self._counters[(name, labels)] += amount
+
+    def observe(self, name, labels, value):
+        with self._lock:
+            histogram = self._histograms.setdefault((name, labels), [[0] * len(DURATION_BUCKETS), 0.0, 0])
+            position = bisect_left(DURATION_BUCKETS, value)
+            if position < len(DURATION_BUCKETS):
+                histogram[0][position] += 1
+            histogram[1] += value
+            histogram[2] += 1
+
+    def value(self, name, labels):
+        with self._lock:
+            return self._counters.get((name, labels), 0)
+
+    def record(self, metrics, method, status):
+        view = (metrics.view,)
+        self.inc('pokedex_http_requests_total', (metrics.view, method, str(status)))
+        self.observe('pokedex_http_request_duration_seconds', view, metrics.elapsed())
+        self.inc('pokedex_db_queries_total', view, metrics.db_queries)
+        self.inc('pokedex_db_query_seconds_total', view, metrics.db_time)
+        self.inc('pokedex_pokeapi_requests_total', view, metrics.upstream_calls)
+        self.inc('pokedex_pokeapi_request_seconds_total', view, metrics.upstream_time)
+        for (cache_name, result), lookups in metrics.cache.items():
+            self.inc('pokedex_cache_requests_total', (metrics.view, cache_name, result), lookups)
+
+    def render(self, extra=()):
+        """
+        The registry in the Prometheus text exposition format, followed by extra: (name, type, help,
+        value) for unlabelled process-wide figures the caller reads at scrape time.
+        """
+        with self._lock:
+            counters = dict(self._counters)
+            histograms = {key: (list(buckets), total, count) for key, (buckets, total, count) in self._histograms.items()}
+        lines = []
+        for name, help_text, label_names in METRICS:
+            kind = 'histogram' if name in HISTOGRAMS else 'counter'
+            lines += [f'# HELP {name} {help_text}', f'# TYPE {name} {kind}']
+            if kind == 'counter':
+                for (metric, labels), value in sorted(counters.items()):
+                    if metric == name:
+                        lines.append(f'{name}{_labels(label_names, labels)} {value:g}')
+                continue
+            for (metric, labels), (buckets, total, count) in sorted(histograms.items()):
+                if metric != name:
+                    continue
+                cumulative = 0
+                for bound, bucket_count in zip(DURATION_BUCKETS, buckets):
+                    cumulative += bucket_count
+                    lines.append(f'{name}_bucket{_labels(label_names + ("le",), labels + (f"{bound:g}",))} {cumulative}')
+                lines.append(f'{name}_bucket{_labels(label_names + ("le",), labels + ("+Inf",))} {count}')
+                lines.append(f'{name}_sum{_labels(label_names, labels)} {total:g}')
+                lines.append(f'{name}_count{_labels(label_names, labels)} {count}')
+        for name, kind, help_text, value in extra:
+            lines += [f'# HELP {name} {help_text}', f'# TYPE {name} {kind}', f'{name} {value:g}']
+        return '\n'.join(lines) + '\n'
+
+
+METRICS = (
+    ('pokedex_http_requests_total', 'Requests served, by view, method and status code.', ('view', 'method', 'status')),
+    ('pokedex_http_request_duration_seconds', 'Time to serve a request, by view.', ('view',)),
+    ('pokedex_db_queries_total', 'DB queries run while serving requests, by view.', ('view',)),
+    ('pokedex_db_query_seconds_total', 'Time spent in DB queries, by view.', ('view',)),
+    ('pokedex_pokeapi_requests_total', 'PokeAPI calls made while serving requests, by view (a call and its retries count once).', ('view',)),
+    ('pokedex_pokeapi_request_seconds_total', 'Time spent waiting on PokeAPI, by view, summed over concurrent calls.', ('view',)),
+    ('pokedex_cache_requests_total', 'Cache lookups, by view, cache and result (hit or miss).', ('view', 'cache', 'result')),
+)
+HISTOGRAMS = {'pokedex_http_request_duration_seconds'}
+
+registry = MetricsRegistry()
+
+
+# -- middleware and logging ----------------------------------------------------
+
+def _finish(request, response, metrics):
+    resolver_match = getattr(request, 'resolver_match', None)
+    if resolver_match is not None:
+        metrics.view = resolver_match.view_name
+    response['Server-Timing'] = metrics.server_timing()
+    registry.record(metrics, request.method, response.status_code)
+    summary = metrics.as_dict()
+    logger.info(
+        "%s %s %s %s %.1fms db=%s/%.1fms pokeapi=%s/%.1fms",
+        request.method, request.get_full_path(), response.status_code, metrics.view, summary['duration_ms'],
+        metrics.db_queries, summary['db_ms'], metrics.upstream_calls, summary['pokeapi_ms'],
+        extra={'request_metrics': {'method': request.method, 'path': request.path, 'status': response.status_code, **summary}},
+    )
+    return response
+
+
+@sync_and_async_middleware
+def request_metrics_middleware(get_response):
+    """Counts each request's work (see the module docstring). List it first in MIDDLEWARE so it times everything."""
+    if asyncio.iscoroutinefunction(get_response):
+        async def middleware(request):
+            metrics = RequestMetrics(request.path)
+            token = _current.set(metrics)
+            try:
+                response = await get_response(request)
+            finally:
+                _current.reset(token)
+            return _finish(request, response, metrics)
+        return middleware
+
+    def middleware(request):
+        metrics = RequestMetrics(request.path)
+        token = _current.set(metrics)
+        try:
+            response = get_response(request)
+        finally:
+            _current.reset(token)
+        return _finish(request, response, metrics)
+    return middleware
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    One JSON object per line, for log shippers. Adds the request's metrics to the request log line,
+    and the path of the request being served to any other line logged while it runs.
+    """
+
+    def format(self, record):
+        entry = {
+            'time': self.formatTime(record),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        request_metrics = getattr(record, 'request_metrics', None)
+        if request_metrics is not None:
+            entry.update(request_metrics)
+        else:
+            metrics = _current.get()
+            if metrics is not None:
+                entry['path'] = metrics.path
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry)
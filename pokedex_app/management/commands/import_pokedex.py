@@ -0,0 +1,211 @@
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import requests
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from pokedex_app import pokeapi
+from pokedex_app.ingest import (
+    ingest_pokemon_payloads, ingest_species_payloads, ingest_evolution_chains, ingest_type_payloads, resolve_names,
+)
+from pokedex_app.models import Ability
+
+# Large enough to list every resource of a kind in one page
+LIST_LIMIT = 100000
+
+# Import order. Each stage lists one PokeAPI resource and then, if `fetch_each`, pulls every entry.
+STAGES = [
+    {'resource': 'type', 'fetch_each': True}, # Each /type/ payload carries its damage relations
+    {'resource': 'ability', 'fetch_each': False},
+    {'resource': 'pokemon', 'fetch_each': True},
+    {'resource': 'pokemon-species', 'fetch_each': True},
+    {'resource': 'evolution-chain', 'fetch_each': True},
+]
+
+
+def dump_file_for(base_dir, path):
+    """'pokemon/bulbasaur/' -> <base_dir>/pokemon/bulbasaur.json, 'pokemon?limit=20' -> <base_dir>/pokemon.json"""
+    return Path(base_dir) / (path.split('?', 1)[0].strip('/') + '.json')
+
+
+def entry_key(entry):
+    """Listing entries carry a name, except evolution chains which only have a URL ending in their id."""
+    return entry.get('name') or entry['url'].rstrip('/').rsplit('/', 1)[-1]
+
+
+class NotFound(Exception):
+    """PokeAPI answered 404: the entry is listed but gone, and retrying will not bring it back."""
+
+
+class ApiSource:
+    """Reads documents from PokeAPI, optionally saving a copy of each one under dump_dir."""
+
+    def __init__(self, dump_dir=None):
+        self.dump_dir = dump_dir
+
+    def fetch(self, path):
+        response = pokeapi.fetch(path)
+        if response.status_code == 404:
+            raise NotFound(path)
+        if response.status_code != 200:
+            return None
+        data = response.json()
+        if self.dump_dir:
+            dump_file = dump_file_for(self.dump_dir, path)
+            dump_file.parent.mkdir(parents=True, exist_ok=True)
+            dump_file.write_text(json.dumps(data))
+        return data
+
+
+class DumpSource:
+    """Reads documents from a directory written by a previous `import_pokedex --dump-dir` run. No network."""
+
+    def __init__(self, from_dir):
+        self.from_dir = from_dir
+
+    def fetch(self, path):
+        dump_file = dump_file_for(self.from_dir, path)
+        if not dump_file.exists():
+            return None
+        return json.loads(dump_file.read_text())
+
+
+class Checkpoint:
+    """Remembers which entries of each stage are finished, so an interrupted run picks up where it stopped."""
+
+    def __init__(self, path, restart=False):
+        self.path = Path(path)
+        self.done = {}
+        if self.path.exists() and not restart:
+            self.done = {stage: set(keys) for stage, keys in json.loads(self.path.read_text()).items()}
+
+    def is_done(self, stage, key):
+        return key in self.done.get(stage, ())
+
+    def mark_done(self, stage, keys):
+        self.done.setdefault(stage, set()).update(keys)
+        # Write to a temp file and swap it in, so a kill mid-write never leaves a corrupt checkpoint
+        tmp_path = self.path.with_suffix('.tmp')
+        tmp_path.write_text(json.dumps({stage: sorted(keys) for stage, keys in self.done.items()}))
+        os.replace(tmp_path, self.path)
+
+    def clear(self):
+        if self.path.exists():
+            self.path.unlink()
+
+
+class Command(BaseCommand):
+    help = (
+        "Imports the complete Pokedex (types, abilities, pokemon, species and evolution chains) "
+        "into the local DB with parallel workers. Progress is checkpointed so interrupted runs resume."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=settings.POKEAPI_MAX_CONCURRENCY,
+                            help="Concurrent fetches (default: POKEAPI_MAX_CONCURRENCY).")
+        parser.add_argument('--batch-size', type=int, default=100,
+                            help="Entries fetched and written per batch / checkpoint.")
+        parser.add_argument('--limit', type=int, default=None,
+                            help="Only import the first N entries of each resource.")
+        parser.add_argument('--from-dir', default=None,
+                            help="Load from a directory of saved JSON dumps instead of PokeAPI (offline import).")
+        parser.add_argument('--dump-dir', default=None,
+                            help="Save every fetched document under this directory, for later --from-dir runs.")
+        parser.add_argument('--checkpoint', default=str(settings.BASE_DIR / '.import_pokedex_checkpoint.json'),
+                            help="Checkpoint file used to resume an interrupted import.")
+        parser.add_argument('--restart', action='store_true',
+                            help="Ignore any existing checkpoint and import everything again.")
+
+    def handle(self, *args, **options):
+        if options['from_dir'] and options['dump_dir']:
+            raise CommandError("--from-dir and --dump-dir cannot be combined.")
+        if options['from_dir']:
+            if not Path(options['from_dir']).is_dir():
+                raise CommandError(f"Dump directory {options['from_dir']} does not exist.")
+            self.source = DumpSource(options['from_dir'])
+        else:
+            self.source = ApiSource(options['dump_dir'])
+        self.workers = max(1, options['workers'])
+        self.batch_size = max(1, options['batch_size'])
+        self.limit = options['limit']
+        self.checkpoint = Checkpoint(options['checkpoint'], restart=options['restart'])
+        self.failed = 0
+        self.not_found = 0
+
+        started_at = time.perf_counter()
+        for stage in STAGES:
+            self.run_stage(stage)
+        elapsed = time.perf_counter() - started_at
+        skipped = f" {self.not_found} listed entries were not found upstream and were skipped." if self.not_found else ""
+        if self.failed:
+            self.stdout.write(self.style.WARNING(
+                f"Import finished in {elapsed:.1f}s with {self.failed} entries missing. "
+                f"Re-run the command to retry them (checkpoint kept at {self.checkpoint.path}).{skipped}"
+            ))
+            return
+        self.checkpoint.clear()
+        self.stdout.write(self.style.SUCCESS(f"Import finished in {elapsed:.1f}s.{skipped}"))
+
+    def fetch(self, path):
+        try:
+            return self.source.fetch(path)
+        except requests.RequestException as e:
+            self.stderr.write(f"  Failed to fetch {path}: {e}")
+            return None
+
+    def fetch_entry(self, path):
+        """(document, not_found) for one listed entry. A 404 is not retried: the entry counts as done."""
+        try:
+            return self.fetch(path), False
+        except NotFound:
+            self.stderr.write(f"  {path} is listed but not found; skipping it.")
+            return None, True
+
+    def run_stage(self, stage):
+        resource = stage['resource']
+        try:
+            listing = self.fetch(f'{resource}?limit={LIST_LIMIT}')
+        except NotFound:
+            listing = None
+        if listing is None:
+            raise CommandError(f"Could not list '{resource}'. Re-run the command to resume from the checkpoint.")
+        entries = listing.get('results', [])[:self.limit]
+        keys = [entry_key(entry) for entry in entries]
+
+        if not stage['fetch_each']:
+            resolve_names({'ability': Ability}[resource], keys)
+            self.checkpoint.mark_done(resource, keys)
+            self.stdout.write(f"{resource}: {len(keys)} imported.")
+            return
+
+        pending = [key for key in keys if not self.checkpoint.is_done(resource, key)]
+        self.stdout.write(f"{resource}: {len(keys)} listed, {len(keys) - len(pending)} already imported, {len(pending)} to go.")
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            for offset in range(0, len(pending), self.batch_size):
+                batch_keys = pending[offset:offset + self.batch_size]
+                batch_started_at = time.perf_counter()
+                results = list(executor.map(lambda key: self.fetch_entry(f'{resource}/{key}/'), batch_keys))
+                self.store(resource, [document for document, _ in results if document])
+                # Entries that arrived or are gone upstream count as done; other failures are retried on the next run
+                done_keys = [key for key, (document, not_found) in zip(batch_keys, results) if document or not_found]
+                self.checkpoint.mark_done(resource, done_keys)
+                self.not_found += sum(not_found for _, not_found in results)
+                self.failed += len(batch_keys) - len(done_keys)
+                self.stdout.write(
+                    f"  {resource}: {min(offset + self.batch_size, len(pending))}/{len(pending)} "
+                    f"({time.perf_counter() - batch_started_at:.2f}s for this batch)"
+                )
+
+    def store(self, resource, documents):
+        if resource == 'type':
+            ingest_type_payloads(documents)
+        elif resource == 'pokemon':
+            ingest_pokemon_payloads(documents)
+        elif resource == 'pokemon-species':
+            ingest_species_payloads(documents)
+        elif resource == 'evolution-chain':
+            ingest_evolution_chains(documents)
@@ -0,0 +1,41 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from pokedex_app.models import Pokemon
+from pokedex_app.sprites import sprite_store
+
+
+class Command(BaseCommand):
+    help = (
+        "Downloads the sprite of every Pokemon in the DB into the local sprite cache (POKEDEX_SPRITE_DIR), "
+        "so no page visit waits on GitHub. Sprites already cached are skipped; re-run to retry failures."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=settings.POKEAPI_MAX_CONCURRENCY,
+                            help="Concurrent downloads (default: POKEAPI_MAX_CONCURRENCY).")
+        parser.add_argument('--limit', type=int, default=None,
+                            help="Only consider the first N Pokemon by Pokedex number.")
+
+    def handle(self, *args, **options):
+        sprite_urls = list(
+            Pokemon.objects.exclude(sprite_url__isnull=True).exclude(sprite_url='')
+            .order_by('pokeapi_id').values_list('sprite_url', flat=True)[:options['limit']]
+        )
+        pending = list(dict.fromkeys(url for url in sprite_urls if sprite_store.lookup(url) is None))
+        self.stdout.write(f"{len(sprite_urls)} sprites, {len(sprite_urls) - len(pending)} already cached, {len(pending)} to download.")
+
+        started_at = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=max(1, options['workers'])) as executor:
+            sprites = list(executor.map(sprite_store.fetch, pending))
+        failed = sprites.count(None)
+        elapsed = time.perf_counter() - started_at
+        if failed:
+            self.stdout.write(self.style.WARNING(
+                f"Downloaded {len(pending) - failed}/{len(pending)} sprites in {elapsed:.1f}s. Re-run the command to retry the rest."
+            ))
+            return
+        self.stdout.write(self.style.SUCCESS(f"Downloaded {len(pending)} sprites in {elapsed:.1f}s."))
@@ -0,0 +1,41 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db.models import F, Q
+from django.utils import timezone
+
+from pokedex_app.models import Pokemon
+from pokedex_app.views import hydrate_pokemon
+
+
+class Command(BaseCommand):
+    help = (
+        "Re-syncs stale Pokemon from PokeAPI: never synced, missing stats, or synced longer ago than "
+        "POKEDEX_REFRESH_MAX_AGE. Oldest first. Meant to run periodically (cron, systemd timer)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--max-age', type=int, default=settings.POKEDEX_REFRESH_MAX_AGE,
+                            help="Refresh Pokemon synced longer ago than this many seconds.")
+        parser.add_argument('--limit', type=int, default=None,
+                            help="Refresh at most this many Pokemon in this run.")
+        parser.add_argument('--batch-size', type=int, default=100,
+                            help="Pokemon fetched and written per batch.")
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(seconds=options['max_age'])
+        stale_names = list(
+            Pokemon.objects.filter(
+                Q(last_synced_at__isnull=True) | Q(last_synced_at__lt=cutoff) | Q(stat_total__isnull=True)
+            )
+            .order_by(F('last_synced_at').asc(nulls_first=True))
+            .values_list('name', flat=True)[:options['limit']]
+        )
+        self.stdout.write(f"{len(stale_names)} stale Pokemon to refresh.")
+
+        refreshed = 0
+        batch_size = max(1, options['batch_size'])
+        for offset in range(0, len(stale_names), batch_size):
+            refreshed += hydrate_pokemon(stale_names[offset:offset + batch_size], label='refresh', refresh=True)
+        self.stdout.write(self.style.SUCCESS(f"Refreshed {refreshed}/{len(stale_names)} Pokemon."))
@@ -0,0 +1,72 @@
+# Generated by Django 4.2.30 on 2026-10-18 03:51
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Ability',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='EvolutionChain',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('pokeapi_id', models.IntegerField(unique=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Type',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Species',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True)),
+                ('chain', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='species', to='pokedex_app.evolutionchain')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Pokemon',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('pokeapi_id', models.IntegerField(unique=True)),
+                ('name', models.CharField(max_length=100, unique=True)),
+                ('height', models.IntegerField(blank=True, null=True)),
+                ('weight', models.IntegerField(blank=True, null=True)),
+                ('sprite_url', models.URLField(blank=True, max_length=255, null=True)),
+                ('stats', models.JSONField(blank=True, null=True)),
+                ('last_synced_at', models.DateTimeField(blank=True, db_index=True, null=True)),
+                ('abilities', models.ManyToManyField(related_name='pokemons', to='pokedex_app.ability')),
+                ('species', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='varieties', to='pokedex_app.species')),
+                ('types', models.ManyToManyField(related_name='pokemons', to='pokedex_app.type')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='EvolutionEdge',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('chain', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='edges', to='pokedex_app.evolutionchain')),
+                ('from_species', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='evolves_to_edges', to='pokedex_app.species')),
+                ('to_species', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='evolves_from_edges', to='pokedex_app.species')),
+            ],
+            options={
+                'unique_together': {('from_species', 'to_species')},
+            },
+        ),
+    ]
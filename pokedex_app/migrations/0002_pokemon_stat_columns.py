@@ -0,0 +1,116 @@
+# Generated by Django 4.2.30 on 2026-10-18 03:51
+
+from django.db import migrations, models
+
+# Frozen copy of models.STAT_FIELDS as of this migration
+STAT_FIELDS = {
+    'hp': 'hp',
+    'attack': 'attack',
+    'defense': 'defense',
+    'special-attack': 'special_attack',
+    'special-defense': 'special_defense',
+    'speed': 'speed',
+}
+
+
+def copy_stats_to_columns(apps, schema_editor):
+    Pokemon = apps.get_model('pokedex_app', 'Pokemon')
+    to_update = []
+    for pokemon in Pokemon.objects.exclude(stats=None).only('pk', 'stats').iterator():
+        stats = pokemon.stats or {}
+        for stat_name, column in STAT_FIELDS.items():
+            setattr(pokemon, column, stats.get(stat_name))
+        known_values = [stats[stat_name] for stat_name in STAT_FIELDS if stat_name in stats]
+        pokemon.stat_total = sum(known_values) if known_values else None
+        to_update.append(pokemon)
+    Pokemon.objects.bulk_update(to_update, list(STAT_FIELDS.values()) + ['stat_total'], batch_size=500)
+
+
+def copy_columns_to_stats(apps, schema_editor):
+    Pokemon = apps.get_model('pokedex_app', 'Pokemon')
+    to_update = []
+    for pokemon in Pokemon.objects.exclude(stat_total=None).iterator():
+        pokemon.stats = {
+            stat_name: getattr(pokemon, column) for stat_name, column in STAT_FIELDS.items()
+            if getattr(pokemon, column) is not None
+        }
+        to_update.append(pokemon)
+    Pokemon.objects.bulk_update(to_update, ['stats'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pokedex_app', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pokemon',
+            name='attack',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='pokemon',
+            name='defense',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='pokemon',
+            name='hp',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='pokemon',
+            name='special_attack',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='pokemon',
+            name='special_defense',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='pokemon',
+            name='speed',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='pokemon',
+            name='stat_total',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='pokemon',
+            index=models.Index(fields=['hp', 'pokeapi_id'], name='pokemon_hp_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pokemon',
+            index=models.Index(fields=['attack', 'pokeapi_id'], name='pokemon_attack_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pokemon',
+            index=models.Index(fields=['defense', 'pokeapi_id'], name='pokemon_defense_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pokemon',
+            index=models.Index(fields=['special_attack', 'pokeapi_id'], name='pokemon_special_attack_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pokemon',
+            index=models.Index(fields=['special_defense', 'pokeapi_id'], name='pokemon_special_defense_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pokemon',
+            index=models.Index(fields=['speed', 'pokeapi_id'], name='pokemon_speed_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pokemon',
+            index=models.Index(fields=['stat_total', 'pokeapi_id'], name='pokemon_stat_total_idx'),
+        ),
+        migrations.RunPython(copy_stats_to_columns, copy_columns_to_stats),
+        migrations.RemoveField(
+            model_name='pokemon',
+            name='stats',
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 4.2.30 on 2026-10-18 03:55
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pokedex_app', '0002_pokemon_stat_columns'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='type',
+            name='relations_synced_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.CreateModel(
+            name='TypeEffectiveness',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('multiplier', models.FloatField()),
+                ('attacking_type', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='effectiveness_as_attacker', to='pokedex_app.type')),
+                ('defending_type', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='effectiveness_as_defender', to='pokedex_app.type')),
+            ],
+            options={
+                'unique_together': {('attacking_type', 'defending_type')},
+            },
+        ),
+    ]
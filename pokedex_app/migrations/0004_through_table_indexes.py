@@ -0,0 +1,25 @@
+from django.db import migrations
+
+# The auto-created Pokemon.types / Pokemon.abilities tables are indexed by (pokemon_id, type_id), for
+# a Pokemon's types, and by type_id alone. Reverse lookups (types__name='fire': every Pokemon of a type)
+# go through type_id, then need pokemon_id from each row; with (type_id, pokemon_id) the index alone
+# answers them, on SQLite and Postgres alike. Plain SQL, as these tables have no model to hang Meta.indexes on.
+THROUGH_INDEXES = [
+    ('pokemon_types_reverse_idx', 'pokedex_app_pokemon_types', 'type_id'),
+    ('pokemon_abilities_reverse_idx', 'pokedex_app_pokemon_abilities', 'ability_id'),
+]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pokedex_app', '0003_type_effectiveness'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            sql=f'CREATE INDEX {name} ON {table} ({column}, pokemon_id)',
+            reverse_sql=f'DROP INDEX {name}',
+        )
+        for name, table, column in THROUGH_INDEXES
+    ]
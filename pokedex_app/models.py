@@ -1,19 +1,68 @@
 from django.db import models
 
-# Create your models here.
+from .sprites import sprite_src
+
+# PokeAPI stat name -> Pokemon column. The columns are indexed, so stat sorts and ranges are index scans.
+STAT_FIELDS = {
+    'hp': 'hp',
+    'attack': 'attack',
+    'defense': 'defense',
+    'special-attack': 'special_attack',
+    'special-defense': 'special_defense',
+    'speed': 'speed',
+}
 
 class Type(models.Model):
     name = models.CharField(max_length=100, unique=True)
+    # Set once this type's own /type/ payload (its damage relations) has been stored
+    relations_synced_at = models.DateTimeField(null=True, blank=True)
 
     def __str__(self):
         return self.name.capitalize()
 
+class TypeEffectiveness(models.Model):
+    """Damage multiplier of attacking_type's moves against defending_type. Only non-neutral pairs (not 1x) are stored."""
+    attacking_type = models.ForeignKey(Type, on_delete=models.CASCADE, related_name='effectiveness_as_attacker')
+    defending_type = models.ForeignKey(Type, on_delete=models.CASCADE, related_name='effectiveness_as_defender')
+    multiplier = models.FloatField() # 0, 0.5 or 2
+
+    class Meta:
+        unique_together = ('attacking_type', 'defending_type')
+
+    def __str__(self):
+        return f"{self.attacking_type} -> {self.defending_type}: x{self.multiplier:g}"
+
 class Ability(models.Model):
     name = models.CharField(max_length=100, unique=True)
 
     def __str__(self):
         return self.name.capitalize()
 
+class EvolutionChain(models.Model):
+    pokeapi_id = models.IntegerField(unique=True)
+
+    def __str__(self):
+        return f"Evolution chain #{self.pokeapi_id}"
+
+class Species(models.Model):
+    name = models.CharField(max_length=100, unique=True)
+    chain = models.ForeignKey(EvolutionChain, null=True, blank=True, on_delete=models.SET_NULL, related_name='species')
+
+    def __str__(self):
+        return self.name.capitalize()
+
+class EvolutionEdge(models.Model):
+    """One 'evolves into' step of an evolution chain (adjacency list)."""
+    chain = models.ForeignKey(EvolutionChain, on_delete=models.CASCADE, related_name='edges')
+    from_species = models.ForeignKey(Species, on_delete=models.CASCADE, related_name='evolves_to_edges')
+    to_species = models.ForeignKey(Species, on_delete=models.CASCADE, related_name='evolves_from_edges')
+
+    class Meta:
+        unique_together = ('from_species', 'to_species')
+
+    def __str__(self):
+        return f"{self.from_species} -> {self.to_species}"
+
 class Pokemon(models.Model):
     pokeapi_id = models.IntegerField(unique=True)
     name = models.CharField(max_length=100, unique=True)
@@ -22,7 +71,44 @@ class Pokemon(models.Model):
     sprite_url = models.URLField(max_length=255, null=True, blank=True)
     types = models.ManyToManyField(Type, related_name='pokemons')
     abilities = models.ManyToManyField(Ability, related_name='pokemons')
-    stats = models.JSONField(null=True, blank=True)
+    # Base stats, NULL until synced; stat_total is their sum
+    hp = models.IntegerField(null=True, blank=True)
+    attack = models.IntegerField(null=True, blank=True)
+    defense = models.IntegerField(null=True, blank=True)
+    special_attack = models.IntegerField(null=True, blank=True)
+    special_defense = models.IntegerField(null=True, blank=True)
+    speed = models.IntegerField(null=True, blank=True)
+    stat_total = models.IntegerField(null=True, blank=True)
+    species = models.ForeignKey(Species, null=True, blank=True, on_delete=models.SET_NULL, related_name='varieties')
+    last_synced_at = models.DateTimeField(null=True, blank=True, db_index=True) # Last successful sync from the API
+
+    class Meta:
+        # (stat, pokeapi_id) so "ORDER BY speed DESC, pokeapi_id" and "WHERE speed BETWEEN ..." are both index scans
+        indexes = [
+            models.Index(fields=[column, 'pokeapi_id'], name=f'pokemon_{column}_idx')
+            for column in list(STAT_FIELDS.values()) + ['stat_total']
+        ]
 
     def __str__(self):
         return self.name.capitalize()
+
+    @property
+    def sprite_src(self):
+        """Where pages load the sprite from: the local copy (see sprites.py) rather than sprite_url itself."""
+        return sprite_src(self.pokeapi_id, self.sprite_url)
+
+    @property
+    def stats(self):
+        """The base stats as {'hp': 45, 'attack': 49, ...}, in PokeAPI order; empty until synced."""
+        return {
+            stat_name: getattr(self, column) for stat_name, column in STAT_FIELDS.items()
+            if getattr(self, column) is not None
+        }
+
+    @stats.setter
+    def stats(self, stats):
+        stats = stats or {}
+        for stat_name, column in STAT_FIELDS.items():
+            setattr(self, column, stats.get(stat_name))
+        known_values = [stats[stat_name] for stat_name in STAT_FIELDS if stat_name in stats]
+        self.stat_total = sum(known_values) if known_values else None
@@ -0,0 +1,142 @@
+"""
+Full-page caching for the Pokedex views, plus the evolution-chain fragment cache.
+
+Detail pages are cached per Pokemon name and the evolution fragment per chain, so a re-sync
+deletes exactly those keys. List and compare pages depend on arbitrary combinations of rows;
+their keys embed a generation number that every data change bumps, which retires all of them
+at once without having to enumerate them. Detail keys embed the stats matrix's generation too,
+since their similar-Pokemon panel ranks the Pokemon against the whole dex. Invalidation is wired up in signals.py.
+
+A cached page can outlive the freshness of the data it shows: a view marks the response with
+mark_refresh_due(), and hits after that time call the decorator's on_refresh_due, so the
+background re-sync (refresh.py) still gets queued while the page is served from the cache.
+"""
+import asyncio
+import hashlib
+import time
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.core.cache.utils import make_template_fragment_key
+from django.http import HttpResponse
+
+from . import instrumentation
+from .stats_matrix import stats_matrix
+
+GENERATION_KEY = 'pokedex:pages:generation'
+EVOLUTION_FRAGMENT_NAME = 'evolution_chain'
+
+
+def _digest(value):
+    return hashlib.md5(value.encode('utf-8')).hexdigest()
+
+
+def detail_key(pokemon_name):
+    return f'pokedex:detail:{stats_matrix.generation()}:{_digest(pokemon_name.lower())}'
+
+
+def evolution_fragment_key(chain_id):
+    """Same key the {% cache %} tag in pokemon_detail.html computes for this chain."""
+    return make_template_fragment_key(EVOLUTION_FRAGMENT_NAME, [chain_id])
+
+
+def generation():
+    value = cache.get(GENERATION_KEY)
+    if value is None:
+        cache.add(GENERATION_KEY, time.time_ns(), None)
+        value = cache.get(GENERATION_KEY)
+    return value
+
+
+def bump_generation():
+    cache.set(GENERATION_KEY, time.time_ns(), None)
+
+
+def listing_key(view_name):
+    """Key function for views whose output depends on the query string and on any row in the DB."""
+    def key_func(request, *args, **kwargs):
+        query = '&'.join(sorted(request.GET.urlencode().split('&')))
+        return f'pokedex:{view_name}:{generation()}:{_digest(query)}'
+    return key_func
+
+
+def invalidate(pokemon_names=(), chain_ids=()):
+    """Drops the detail pages of pokemon_names, the fragments of chain_ids and every list/compare page."""
+    keys = [detail_key(name) for name in pokemon_names] + [evolution_fragment_key(chain_id) for chain_id in chain_ids]
+    if keys:
+        cache.delete_many(keys)
+    bump_generation()
+
+
+def skip_page_cache(response):
+    """Marks a response (e.g. an error page caused by an upstream failure) as not cacheable."""
+    response.skip_page_cache = True
+    return response
+
+
+def mark_refresh_due(response, due_at):
+    """Records that the data on a page goes stale at due_at (a UNIX timestamp; None for never)."""
+    response.refresh_due_at = due_at
+    return response
+
+
+def _cached_response(key, on_refresh_due=None):
+    cached = cache.get(key)
+    instrumentation.record_cache('page', cached is not None)
+    if cached is None:
+        return None
+    content, content_type, *rest = cached # Entries written before refresh_due_at existed have two fields
+    refresh_due_at = rest[0] if rest else None
+    if on_refresh_due is not None and refresh_due_at is not None and time.time() >= refresh_due_at:
+        on_refresh_due()
+    response = HttpResponse(content, content_type=content_type)
+    response['X-Page-Cache'] = 'HIT'
+    return response
+
+
+def _store_response(key, response):
+    if response.status_code == 200 and not getattr(response, 'skip_page_cache', False):
+        cache.set(
+            key, (response.content, response['Content-Type'], getattr(response, 'refresh_due_at', None)),
+            settings.POKEDEX_PAGE_CACHE_TIMEOUT,
+        )
+    response['X-Page-Cache'] = 'MISS'
+    return response
+
+
+def cached_page(key_func, on_refresh_due=None):
+    """
+    Caches successful GET responses of a view under key_func(request, *args, **kwargs).
+    Only the body and content type are stored; the X-Page-Cache header tells hits from misses.
+    on_refresh_due(request, *args, **kwargs) runs on hits past the page's mark_refresh_due() time.
+    Works on sync and async views; for async ones the cache is read and written off the event loop.
+    """
+    def decorator(view_func):
+        if asyncio.iscoroutinefunction(view_func):
+            @wraps(view_func)
+            async def async_wrapper(request, *args, **kwargs):
+                if request.method != 'GET':
+                    return await view_func(request, *args, **kwargs)
+                key = await sync_to_async(key_func)(request, *args, **kwargs)
+                refresh = (lambda: on_refresh_due(request, *args, **kwargs)) if on_refresh_due else None
+                response = await sync_to_async(_cached_response)(key, refresh)
+                if response is not None:
+                    return response
+                response = await view_func(request, *args, **kwargs)
+                return await sync_to_async(_store_response)(key, response)
+            return async_wrapper
+
+        @wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            if request.method != 'GET':
+                return view_func(request, *args, **kwargs)
+            key = key_func(request, *args, **kwargs)
+            refresh = (lambda: on_refresh_due(request, *args, **kwargs)) if on_refresh_due else None
+            response = _cached_response(key, refresh)
+            if response is not None:
+                return response
+            return _store_response(key, view_func(request, *args, **kwargs))
+        return wrapper
+    return decorator
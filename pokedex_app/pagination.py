@@ -0,0 +1,131 @@
+"""
+Keyset (seek) pagination over Pokemon.pokeapi_id.
+
+Paginator runs a COUNT(*) and an OFFSET scan per page, and both get slower with depth,
+especially when a type/ability filter joins through the M2M tables. A keyset page instead
+asks for the rows just after (or before) the last pokeapi_id seen, which is an index range
+scan of per_page + 1 rows no matter how deep the page is. Positions travel as opaque cursor
+tokens so the encoding can change without breaking clients that just pass them back.
+"""
+import base64
+import binascii
+
+from .filter_index import ids_after, ids_before
+
+NEXT = 'n'
+PREVIOUS = 'p'
+# Largest pokeapi_id a cursor may carry: the top of an IntegerField on every backend
+MAX_CURSOR_ID = 2 ** 31 - 1
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(direction, pokeapi_id):
+    return base64.urlsafe_b64encode(f'{direction}{pokeapi_id}'.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    """Returns (direction, pokeapi_id) for a token made by encode_cursor(); raises InvalidCursor otherwise."""
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)).decode()
+        direction, pokeapi_id = raw[:1], int(raw[1:])
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise InvalidCursor(f"Invalid cursor: {token!r}")
+    if direction not in (NEXT, PREVIOUS) or not 0 <= pokeapi_id <= MAX_CURSOR_ID:
+        raise InvalidCursor(f"Invalid cursor: {token!r}")
+    return direction, pokeapi_id
+
+
+class KeysetPage:
+    """One page of rows plus the cursors of its neighbours (None at either end)."""
+
+    def __init__(self, object_list, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next or self.has_previous
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+
+def keyset_page(queryset, cursor, per_page):
+    """
+    Returns the KeysetPage of queryset at cursor (None or '' for the first page), ordered by pokeapi_id.
+    One query. Raises InvalidCursor for a malformed token.
+    """
+    if not cursor:
+        rows = list(queryset.order_by('pokeapi_id')[:per_page + 1])
+        has_more = len(rows) > per_page
+        rows = rows[:per_page]
+        next_cursor = encode_cursor(NEXT, rows[-1].pokeapi_id) if has_more else None
+        return KeysetPage(rows, next_cursor=next_cursor)
+
+    direction, anchor_id = decode_cursor(cursor)
+    if direction == NEXT:
+        rows = list(queryset.filter(pokeapi_id__gt=anchor_id).order_by('pokeapi_id')[:per_page + 1])
+        has_more = len(rows) > per_page
+        rows = rows[:per_page]
+        has_next, has_previous = has_more, True
+    else:
+        rows = list(queryset.filter(pokeapi_id__lt=anchor_id).order_by('-pokeapi_id')[:per_page + 1])
+        has_more = len(rows) > per_page
+        rows = rows[:per_page][::-1]
+        has_next, has_previous = True, has_more
+
+    if not rows:
+        return KeysetPage(rows)
+    return KeysetPage(
+        rows,
+        next_cursor=encode_cursor(NEXT, rows[-1].pokeapi_id) if has_next else None,
+        previous_cursor=encode_cursor(PREVIOUS, rows[0].pokeapi_id) if has_previous else None,
+    )
+
+
+def keyset_page_of_ids(bits, cursor, per_page):
+    """
+    Same as keyset_page() over a bitset of pokeapi_ids (see filter_index.py) instead of a queryset.
+    Runs no query: the page's object_list holds pokeapi_ids for the caller to load.
+    Raises InvalidCursor for a malformed token, or one anchored past the last id of the bitset.
+    """
+    if not cursor:
+        direction, anchor_id = NEXT, -1
+    else:
+        direction, anchor_id = decode_cursor(cursor)
+        # A real anchor is an id the bitset held, at most one past its last id once it dropped out
+        if anchor_id > bits.bit_length():
+            raise InvalidCursor(f"Cursor past the last id: {cursor!r}")
+    if direction == NEXT:
+        ids = ids_after(bits, anchor_id, per_page + 1)
+        has_next, has_previous = len(ids) > per_page, bool(cursor)
+        ids = ids[:per_page]
+    else:
+        ids = ids_before(bits, anchor_id, per_page + 1)
+        has_next, has_previous = True, len(ids) > per_page
+        ids = ids[-per_page:]
+
+    if not ids:
+        return KeysetPage(ids)
+    return KeysetPage(
+        ids,
+        next_cursor=encode_cursor(NEXT, ids[-1]) if has_next else None,
+        previous_cursor=encode_cursor(PREVIOUS, ids[0]) if has_previous else None,
+    )
@@ -0,0 +1,430 @@
+"""
+Shared PokeAPI client.
+
+Every call to PokeAPI goes through get() so that the whole app reuses one pooled
+keep-alive requests.Session with connect/read timeouts and retry-with-backoff on
+429/5xx, behind a circuit breaker (`breaker`) that fails fast while PokeAPI is down.
+Counters for requests, retries and latency are kept in `stats`, and each call is also
+counted against the request being served (instrumentation.py).
+
+fetch() layers the response cache (see response_cache.py) on top of get() and is what
+views should use for JSON resources.
+
+aget() and afetch() are the same for async views: an httpx.AsyncClient per event loop with
+the same timeouts, retries, breaker, stats and response cache. They raise the same
+requests exceptions as get(), so callers handle failures alike either way.
+"""
+import asyncio
+import json
+import logging
+import threading
+import time
+import weakref
+from collections import deque
+
+import httpx
+import requests
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from . import instrumentation
+from .response_cache import response_cache
+
+logger = logging.getLogger(__name__)
+
+# URLs embedded in API payloads (species, evolution chains, ...) always point here.
+# They are rewritten onto POKEAPI_BASE_URL so a local stub server sees them too.
+CANONICAL_BASE_URL = 'https://pokeapi.co/api/v2/'
+
+
+class ClientStats:
+    """Thread-safe counters for PokeAPI traffic."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.requests = 0
+            self.retries = 0
+            self.errors = 0
+            self.short_circuited = 0
+            self.total_latency = 0.0
+            self.max_latency = 0.0
+
+    def record_request(self, latency, failed=False):
+        with self._lock:
+            self.requests += 1
+            if failed:
+                self.errors += 1
+            self.total_latency += latency
+            self.max_latency = max(self.max_latency, latency)
+        instrumentation.record_upstream(latency)
+
+    def record_retry(self):
+        with self._lock:
+            self.retries += 1
+
+    def record_short_circuit(self):
+        with self._lock:
+            self.short_circuited += 1
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'requests': self.requests,
+                'retries': self.retries,
+                'errors': self.errors,
+                'short_circuited': self.short_circuited,
+                'total_latency': self.total_latency,
+                'avg_latency': self.total_latency / self.requests if self.requests else 0.0,
+                'max_latency': self.max_latency,
+            }
+
+
+stats = ClientStats()
+
+
+class CircuitOpenError(requests.ConnectionError):
+    """Raised instead of calling PokeAPI while the circuit breaker is open."""
+
+
+class CircuitBreaker:
+    """
+    Stops calling PokeAPI while it is failing, so workers answer from the DB and the caches
+    instead of each waiting out timeouts and retries.
+
+    Closed: calls go through; outcomes of the last POKEAPI_BREAKER_WINDOW seconds are tracked.
+    Once at least POKEAPI_BREAKER_MIN_REQUESTS calls were made and POKEAPI_BREAKER_ERROR_RATE
+    of them failed (connection error, timeout, 429 or 5xx), the breaker opens.
+    Open: every call fails fast with CircuitOpenError for POKEAPI_BREAKER_COOLDOWN seconds.
+    Half-open: one trial call goes through; success closes the breaker, failure re-opens it.
+    """
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half-open'
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self._outcomes = deque() # (time, failed) within the window
+            self._opened_at = 0.0
+            self.trips = 0
+
+    def allow(self):
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and time.monotonic() - self._opened_at >= settings.POKEAPI_BREAKER_COOLDOWN:
+                self.state = self.HALF_OPEN # This caller makes the trial call; others keep failing fast
+                return True
+            return False
+
+    def record(self, failed):
+        with self._lock:
+            now = time.monotonic()
+            if self.state == self.HALF_OPEN:
+                if failed:
+                    self._open(now)
+                else:
+                    self.state = self.CLOSED
+                    self._outcomes.clear()
+                    logger.info("PokeAPI recovered, circuit closed.")
+                return
+            if self.state == self.OPEN:
+                return
+            self._outcomes.append((now, failed))
+            while self._outcomes and self._outcomes[0][0] < now - settings.POKEAPI_BREAKER_WINDOW:
+                self._outcomes.popleft()
+            failures = sum(1 for _, outcome_failed in self._outcomes if outcome_failed)
+            if len(self._outcomes) >= settings.POKEAPI_BREAKER_MIN_REQUESTS and failures / len(self._outcomes) >= settings.POKEAPI_BREAKER_ERROR_RATE:
+                self._open(now)
+
+    def _open(self, now):
+        self.state = self.OPEN
+        self._opened_at = now
+        self._outcomes.clear()
+        self.trips += 1
+        logger.warning("PokeAPI is failing, circuit open for %ss.", settings.POKEAPI_BREAKER_COOLDOWN)
+
+
+breaker = CircuitBreaker()
+
+
+class _CountingRetry(Retry):
+    """Retry policy that reports every retry attempt to `stats`."""
+
+    def increment(self, *args, **kwargs):
+        stats.record_retry()
+        return super().increment(*args, **kwargs)
+
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def _build_session():
+    retry = _CountingRetry(
+        total=settings.POKEAPI_MAX_RETRIES,
+        backoff_factor=settings.POKEAPI_RETRY_BACKOFF,
+        status_forcelist=(429, 500, 502, 503, 504),
+        allowed_methods=frozenset(['GET', 'HEAD']),
+        respect_retry_after_header=True,
+        raise_on_status=False, # Hand the last 429/5xx back to the caller instead of raising
+    )
+    adapter = HTTPAdapter(
+        pool_connections=4,
+        pool_maxsize=settings.POKEAPI_POOL_SIZE,
+        max_retries=retry,
+    )
+    session = requests.Session()
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    session.headers.update({'Accept': 'application/json'})
+    return session
+
+
+def get_session():
+    """Returns the process-wide session, creating it on first use."""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                _session = _build_session()
+    return _session
+
+
+def close_session():
+    """Drops the pooled session (its connections are closed). The next call builds a fresh one."""
+    global _session
+    with _session_lock:
+        if _session is not None:
+            _session.close()
+            _session = None
+
+
+def api_url(path_or_url):
+    """Turns 'pokemon/1/' or an absolute PokeAPI URL into a URL under POKEAPI_BASE_URL."""
+    base_url = settings.POKEAPI_BASE_URL.rstrip('/') + '/'
+    if path_or_url.startswith(CANONICAL_BASE_URL):
+        return base_url + path_or_url[len(CANONICAL_BASE_URL):]
+    if path_or_url.startswith(('http://', 'https://')):
+        return path_or_url
+    return base_url + path_or_url.lstrip('/')
+
+
+def get(path_or_url, **kwargs):
+    """
+    GET a PokeAPI resource over the shared session.
+    Returns the requests.Response (check status_code); raises requests.RequestException on
+    connection errors and timeouts once retries are exhausted, and CircuitOpenError (a
+    ConnectionError) without calling out while the circuit breaker is open.
+    """
+    if not breaker.allow():
+        stats.record_short_circuit()
+        raise CircuitOpenError(f"PokeAPI circuit is open; not requesting {path_or_url}")
+    kwargs.setdefault('timeout', (settings.POKEAPI_CONNECT_TIMEOUT, settings.POKEAPI_READ_TIMEOUT))
+    started_at = time.perf_counter()
+    try:
+        response = get_session().get(api_url(path_or_url), **kwargs)
+    except requests.RequestException:
+        stats.record_request(time.perf_counter() - started_at, failed=True)
+        breaker.record(failed=True)
+        raise
+    stats.record_request(time.perf_counter() - started_at, failed=response.status_code >= 500)
+    breaker.record(failed=response.status_code >= 500 or response.status_code == 429)
+    return response
+
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+_async_clients = weakref.WeakKeyDictionary() # event loop -> its httpx.AsyncClient
+
+
+def get_async_client():
+    """
+    Returns the httpx.AsyncClient of the running event loop, creating it on first use. Under an ASGI
+    server that is one pooled client per worker; connections cannot be shared across loops.
+    """
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        client = _async_clients[loop] = httpx.AsyncClient(
+            timeout=httpx.Timeout(settings.POKEAPI_READ_TIMEOUT, connect=settings.POKEAPI_CONNECT_TIMEOUT),
+            limits=httpx.Limits(max_connections=settings.POKEAPI_POOL_SIZE, max_keepalive_connections=settings.POKEAPI_POOL_SIZE),
+            headers={'Accept': 'application/json'},
+        )
+    return client
+
+
+async def aclose_async_client():
+    """Closes the running loop's client, if any. The next call builds a fresh one."""
+    client = _async_clients.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.aclose()
+
+
+def _retry_delay(response, retry_number):
+    """Seconds to wait before retry number retry_number (1-based), as urllib3's Retry computes it."""
+    retry_after = response.headers.get('Retry-After') if response is not None else None
+    if retry_after and retry_after.isdigit():
+        return float(retry_after)
+    if retry_number <= 1:
+        return 0.0
+    return min(settings.POKEAPI_RETRY_BACKOFF * 2 ** (retry_number - 1), 120.0)
+
+
+async def aget(path_or_url, headers=None):
+    """
+    Async counterpart of get(): returns the httpx.Response (check status_code), retrying connection
+    errors, 429 and 5xx up to POKEAPI_MAX_RETRIES times with backoff. Raises requests.Timeout or
+    requests.ConnectionError once retries are exhausted, and CircuitOpenError while the breaker is open.
+    """
+    if not breaker.allow():
+        stats.record_short_circuit()
+        raise CircuitOpenError(f"PokeAPI circuit is open; not requesting {path_or_url}")
+    url = api_url(path_or_url)
+    client = get_async_client()
+    started_at = time.perf_counter()
+    retry_number = 0
+    while True:
+        response = error = None
+        try:
+            response = await client.get(url, headers=headers)
+        except httpx.TimeoutException as e:
+            error = requests.Timeout(f"Timed out requesting {url}: {e}")
+        except httpx.HTTPError as e:
+            error = requests.ConnectionError(f"Error requesting {url}: {e!r}")
+        retryable = error is not None or response.status_code in RETRY_STATUSES
+        if not retryable or retry_number >= settings.POKEAPI_MAX_RETRIES:
+            break
+        retry_number += 1
+        stats.record_retry()
+        await asyncio.sleep(_retry_delay(response, retry_number))
+
+    if error is not None:
+        stats.record_request(time.perf_counter() - started_at, failed=True)
+        breaker.record(failed=True)
+        raise error
+    stats.record_request(time.perf_counter() - started_at, failed=response.status_code >= 500)
+    breaker.record(failed=response.status_code >= 500 or response.status_code == 429)
+    return response
+
+
+class CachedResponse:
+    """The parts of a requests.Response that callers of fetch() use, backed by a cache entry."""
+
+    def __init__(self, status_code, body=None, from_cache=False):
+        self.status_code = status_code
+        self.text = body
+        self.from_cache = from_cache
+        self._data = None
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.HTTPError(f"{self.status_code} response from PokeAPI", response=self)
+
+    def json(self):
+        if self.text is None:
+            raise ValueError(f"No JSON body for a {self.status_code} response.")
+        if self._data is None:
+            self._data = json.loads(self.text)
+        return self._data
+
+
+def _cached_answer(url, entry):
+    """The CachedResponse for url when no PokeAPI call is needed (fresh entry or recent failure), else None."""
+    if entry is not None and entry.is_fresh():
+        response_cache.stats.incr('hits')
+        return CachedResponse(200, entry.body, from_cache=True)
+    if entry is None:
+        failed_status = response_cache.lookup_negative(url)
+        if failed_status is not None:
+            response_cache.stats.incr('negative_hits')
+            if failed_status == 0:
+                raise requests.ConnectionError(f"PokeAPI failed recently for {url}; not retrying yet")
+            return CachedResponse(failed_status, from_cache=True)
+    return None
+
+
+def _conditional_headers(entry):
+    return {'If-None-Match': entry.etag} if entry is not None and entry.etag else None
+
+
+def _answer_from_error(url, entry, error):
+    """A failed call: the expired entry if there is one, else re-raises error (remembered in the negative cache)."""
+    if entry is None:
+        if not isinstance(error, CircuitOpenError): # The breaker itself is what's failing fast, not this URL
+            response_cache.store_negative(url, 0)
+        raise error
+    response_cache.stats.incr('stale_served')
+    return CachedResponse(200, entry.body, from_cache=True)
+
+
+def _answer_from_response(url, entry, response):
+    """Caches what PokeAPI answered (a requests or an httpx response) and returns the CachedResponse for it."""
+    if response.status_code == 304 and entry is not None:
+        response_cache.revalidated(entry)
+        response_cache.stats.incr('revalidations')
+        return CachedResponse(200, entry.body, from_cache=True)
+    if response.status_code == 200:
+        response_cache.stats.incr('misses')
+        entry = response_cache.store(url, response.text, response.headers.get('ETag'))
+        return CachedResponse(200, entry.body)
+    if response.status_code >= 500 and entry is not None:
+        response_cache.stats.incr('stale_served')
+        return CachedResponse(200, entry.body, from_cache=True)
+    response_cache.stats.incr('misses')
+    if response.status_code == 404 or response.status_code == 429 or response.status_code >= 500:
+        response_cache.store_negative(url, response.status_code)
+    return CachedResponse(response.status_code)
+
+
+def fetch(path_or_url):
+    """
+    GET a PokeAPI JSON resource through the response cache.
+    Fresh cache entries are served without touching the network; expired ones are revalidated
+    with If-None-Match when they carry an ETag. If upstream is down (connection error or 5xx)
+    an expired entry is served rather than failing. Recent failures are answered from the
+    negative cache without calling PokeAPI: the same status code comes back, or for a timeout
+    or connection error, a ConnectionError is raised again. Returns a CachedResponse.
+    """
+    url = api_url(path_or_url)
+    entry = response_cache.lookup(url)
+    cached = _cached_answer(url, entry)
+    instrumentation.record_cache('pokeapi', cached is not None)
+    if cached is not None:
+        return cached
+    headers = _conditional_headers(entry)
+    try:
+        response = get(path_or_url, **({'headers': headers} if headers else {}))
+    except requests.RequestException as e:
+        return _answer_from_error(url, entry, e)
+    return _answer_from_response(url, entry, response)
+
+
+async def afetch(path_or_url):
+    """
+    Async counterpart of fetch(), over aget(). Memory hits are answered on the event loop; the disk
+    tier (reading an entry, writing a fresh one, evicting) runs in a worker thread.
+    """
+    url = api_url(path_or_url)
+    entry = response_cache.lookup_memory(url)
+    if entry is None:
+        entry = await sync_to_async(response_cache.lookup, thread_sensitive=False)(url)
+    cached = _cached_answer(url, entry)
+    instrumentation.record_cache('pokeapi', cached is not None)
+    if cached is not None:
+        return cached
+    try:
+        response = await aget(path_or_url, headers=_conditional_headers(entry))
+    except requests.RequestException as e:
+        return _answer_from_error(url, entry, e)
+    return await sync_to_async(_answer_from_response, thread_sensitive=False)(url, entry, response)
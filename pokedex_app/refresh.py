@@ -0,0 +1,111 @@
+"""
+Background refresh of Pokemon data (stale-while-revalidate).
+
+Views serve whatever is in the DB and call refresh_queue.enqueue() when a row is stale
+(missing stats, or last_synced_at older than POKEDEX_REFRESH_MAX_AGE). Refreshes run on a small
+in-process thread pool and are deduplicated per Pokemon: 50 concurrent requests for the same
+stale Pokemon produce one upstream fetch. `manage.py refresh_pokedex` re-syncs every stale row
+in bulk, e.g. from cron.
+
+POKEDEX_REFRESH_MODE: 'thread' (default), 'eager' (run inline; handy in tests and scripts) or 'off'.
+"""
+import logging
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import timedelta
+
+import requests
+from django.conf import settings
+from django.db import close_old_connections, connection
+from django.utils import timezone
+
+from . import pokeapi
+from .ingest import ingest_pokemon_payloads
+from .single_flight import single_flight
+
+logger = logging.getLogger(__name__)
+
+
+def is_stale(pokemon_obj):
+    if not pokemon_obj.stats:
+        return True
+    if pokemon_obj.last_synced_at is None:
+        # Rows that predate sync tracking (or were loaded by hand) are left to `manage.py refresh_pokedex`
+        return False
+    return pokemon_obj.last_synced_at < timezone.now() - timedelta(seconds=settings.POKEDEX_REFRESH_MAX_AGE)
+
+
+def refresh_due_at(pokemon_obj):
+    """When (a UNIX timestamp) is_stale() turns true for pokemon_obj; now if it already is, None if it never will."""
+    if not pokemon_obj.stats:
+        return time.time()
+    if pokemon_obj.last_synced_at is None:
+        return None
+    return pokemon_obj.last_synced_at.timestamp() + settings.POKEDEX_REFRESH_MAX_AGE
+
+
+def refresh_pokemon(pokemon_name):
+    """Re-syncs one Pokemon from the API. Returns True if it was updated."""
+    # Coalesced across processes too, so other workers don't refresh the same row at once
+    return single_flight.do(f'refresh:{pokemon_name}', lambda: _refresh_pokemon(pokemon_name))
+
+
+def _refresh_pokemon(pokemon_name):
+    try:
+        response = pokeapi.fetch(f'pokemon/{pokemon_name}/')
+    except requests.RequestException as e:
+        logger.warning("API error refreshing %s: %s", pokemon_name, e)
+        return False
+    if response.status_code != 200:
+        logger.warning("Failed to refresh %s. Status: %s", pokemon_name, response.status_code)
+        return False
+    ingest_pokemon_payloads([response.json()])
+    logger.info("%s refreshed in the background.", pokemon_name)
+    return True
+
+
+class RefreshQueue:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._executor = None
+        self._pending = {} # pokemon name -> Future of its in-flight refresh
+
+    def enqueue(self, pokemon_name):
+        """Schedules a refresh of pokemon_name unless one is already queued or running. Returns its Future."""
+        mode = settings.POKEDEX_REFRESH_MODE
+        if mode == 'off':
+            return None
+        if mode == 'eager':
+            future = Future()
+            future.set_result(refresh_pokemon(pokemon_name))
+            return future
+
+        with self._lock:
+            future = self._pending.get(pokemon_name)
+            if future is not None:
+                return future
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=settings.POKEDEX_REFRESH_WORKERS, thread_name_prefix='pokedex-refresh'
+                )
+            future = self._executor.submit(self._run, pokemon_name)
+            self._pending[pokemon_name] = future
+            return future
+
+    def pending(self):
+        with self._lock:
+            return sorted(self._pending)
+
+    def _run(self, pokemon_name):
+        close_old_connections()
+        try:
+            return refresh_pokemon(pokemon_name)
+        finally:
+            with self._lock:
+                self._pending.pop(pokemon_name, None)
+            # Worker threads are long-lived; don't keep a DB connection open between jobs
+            connection.close()
+
+
+refresh_queue = RefreshQueue()
@@ -0,0 +1,276 @@
+"""
+Raw PokeAPI response cache, keyed by URL.
+
+Two tiers: an in-process LRU (fast, per worker) and a persistent tier of files under
+POKEAPI_CACHE_DIR (shared by all workers, survives restarts). Both are bounded in bytes and
+evict least recently used entries. Entries expire after a per-endpoint TTL
+(POKEAPI_CACHE_TTL); expired entries with an ETag are revalidated with If-None-Match
+instead of being downloaded again. Failures are remembered too (a small in-process negative
+cache), so a bad name or a flapping upstream is not asked again on every request.
+pokeapi.fetch() is the only caller.
+"""
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+class CacheEntry:
+    __slots__ = ('url', 'body', 'etag', 'expires_at')
+
+    def __init__(self, url, body, etag, expires_at):
+        self.url = url
+        self.body = body
+        self.etag = etag
+        self.expires_at = expires_at
+
+    @property
+    def size(self):
+        return len(self.body)
+
+    def is_fresh(self):
+        return time.time() < self.expires_at
+
+
+class CacheStats:
+    """Thread-safe hit/miss/eviction counters for the response cache."""
+
+    # disk_hits counts lookups answered by the persistent tier (promoted into memory); they are
+    # also counted in hits when the entry was fresh.
+    FIELDS = (
+        'hits', 'disk_hits', 'misses', 'revalidations', 'stale_served', 'negative_hits',
+        'memory_evictions', 'disk_evictions', 'negative_evictions',
+    )
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            for field in self.FIELDS:
+                setattr(self, field, 0)
+
+    def incr(self, field, amount=1):
+        with self._lock:
+            setattr(self, field, getattr(self, field) + amount)
+
+    def snapshot(self):
+        with self._lock:
+            return {field: getattr(self, field) for field in self.FIELDS}
+
+
+class ResponseCache:
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._memory = OrderedDict() # url -> CacheEntry, least recently used first
+        self._memory_bytes = 0
+        self._disk_dir = None
+        self._disk_index = {} # file path -> [size, last access time]
+        self._disk_bytes = 0
+        self._negative = OrderedDict() # url -> (status code, expires_at); status 0 means no response at all
+        self.stats = CacheStats()
+
+    # -- public API --------------------------------------------------------
+
+    def ttl_for(self, url):
+        """TTL in seconds for the endpoint a URL belongs to ('pokemon', 'type', ...)."""
+        base_url = settings.POKEAPI_BASE_URL.rstrip('/') + '/'
+        path = url[len(base_url):] if url.startswith(base_url) else url
+        endpoint = path.split('?', 1)[0].split('/', 1)[0]
+        ttls = settings.POKEAPI_CACHE_TTL
+        return ttls.get(endpoint, ttls['default'])
+
+    def lookup(self, url):
+        """Returns the cached entry for url (fresh or not) or None. Disk hits are promoted to memory."""
+        entry = self.lookup_memory(url)
+        if entry is not None:
+            return entry
+        entry = self._read_disk(url)
+        if entry is not None:
+            self._remember(entry)
+        return entry
+
+    def lookup_memory(self, url):
+        """The memory tier of lookup(): never touches the disk, so it is safe to call from the event loop."""
+        with self._lock:
+            entry = self._memory.get(url)
+            if entry is not None:
+                self._memory.move_to_end(url)
+            return entry
+
+    def store(self, url, body, etag):
+        entry = CacheEntry(url, body, etag or '', time.time() + self.ttl_for(url))
+        self._remember(entry)
+        self._write_disk(entry)
+        return entry
+
+    def revalidated(self, entry):
+        """Upstream answered 304 Not Modified: the entry is good for another TTL."""
+        entry.expires_at = time.time() + self.ttl_for(entry.url)
+        self._write_disk(entry)
+
+    def lookup_negative(self, url):
+        """Status code of a recent failure for url (404, 5xx, or 0 for a timeout/connection error), else None."""
+        with self._lock:
+            negative = self._negative.get(url)
+            if negative is None:
+                return None
+            status_code, expires_at = negative
+            if expires_at <= time.time():
+                del self._negative[url]
+                return None
+            return status_code
+
+    def store_negative(self, url, status_code):
+        """
+        Remembers that url failed. 404s are kept for POKEAPI_NEGATIVE_TTL_NOT_FOUND; transient failures
+        (5xx, 429, timeouts) only for POKEAPI_NEGATIVE_TTL_ERROR. Bounded to POKEAPI_NEGATIVE_MAX_ENTRIES, LRU.
+        """
+        ttl = settings.POKEAPI_NEGATIVE_TTL_NOT_FOUND if status_code == 404 else settings.POKEAPI_NEGATIVE_TTL_ERROR
+        with self._lock:
+            self._negative.pop(url, None)
+            self._negative[url] = (status_code, time.time() + ttl)
+            while len(self._negative) > settings.POKEAPI_NEGATIVE_MAX_ENTRIES:
+                self._negative.popitem(last=False)
+                self.stats.incr('negative_evictions')
+
+    def forget_negative(self, url):
+        with self._lock:
+            self._negative.pop(url, None)
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            self._memory_bytes = 0
+            self._negative.clear()
+            if self._disk_dir is not None:
+                for file_path in list(self._disk_index):
+                    self._remove_disk_file(file_path)
+            self._disk_dir = None
+            self._disk_index = {}
+            self._disk_bytes = 0
+        self.stats.reset()
+
+    def sizes(self):
+        with self._lock:
+            return {
+                'memory_entries': len(self._memory), 'memory_bytes': self._memory_bytes, 'disk_bytes': self._disk_bytes,
+                'negative_entries': len(self._negative),
+            }
+
+    # -- memory tier -------------------------------------------------------
+
+    def _remember(self, entry):
+        max_bytes = settings.POKEAPI_CACHE_MEMORY_MAX_BYTES
+        if entry.size > max_bytes:
+            return
+        with self._lock:
+            previous = self._memory.pop(entry.url, None)
+            if previous is not None:
+                self._memory_bytes -= previous.size
+            self._memory[entry.url] = entry
+            self._memory_bytes += entry.size
+            while self._memory_bytes > max_bytes:
+                _, evicted = self._memory.popitem(last=False)
+                self._memory_bytes -= evicted.size
+                self.stats.incr('memory_evictions')
+
+    # -- disk tier ---------------------------------------------------------
+    # Each entry is one file: a JSON header line (url, etag, expires_at) followed by the raw body.
+    # The byte accounting is per process; other workers writing to the same directory are picked
+    # up the next time this process rescans it (on start or when POKEAPI_CACHE_DIR changes).
+
+    def _disk_root(self):
+        """Current cache directory, (re)indexing it when it changes. None disables the disk tier."""
+        cache_dir = settings.POKEAPI_CACHE_DIR
+        if not cache_dir:
+            return None
+        cache_dir = Path(cache_dir)
+        with self._lock:
+            if self._disk_dir != cache_dir:
+                self._disk_dir = cache_dir
+                self._disk_index = {}
+                self._disk_bytes = 0
+                if cache_dir.is_dir():
+                    for file_path in cache_dir.glob('*/*.cache'):
+                        file_stat = file_path.stat()
+                        self._disk_index[file_path] = [file_stat.st_size, file_stat.st_mtime]
+                        self._disk_bytes += file_stat.st_size
+        return cache_dir
+
+    def _disk_path(self, cache_dir, url):
+        digest = hashlib.sha256(url.encode()).hexdigest()
+        return cache_dir / digest[:2] / f'{digest}.cache'
+
+    def _read_disk(self, url):
+        cache_dir = self._disk_root()
+        if cache_dir is None:
+            return None
+        file_path = self._disk_path(cache_dir, url)
+        try:
+            with open(file_path, encoding='utf-8') as cache_file:
+                header = json.loads(cache_file.readline())
+                body = cache_file.read()
+        except (OSError, ValueError):
+            return None
+        if header.get('url') != url:
+            return None
+        with self._lock:
+            if file_path in self._disk_index:
+                self._disk_index[file_path][1] = time.time()
+        self.stats.incr('disk_hits')
+        return CacheEntry(url, body, header.get('etag', ''), header.get('expires_at', 0))
+
+    def _write_disk(self, entry):
+        cache_dir = self._disk_root()
+        if cache_dir is None:
+            return
+        file_path = self._disk_path(cache_dir, entry.url)
+        header = json.dumps({'url': entry.url, 'etag': entry.etag, 'expires_at': entry.expires_at})
+        content = f'{header}\n{entry.body}'.encode('utf-8')
+        try:
+            file_path.parent.mkdir(parents=True, exist_ok=True)
+            # Unique temp name per thread, then an atomic rename, so readers never see half a file
+            tmp_path = file_path.with_suffix(f'.{os.getpid()}.{threading.get_ident()}.tmp')
+            tmp_path.write_bytes(content)
+            os.replace(tmp_path, file_path)
+        except OSError as e:
+            logger.warning("Could not write %s: %s", file_path, e)
+            return
+        with self._lock:
+            previous = self._disk_index.get(file_path)
+            if previous is not None:
+                self._disk_bytes -= previous[0]
+            self._disk_index[file_path] = [len(content), time.time()]
+            self._disk_bytes += len(content)
+            if self._disk_bytes > settings.POKEAPI_CACHE_DISK_MAX_BYTES:
+                self._evict_disk()
+
+    def _evict_disk(self):
+        # Trim to 90% of the cap so that a full cache does not sort its index on every write
+        target_bytes = settings.POKEAPI_CACHE_DISK_MAX_BYTES * 0.9
+        for file_path, _ in sorted(self._disk_index.items(), key=lambda item: item[1][1]):
+            if self._disk_bytes <= target_bytes:
+                break
+            self._remove_disk_file(file_path)
+            self.stats.incr('disk_evictions')
+
+    def _remove_disk_file(self, file_path):
+        size, _ = self._disk_index.pop(file_path)
+        self._disk_bytes -= size
+        try:
+            file_path.unlink()
+        except OSError:
+            pass
+
+
+response_cache = ResponseCache()
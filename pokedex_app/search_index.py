@@ -0,0 +1,253 @@
+"""
+In-process name search index: prefix lookups for autocomplete, typo-tolerant suggestions, and
+a may_exist() check, so a typo never costs an upstream 404 round-trip.
+
+The universe of names is every Pokemon in the DB plus PokeAPI's full name list (one
+'pokemon?limit=100000' request, which the response cache keeps). Prefixes are answered from a
+character trie; fuzzy matches come from a trigram index whose candidates are ranked by edit
+distance. Names that PokeAPI answered 404 for are in the response cache's negative tier.
+The name list is fetched off the request path: once a day (every few minutes while it fails) a
+background thread loads it outside the index lock and merges the difference in, so lookups never
+wait on PokeAPI. With POKEDEX_REFRESH_MODE='eager' it loads inline instead, as refresh.py does.
+Kept current through in_process_index.py: after a bulk sync each worker adds just the rows
+stamped since the newest last_synced_at it has read, and only other changes (admin edits,
+deletes) rebuild it.
+"""
+import logging
+import threading
+import time
+import requests
+from django.conf import settings
+
+from . import pokeapi
+from .in_process_index import InProcessIndex
+from .response_cache import response_cache
+from .models import Pokemon
+
+logger = logging.getLogger(__name__)
+
+UPSTREAM_LIST_PATH = 'pokemon?limit=100000'
+UPSTREAM_RETRY_AFTER = 5 * 60 # After a failed fetch of the upstream name list
+UPSTREAM_MAX_AGE = 24 * 60 * 60
+FUZZY_CANDIDATES = 50
+
+TERMINAL = '$' # Trie key marking the end of a name; not a character PokeAPI names use
+
+
+def normalize_name(raw_name):
+    """'  Mr Mime ' -> 'mr-mime', the form PokeAPI names take."""
+    return '-'.join(str(raw_name).lower().split())
+
+
+def trigrams(name):
+    padded = f'  {name} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def edit_distance(a, b, max_distance):
+    """Levenshtein distance between a and b, or max_distance + 1 as soon as it is known to be larger."""
+    if abs(len(a) - len(b)) > max_distance:
+        return max_distance + 1
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i]
+        for j, char_b in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (char_a != char_b)))
+        if min(current) > max_distance:
+            return max_distance + 1
+        previous = current
+    return previous[-1]
+
+
+class SearchIndex(InProcessIndex):
+    REBUILD_KEY = 'pokedex:search_index:rebuild'
+    CHANGES_KEY = 'pokedex:search_index:changes'
+
+    def __init__(self):
+        super().__init__()
+        self._lock = threading.RLock()
+        self._upstream_names = None # None until PokeAPI's name list has been loaded
+        self._upstream_checked_at = 0.0
+        self._upstream_loading = False # A fetch of the name list is in flight
+        self._reset()
+
+    def _reset(self):
+        self._trie = {}
+        self._grams = {} # trigram -> set of names
+        self.ids = {} # name -> pokeapi_id, for names in the DB
+        self._names_by_id = {} # pokeapi_id -> name, to spot renames on catch-up
+        self._watermark = None # Newest last_synced_at read so far
+
+    def clear(self):
+        """Forgets everything, including the upstream name list."""
+        with self._lock:
+            self._seen_generations = (None, None)
+            self._rebuild_pending = True
+            self._changes_pending = False
+            self._upstream_names = None
+            self._upstream_checked_at = 0.0
+            self._upstream_loading = False
+            self._reset()
+
+    def ensure_current(self):
+        super().ensure_current()
+        self._refresh_upstream_if_due()
+
+    def _refresh_upstream_if_due(self):
+        with self._lock:
+            max_age = UPSTREAM_MAX_AGE if self._upstream_names is not None else UPSTREAM_RETRY_AFTER
+            if self._upstream_loading or time.time() - self._upstream_checked_at <= max_age:
+                return
+            self._upstream_loading = True
+            self._upstream_checked_at = time.time()
+        if settings.POKEDEX_REFRESH_MODE == 'eager':
+            self._load_upstream()
+        else:
+            threading.Thread(target=self._load_upstream, name='pokedex-search-upstream', daemon=True).start()
+
+    def _load_upstream(self):
+        try:
+            self.refresh_upstream()
+        finally:
+            with self._lock:
+                self._upstream_loading = False
+
+    def refresh_upstream(self):
+        """
+        Loads PokeAPI's name list and merges what changed since the last one into the index. The fetch
+        runs outside the lock, so lookups carry on meanwhile. Returns False when the list is unavailable.
+        """
+        started_at = time.perf_counter()
+        upstream_names = self._fetch_upstream_names()
+        with self._lock:
+            self._upstream_checked_at = time.time()
+            if upstream_names is None:
+                return False
+            previous_names = self._upstream_names or set()
+            self._upstream_names = upstream_names
+            for name in upstream_names - previous_names:
+                self._add(name)
+            for name in previous_names - upstream_names:
+                if name not in self.ids:
+                    self._discard(name)
+        logger.info("Loaded %s upstream names in %.3fs.", len(upstream_names), time.perf_counter() - started_at)
+        return True
+
+    def _build(self):
+        started_at = time.perf_counter()
+        self._reset()
+        self._load(Pokemon.objects.all())
+        for name in self._upstream_names or ():
+            self._add(name)
+        logger.info(
+            "Built for %s DB names, %s upstream names in %.3fs.",
+            len(self.ids), len(self._upstream_names or ()), time.perf_counter() - started_at,
+        )
+
+    def _load(self, pokemon_queryset):
+        """Adds the given Pokemon's names, replacing the old name of any that were renamed. One query."""
+        for name, pokeapi_id, last_synced_at in pokemon_queryset.values_list('name', 'pokeapi_id', 'last_synced_at'):
+            old_name = self._names_by_id.get(pokeapi_id)
+            if old_name is not None and old_name != name:
+                del self.ids[old_name]
+                if old_name not in (self._upstream_names or ()):
+                    self._discard(old_name)
+            self.ids[name] = pokeapi_id
+            self._names_by_id[pokeapi_id] = name
+            self._add(name)
+            self._advance_watermark(last_synced_at)
+
+    def _fetch_upstream_names(self):
+        try:
+            response = pokeapi.fetch(UPSTREAM_LIST_PATH)
+            names = {entry['name'] for entry in response.json().get('results', [])} if response.status_code == 200 else set()
+        except (requests.RequestException, ValueError, KeyError, TypeError, AttributeError) as e:
+            logger.warning("Could not load the upstream name list: %s", e)
+            return None
+        # An empty list is no list: treating it as complete would make every name look missing
+        return names or None
+
+    def _add(self, name):
+        node = self._trie
+        for char in name:
+            node = node.setdefault(char, {})
+        node[TERMINAL] = name
+        for gram in trigrams(name):
+            self._grams.setdefault(gram, set()).add(name)
+
+    def _discard(self, name):
+        node = self._trie
+        for char in name:
+            node = node.get(char)
+            if node is None:
+                return
+        node.pop(TERMINAL, None) # Empty branches are left behind; prefix() just finds nothing under them
+        for gram in trigrams(name):
+            names = self._grams.get(gram)
+            if names is not None:
+                names.discard(name)
+                if not names:
+                    del self._grams[gram]
+
+    # -- queries ---------------------------------------------------------------
+
+    def may_exist(self, name):
+        """
+        False only when name is known not to exist: it recently came back 404, or PokeAPI's
+        full name list is loaded and does not have it. Numeric ids are always worth a lookup.
+        """
+        if name.isdigit():
+            return True
+        self.ensure_current()
+        with self._lock:
+            if name in self.ids:
+                return True
+            if response_cache.lookup_negative(pokeapi.api_url(f'pokemon/{name}/')) == 404:
+                return False
+            return self._upstream_names is None or name in self._upstream_names
+
+    def prefix(self, prefix, limit=10):
+        """Up to `limit` names starting with prefix, alphabetically."""
+        self.ensure_current()
+        with self._lock:
+            node = self._trie
+            for char in prefix:
+                node = node.get(char)
+                if node is None:
+                    return []
+            names, stack = [], [node]
+            while stack and len(names) < limit:
+                node = stack.pop()
+                if TERMINAL in node:
+                    names.append(node[TERMINAL])
+                # Reversed so the smallest character is popped first: depth-first in alphabetical order
+                stack.extend(node[char] for char in sorted((key for key in node if key != TERMINAL), reverse=True))
+            return names
+
+    def fuzzy(self, query, limit=10, max_distance=None):
+        """Up to `limit` names within a small edit distance of query, closest first."""
+        if max_distance is None:
+            max_distance = 1 if len(query) <= 4 else 2 if len(query) <= 8 else 3
+        self.ensure_current()
+        with self._lock:
+            shared = {}
+            for gram in trigrams(query):
+                for name in self._grams.get(gram, ()):
+                    shared[name] = shared.get(name, 0) + 1
+            candidates = sorted(shared, key=lambda name: (-shared[name], name))[:FUZZY_CANDIDATES]
+        scored = []
+        for name in candidates:
+            distance = edit_distance(query, name, max_distance)
+            if distance <= max_distance:
+                scored.append((distance, -shared[name], name))
+        return [name for _, _, name in sorted(scored)[:limit]]
+
+    def suggest(self, query, limit=10):
+        """Prefix matches first, then typo-tolerant ones."""
+        names = self.prefix(query, limit)
+        if len(names) < limit and len(query) >= 3:
+            names += [name for name in self.fuzzy(query, limit) if name not in names][:limit - len(names)]
+        return names
+
+
+search_index = SearchIndex()
@@ -0,0 +1,122 @@
+"""
+Cache invalidation for the Pokedex pages.
+
+Model saves and deletes fire Django's post_save/post_delete. The bulk ingest paths in
+ingest.py bypass those, so they send pokedex_data_synced instead. Either way the affected
+cache keys (and, for Type/Ability changes, the filter vocabularies) are dropped once the transaction commits, so a concurrent request can never
+re-cache the pre-commit data.
+"""
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_save, post_delete, pre_delete
+from django.dispatch import Signal, receiver
+
+from . import page_cache, vocabulary
+from .carousel import carousel_sampler
+from .filter_index import filter_index
+from .search_index import search_index
+from .stats_matrix import stats_matrix
+from .type_chart import type_chart
+from .models import Pokemon, Type, TypeEffectiveness, Ability, Species
+
+# Sent by the bulk ingest paths. kwargs: pokemon_names (iterable), chain_ids (EvolutionChain pks)
+pokedex_data_synced = Signal()
+
+
+def _invalidate_on_commit(pokemon_names=(), chain_ids=()):
+    pokemon_names = set(pokemon_names)
+    chain_ids = set(chain_ids)
+
+    def invalidate():
+        # Every detail page in an affected chain shows the changed Pokemon in its evolution section
+        affected_chain_ids = chain_ids | set(
+            Species.objects.filter(varieties__name__in=pokemon_names, chain__isnull=False).values_list('chain_id', flat=True)
+        )
+        chain_member_names = Pokemon.objects.filter(species__chain_id__in=affected_chain_ids).values_list('name', flat=True)
+        page_cache.invalidate(pokemon_names | set(chain_member_names), affected_chain_ids)
+
+    transaction.on_commit(invalidate)
+
+
+def _rebuild_filter_index():
+    # This process's index is flagged right away so that it sees its own writes; other workers on commit
+    filter_index.mark_rebuild()
+    transaction.on_commit(filter_index.bump_rebuild)
+
+
+def _rebuild_search_index():
+    search_index.mark_rebuild()
+    transaction.on_commit(search_index.bump_rebuild)
+
+
+def _rebuild_stats_matrix():
+    stats_matrix.mark_rebuild()
+    transaction.on_commit(stats_matrix.bump_rebuild)
+
+
+def _rebuild_carousel():
+    carousel_sampler.mark_rebuild()
+    transaction.on_commit(carousel_sampler.bump_rebuild)
+
+
+def _rebuild_type_chart():
+    type_chart.mark_rebuild()
+    transaction.on_commit(type_chart.bump_rebuild)
+
+
+@receiver(pokedex_data_synced)
+def invalidate_synced_pages(sender, pokemon_names=(), chain_ids=(), **kwargs):
+    if sender in (Type, Ability):
+        transaction.on_commit(vocabulary.invalidate_vocabularies)
+    if sender is TypeEffectiveness:
+        _rebuild_type_chart()
+    if sender is Pokemon:
+        # Bulk-synced rows carry a fresh last_synced_at, so the filter index can catch up on just those
+        filter_index.mark_changed()
+        transaction.on_commit(filter_index.bump_changes)
+        stats_matrix.mark_changed()
+        transaction.on_commit(stats_matrix.bump_changes)
+        carousel_sampler.mark_changed()
+        transaction.on_commit(carousel_sampler.bump_changes)
+        search_index.mark_changed()
+        transaction.on_commit(search_index.bump_changes)
+    _invalidate_on_commit(pokemon_names, chain_ids)
+
+
+@receiver(post_save, sender=Pokemon)
+@receiver(post_delete, sender=Pokemon)
+def invalidate_pokemon_pages(sender, instance, **kwargs):
+    _rebuild_filter_index()
+    _rebuild_search_index()
+    _rebuild_stats_matrix()
+    _rebuild_carousel()
+    _invalidate_on_commit([instance.name])
+
+
+@receiver(m2m_changed, sender=Pokemon.types.through)
+@receiver(m2m_changed, sender=Pokemon.abilities.through)
+def invalidate_pokemon_memberships(sender, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        _rebuild_filter_index()
+
+
+@receiver(pre_delete, sender=Type)
+@receiver(pre_delete, sender=Ability)
+def remember_vocabulary_members(sender, instance, **kwargs):
+    # By post_delete the through rows have been cascaded away, and with them who had this type or ability
+    instance._deleted_member_names = list(instance.pokemons.values_list('name', flat=True))
+
+
+@receiver(post_save, sender=Type)
+@receiver(post_delete, sender=Type)
+@receiver(post_save, sender=Ability)
+@receiver(post_delete, sender=Ability)
+def invalidate_vocabulary_pages(sender, instance, **kwargs):
+    # Dropdowns on the list page change; detail pages list type and ability names
+    transaction.on_commit(vocabulary.invalidate_vocabularies)
+    _rebuild_filter_index()
+    if sender is Type:
+        _rebuild_type_chart()
+    member_names = instance.__dict__.pop('_deleted_member_names', None)
+    if member_names is None:
+        member_names = instance.pokemons.values_list('name', flat=True)
+    _invalidate_on_commit(member_names)
@@ -0,0 +1,155 @@
+"""
+Single-flight coalescing of concurrent syncs of the same resource.
+
+When many requests miss on the same Pokemon at once, only one of them (the leader) fetches it
+from PokeAPI and writes it; the others wait for the leader and then read the row it wrote.
+Threads of one process coalesce on an in-process lock; processes coalesce on an flock()ed file
+under POKEDEX_LOCK_DIR, and a leader re-checks the DB once it holds that lock, since another
+process may have synced the row while it was waiting.
+
+Async views use ado(), which coalesces the coroutines of one event loop the same way and takes
+the same file lock without blocking the loop while it waits.
+"""
+import asyncio
+import hashlib
+import logging
+import os
+import threading
+from contextlib import asynccontextmanager, contextmanager
+from pathlib import Path
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+try:
+    import fcntl
+except ImportError: # Windows: coalescing stays per process
+    fcntl = None
+
+
+class _Call:
+    __slots__ = ('done', 'result', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+@contextmanager
+def file_lock(key):
+    """Exclusive cross-process lock on `key`. A no-op when POKEDEX_LOCK_DIR is empty or flock() is unavailable."""
+    lock_dir = settings.POKEDEX_LOCK_DIR
+    if not lock_dir or fcntl is None:
+        yield
+        return
+    lock_path = Path(lock_dir) / f'{hashlib.sha256(key.encode()).hexdigest()}.lock'
+    try:
+        lock_path.parent.mkdir(parents=True, exist_ok=True)
+        lock_fd = os.open(lock_path, os.O_RDWR | os.O_CREAT, 0o644)
+    except OSError as e:
+        logger.warning("Could not open %s: %s", lock_path, e)
+        yield
+        return
+    # Lock files are left in place: unlinking one while another process waits on it would split the lock
+    try:
+        fcntl.flock(lock_fd, fcntl.LOCK_EX)
+        yield
+    finally:
+        fcntl.flock(lock_fd, fcntl.LOCK_UN)
+        os.close(lock_fd)
+
+
+@asynccontextmanager
+async def afile_lock(key):
+    """file_lock() for coroutines: the wait for the lock happens in a worker thread, not on the event loop."""
+    lock = file_lock(key)
+    acquiring = asyncio.ensure_future(asyncio.to_thread(lock.__enter__))
+    try:
+        await asyncio.shield(acquiring)
+    except asyncio.CancelledError:
+        # The thread still gets the lock eventually (unless opening or locking fails); hand it straight back
+        acquiring.add_done_callback(lambda done: _release_if_acquired(lock, done))
+        raise
+    try:
+        yield
+    finally:
+        lock.__exit__(None, None, None)
+
+
+def _release_if_acquired(lock, acquiring):
+    if not acquiring.cancelled() and acquiring.exception() is None:
+        lock.__exit__(None, None, None)
+
+
+def _retrieve_exception(task):
+    # With every caller gone, nobody else reads it, and asyncio would log it as never retrieved
+    if not task.cancelled():
+        task.exception()
+
+
+class SingleFlight:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {} # key -> _Call of the leader currently running it
+        self._async_calls = {} # (event loop, key) -> Task currently running it
+
+    def do(self, key, func):
+        """
+        Runs func() once for all concurrent callers with the same key and hands every caller its result
+        (or re-raises its exception). The leader runs func() while holding the cross-process file lock.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            is_leader = call is None
+            if is_leader:
+                call = self._calls[key] = _Call()
+
+        if not is_leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            with file_lock(key):
+                call.result = func()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result
+
+    async def ado(self, key, coroutine_func):
+        """
+        Async counterpart of do(): awaits coroutine_func() once for all concurrent callers with the same
+        key on this event loop and hands every caller its result (or re-raises its exception).
+        The call runs as its own task, so a caller that is cancelled (its client went away), leader or
+        not, leaves it running for the others.
+        """
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            task = self._async_calls.get((loop, key))
+            if task is None:
+                task = self._async_calls[(loop, key)] = loop.create_task(self._alead(loop, key, coroutine_func))
+                task.add_done_callback(_retrieve_exception)
+        return await asyncio.shield(task)
+
+    async def _alead(self, loop, key, coroutine_func):
+        try:
+            async with afile_lock(key):
+                return await coroutine_func()
+        finally:
+            with self._lock:
+                del self._async_calls[(loop, key)]
+
+    def in_flight(self):
+        with self._lock:
+            return sorted(self._calls) + sorted(key for _, key in self._async_calls)
+
+
+single_flight = SingleFlight()
@@ -0,0 +1,214 @@
+"""
+Local copies of the Pokemon sprites, so pages never hot-link GitHub.
+
+Each sprite is downloaded once and kept content-addressed under POKEDEX_SPRITE_DIR:
+objects/<sha256 of the PNG>.png holds the image and urls/<sha256 of the URL> names the object
+(with its size). The content hash is the sprite's strong ETag, so a revalidation is answered
+with a 304 without touching the image. Concurrent downloads of one sprite share a single
+request (single_flight.py); `manage.py prewarm_sprites` fetches the whole dex ahead of time.
+
+List pages bundle their small sprites into one horizontal sheet (a PNG built with Pillow from
+the cached files), so a page costs one image request instead of twenty. A sheet is named by the
+hash of its members' hashes and never changes under that name; built sheets are kept in a small
+per-worker LRU rather than on disk, since every filter combination makes a new one.
+"""
+import hashlib
+import io
+import logging
+import os
+import struct
+import threading
+from collections import OrderedDict, namedtuple
+from pathlib import Path
+
+import httpx
+import requests
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.urls import reverse
+from PIL import Image
+
+from . import instrumentation, pokeapi
+from .single_flight import single_flight
+
+logger = logging.getLogger(__name__)
+
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+MAX_SPRITE_BYTES = 1024 * 1024
+SHEET_CELL = 96 # PokeAPI's default sprites are 96x96; larger images are served on their own
+SHEET_MAX_MEMBERS = 50
+SHEET_CACHE_ENTRIES = 256
+
+Sprite = namedtuple('Sprite', ['digest', 'width', 'height'])
+
+
+def png_size(body):
+    """(width, height) from a PNG's header, or None when body is not a PNG."""
+    if len(body) < 24 or not body.startswith(PNG_SIGNATURE) or body[12:16] != b'IHDR':
+        return None
+    return struct.unpack('>II', body[16:24])
+
+
+def sprite_src(pokeapi_id, sprite_url):
+    """URL a page should load a sprite from: the local copy, or sprite_url itself when the proxy is off."""
+    if not sprite_url or pokeapi_id is None or not settings.POKEDEX_SPRITE_PROXY:
+        return sprite_url
+    return reverse('pokemon_sprite', args=[pokeapi_id])
+
+
+def _write_atomically(path, data):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(f'{path.name}.{os.getpid()}.{threading.get_ident()}.tmp')
+    tmp_path.write_bytes(data)
+    os.replace(tmp_path, path)
+
+
+class SpriteStore:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._known = {} # url -> Sprite, for sprites already on disk
+        self._sheets = OrderedDict() # sheet key -> PNG bytes, least recently used first
+
+    def clear(self):
+        """Forgets this worker's in-memory state; the files stay."""
+        with self._lock:
+            self._known.clear()
+            self._sheets.clear()
+
+    # -- disk layout -----------------------------------------------------------
+
+    @staticmethod
+    def _root():
+        return Path(settings.POKEDEX_SPRITE_DIR)
+
+    def object_path(self, digest):
+        return self._root() / 'objects' / digest[:2] / f'{digest}.png'
+
+    def _url_path(self, url):
+        return self._root() / 'urls' / hashlib.sha256(url.encode()).hexdigest()
+
+    def lookup(self, url):
+        """The cached Sprite for url, or None if it has not been downloaded. Never calls out."""
+        sprite = self._remembered(url)
+        if sprite is not None:
+            return sprite
+        try:
+            digest, width, height = self._url_path(url).read_text().split()
+        except (OSError, ValueError):
+            return None
+        if not self.object_path(digest).exists():
+            return None
+        sprite = Sprite(digest, int(width), int(height))
+        with self._lock:
+            self._known[url] = sprite
+        return sprite
+
+    def _remembered(self, url):
+        """The memory tier of lookup(): no file access, so it is safe to call from the event loop."""
+        with self._lock:
+            return self._known.get(url)
+
+    async def _alookup(self, url):
+        sprite = self._remembered(url)
+        if sprite is not None:
+            return sprite
+        return await sync_to_async(self.lookup, thread_sensitive=False)(url)
+
+    def _store(self, url, body):
+        """Keeps a downloaded image. Returns its Sprite, or None when body is not a usable PNG."""
+        size = png_size(body)
+        if size is None or len(body) > MAX_SPRITE_BYTES:
+            logger.warning("%s is not a PNG of at most %s bytes; not cached.", url, MAX_SPRITE_BYTES)
+            return None
+        sprite = Sprite(hashlib.sha256(body).hexdigest(), *size)
+        object_path = self.object_path(sprite.digest)
+        if not object_path.exists():
+            _write_atomically(object_path, body)
+        # Written after the object, so a reader never finds a name without its file
+        _write_atomically(self._url_path(url), f'{sprite.digest} {sprite.width} {sprite.height}'.encode())
+        with self._lock:
+            self._known[url] = sprite
+        return sprite
+
+    # -- downloads -------------------------------------------------------------
+
+    def fetch(self, url):
+        """The Sprite for url, downloading it first if needed. None when the download fails."""
+        sprite = self.lookup(url)
+        instrumentation.record_cache('sprites', sprite is not None)
+        return sprite or single_flight.do(f'sprite:{url}', lambda: self._download(url))
+
+    def _download(self, url):
+        sprite = self.lookup(url) # Another worker may have finished it while this one waited for the lock
+        if sprite is not None:
+            return sprite
+        try:
+            response = pokeapi.get_session().get(
+                url, headers={'Accept': 'image/png'},
+                timeout=(settings.POKEAPI_CONNECT_TIMEOUT, settings.POKEAPI_READ_TIMEOUT),
+            )
+        except requests.RequestException as e:
+            logger.warning("Could not download %s: %s", url, e)
+            return None
+        if response.status_code != 200:
+            logger.warning("%s answered %s.", url, response.status_code)
+            return None
+        return self._store(url, response.content)
+
+    async def afetch(self, url):
+        """Async counterpart of fetch(), over the event loop's httpx client. Files are read and written in a worker thread."""
+        sprite = await self._alookup(url)
+        instrumentation.record_cache('sprites', sprite is not None)
+        return sprite or await single_flight.ado(f'sprite:{url}', lambda: self._adownload(url))
+
+    async def _adownload(self, url):
+        sprite = await self._alookup(url)
+        if sprite is not None:
+            return sprite
+        try:
+            response = await pokeapi.get_async_client().get(url, headers={'Accept': 'image/png'})
+        except httpx.HTTPError as e:
+            logger.warning("Could not download %s: %r", url, e)
+            return None
+        if response.status_code != 200:
+            logger.warning("%s answered %s.", url, response.status_code)
+            return None
+        return await sync_to_async(self._store, thread_sensitive=False)(url, response.content)
+
+    # -- sheets ----------------------------------------------------------------
+
+    @staticmethod
+    def fits_sheet(sprite):
+        return sprite.width <= SHEET_CELL and sprite.height <= SHEET_CELL
+
+    @staticmethod
+    def sheet_key(sprites):
+        return hashlib.sha256(','.join(sprite.digest for sprite in sprites).encode()).hexdigest()
+
+    def sheet(self, sprites):
+        """
+        PNG of the given sprites side by side, each centered in a SHEET_CELL square, in order.
+        Every sprite must fit a cell (fits_sheet()).
+        """
+        key = self.sheet_key(sprites)
+        with self._lock:
+            body = self._sheets.get(key)
+            if body is not None:
+                self._sheets.move_to_end(key)
+                return body
+        canvas = Image.new('RGBA', (SHEET_CELL * len(sprites), SHEET_CELL), (0, 0, 0, 0))
+        for position, sprite in enumerate(sprites):
+            with Image.open(self.object_path(sprite.digest)) as image:
+                left = position * SHEET_CELL + (SHEET_CELL - sprite.width) // 2
+                canvas.paste(image.convert('RGBA'), (left, (SHEET_CELL - sprite.height) // 2))
+        buffer = io.BytesIO()
+        canvas.save(buffer, format='PNG', optimize=True)
+        body = buffer.getvalue()
+        with self._lock:
+            self._sheets[key] = body
+            while len(self._sheets) > SHEET_CACHE_ENTRIES:
+                self._sheets.popitem(last=False)
+        return body
+
+
+sprite_store = SpriteStore()
@@ -0,0 +1,187 @@
+"""
+NumPy matrix of every Pokemon's base stats, for comparisons and rankings.
+
+Rows are Pokemon, columns are STAT_NAMES, and a total column is kept alongside. The matrix is
+built from the DB's stat columns in one query, and each column is also kept sorted so a value's
+percentile across the whole dex is a binary search. Comparing N Pokemon, or ranking the dex by a
+stat, is then array arithmetic instead of a Python loop.
+
+For "similar Pokemon" the matrix is also kept z-score normalized per stat, and a query is a
+brute-force Euclidean distance over every row: a dex of ~1,300 x 6 values is far below the size
+where a ball tree or other k-NN structure beats one vectorized pass.
+
+Kept current through in_process_index.py: bulk syncs are caught up on through last_synced_at
+(only those rows are re-read, then the derived arrays are recomputed), any other change rebuilds
+the matrix.
+"""
+import logging
+import time
+
+import numpy as np
+
+from .filter_index import STAT_NAMES, iter_ids
+from .in_process_index import InProcessIndex
+from .models import STAT_FIELDS, Pokemon
+
+logger = logging.getLogger(__name__)
+
+TOTAL = 'total'
+
+
+def stats_vector(stats):
+    """A stats dict ({'hp': 45, ...}) as a row in STAT_NAMES order; missing stats count as 0."""
+    stats = stats or {}
+    return [stats.get(stat_name, 0) for stat_name in STAT_NAMES]
+
+
+def _ranks(values):
+    """1 for the highest value in each column, ties sharing the better rank ('competition' ranking)."""
+    # values[j] > values[i] for every pair, counted per i: the number of entries beating each one
+    return 1 + (values[np.newaxis, :, :] > values[:, np.newaxis, :]).sum(axis=1)
+
+
+class StatsMatrix(InProcessIndex):
+    REBUILD_KEY = 'pokedex:stats_matrix:rebuild'
+    CHANGES_KEY = 'pokedex:stats_matrix:changes'
+
+    def __init__(self):
+        super().__init__()
+        self._reset()
+
+    def _reset(self):
+        self.ids = np.zeros(0, dtype=np.int64) # pokeapi_id per row
+        self.names = []
+        self.values = np.zeros((0, len(STAT_NAMES)), dtype=np.int32)
+        self._row_by_id = {}
+        self._row_by_name = {}
+        self._watermark = None # Newest last_synced_at read so far
+        self._derive()
+
+    def _derive(self):
+        """Recomputes everything that follows from values: totals, sorted columns, the normalized matrix."""
+        self.totals = self.values.sum(axis=1)
+        self._sorted_columns = {stat_name: np.sort(self.values[:, column]) for column, stat_name in enumerate(STAT_NAMES)}
+        self._sorted_columns[TOTAL] = np.sort(self.totals)
+        if len(self.values):
+            spread = self.values.std(axis=0)
+            spread[spread == 0] = 1 # A stat every Pokemon shares tells them apart by nothing
+            self._normalized = (self.values - self.values.mean(axis=0)) / spread
+        else:
+            self._normalized = np.zeros((0, len(STAT_NAMES)))
+
+    # -- loading ---------------------------------------------------------------
+
+    def _build(self):
+        started_at = time.perf_counter()
+        self._reset()
+        self._load(Pokemon.objects.all())
+        logger.info("Built for %s Pokemon in %.3fs.", len(self.names), time.perf_counter() - started_at)
+
+    def _load(self, pokemon_queryset):
+        """Adds or overwrites the rows of the given Pokemon, then re-derives. One query."""
+        # Rows without stats are stale placeholders, not Pokemon with all-zero stats
+        rows = list(
+            pokemon_queryset.filter(pokeapi_id__isnull=False, stat_total__isnull=False)
+            .order_by('pokeapi_id').values_list('pokeapi_id', 'name', 'last_synced_at', *STAT_FIELDS.values())
+        )
+        if not rows:
+            return
+        new_ids, new_names, new_values = [], [], []
+        for pokeapi_id, name, last_synced_at, *stat_values in rows:
+            vector = [value or 0 for value in stat_values] # A stat PokeAPI did not list counts as 0, as in stats_vector()
+            row = self._row_by_id.get(pokeapi_id)
+            if row is not None:
+                self.values[row] = vector
+                if self.names[row] != name: # Renamed upstream
+                    del self._row_by_name[self.names[row]]
+                    self.names[row] = name
+                    self._row_by_name[name] = row
+            else:
+                self._row_by_id[pokeapi_id] = self._row_by_name[name] = len(self.names) + len(new_names)
+                new_ids.append(pokeapi_id)
+                new_names.append(name)
+                new_values.append(vector)
+            self._advance_watermark(last_synced_at)
+        if new_names:
+            self.ids = np.concatenate([self.ids, np.array(new_ids, dtype=np.int64)])
+            self.names += new_names
+            self.values = np.vstack([self.values, np.array(new_values, dtype=np.int32)])
+        self._derive()
+
+    # -- queries ---------------------------------------------------------------
+
+    def _percentiles(self, column_name, values):
+        """Percentage of the dex with a value at or below each of values, or None for an empty dex."""
+        sorted_column = self._sorted_columns[column_name]
+        if not len(sorted_column):
+            return [None] * len(values)
+        at_or_below = np.searchsorted(sorted_column, values, side='right')
+        return np.round(at_or_below * 100.0 / len(sorted_column), 1).tolist()
+
+    def compare(self, stats_dicts):
+        """
+        Compares any number of Pokemon, given their stats dicts, in one pass. Returns
+        {'stats': {stat: {'values', 'ranks', 'percentiles'}}, 'totals': {...same keys}}, each a list
+        with one entry per Pokemon: rank 1 is the highest among them, percentile is against the whole dex.
+        """
+        self.ensure_current()
+        compared = np.array([stats_vector(stats) for stats in stats_dicts], dtype=np.int32).reshape(-1, len(STAT_NAMES))
+        totals = compared.sum(axis=1)
+        ranks = _ranks(compared)
+        total_ranks = _ranks(totals[:, np.newaxis])[:, 0]
+        with self._lock:
+            result = {'stats': {}}
+            for column, stat_name in enumerate(STAT_NAMES):
+                result['stats'][stat_name] = {
+                    'values': compared[:, column].tolist(),
+                    'ranks': ranks[:, column].tolist(),
+                    'percentiles': self._percentiles(stat_name, compared[:, column]),
+                }
+            result['totals'] = {
+                'values': totals.tolist(),
+                'ranks': total_ranks.tolist(),
+                'percentiles': self._percentiles(TOTAL, totals),
+            }
+        return result
+
+    def top(self, stat_name, limit=10, bits=None):
+        """
+        The `limit` Pokemon with the highest stat_name (a STAT_NAMES entry or 'total') as
+        [(name, pokeapi_id, value)], ties by pokeapi_id. bits restricts it to a filter_index bitset.
+        """
+        if stat_name != TOTAL and stat_name not in STAT_NAMES:
+            raise ValueError(f"Unknown stat: {stat_name!r}")
+        self.ensure_current()
+        with self._lock:
+            column = self.totals if stat_name == TOTAL else self.values[:, STAT_NAMES.index(stat_name)]
+            rows = np.arange(len(self.ids))
+            if bits is not None:
+                rows = rows[np.isin(self.ids, np.fromiter(iter_ids(bits), dtype=np.int64))]
+            # lexsort's last key is the primary one: highest value first, then lowest pokeapi_id
+            order = rows[np.lexsort((self.ids[rows], -column[rows].astype(np.int64)))][:limit]
+            return [(self.names[row], int(self.ids[row]), int(column[row])) for row in order]
+
+    def similar(self, name, limit=6, bits=None):
+        """
+        The `limit` Pokemon whose normalized base stats are closest to name's, as
+        [(name, pokeapi_id, distance)], closest first. bits restricts the candidates to a
+        filter_index bitset. Empty when name has no stats synced.
+        """
+        self.ensure_current()
+        with self._lock:
+            row = self._row_by_name.get(name)
+            if row is None:
+                return []
+            distances = np.sqrt(((self._normalized - self._normalized[row]) ** 2).sum(axis=1))
+            candidates = np.arange(len(self.ids))
+            if bits is not None:
+                candidates = candidates[np.isin(self.ids, np.fromiter(iter_ids(bits), dtype=np.int64))]
+            candidates = candidates[candidates != row]
+            if len(candidates) > limit:
+                # Only the `limit` nearest get fully sorted
+                candidates = candidates[np.argpartition(distances[candidates], limit - 1)[:limit]]
+            order = candidates[np.lexsort((self.ids[candidates], distances[candidates]))]
+            return [(self.names[row], int(self.ids[row]), round(float(distances[row]), 3)) for row in order]
+
+
+stats_matrix = StatsMatrix()
@@ -1,9 +1,42 @@
-from django.test import TestCase, Client
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+from django.core.management import call_command
+from django.test import TestCase, Client, override_settings
 from django.urls import reverse, resolve
+from django.db import connection, connections
+from unittest import skipUnless
 from unittest.mock import patch, MagicMock # For mocking API calls
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import asyncio
+import base64
+import io
+import json
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from pathlib import Path
 
-from .models import Pokemon, Type, Ability
-from .views import get_or_fetch_pokemon_details, index, pokemon_list, pokemon_detail, pokemon_compare # Import views for URL tests
+import requests
+from PIL import Image
+
+from . import pokeapi
+from .response_cache import ResponseCache, response_cache
+from .models import Pokemon, Type, Ability, EvolutionEdge, Species
+from .refresh import RefreshQueue
+from .single_flight import SingleFlight, afile_lock
+from .vocabulary import filter_vocabulary
+from .filter_index import filter_index, iter_ids
+from .search_index import edit_distance, search_index
+from .stats_matrix import stats_matrix
+from .type_chart import type_chart
+from .carousel import carousel_sampler
+from .sprites import SHEET_CELL, png_size, sprite_store
+from .instrumentation import registry
+from .page_cache import detail_key, evolution_fragment_key, generation as page_cache_generation
+from .ingest import ingest_pokemon_payloads, ingest_evolution_chains, ingest_type_payloads, resolve_names
+from .views import CAROUSEL_SIZE, get_or_fetch_pokemon_details, hydrate_pokemon, load_evolution_tree, index, pokemon_list, pokemon_detail, pokemon_compare, api_pokemon_list # Import views for URL tests
 
 # Sample API response data for mocking
 SAMPLE_POKEMON_API_DATA = {
@@ -31,7 +64,85 @@ SAMPLE_TYPE_API_DATA = {
     'pokemon': [
         {'pokemon': {'name': 'bulbasaur', 'url': 'https://pokeapi.co/api/v2/pokemon/1/'}},
         {'pokemon': {'name': 'ivysaur', 'url': 'https://pokeapi.co/api/v2/pokemon/2/'}}
-    ]
+    ],
+    'damage_relations': {
+        'double_damage_to': [{'name': 'ground'}, {'name': 'rock'}, {'name': 'water'}],
+        'half_damage_to': [{'name': 'flying'}, {'name': 'poison'}, {'name': 'bug'}, {'name': 'steel'}, {'name': 'fire'}, {'name': 'grass'}, {'name': 'dragon'}],
+        'no_damage_to': [],
+        'double_damage_from': [{'name': 'flying'}, {'name': 'poison'}, {'name': 'bug'}, {'name': 'fire'}, {'name': 'ice'}],
+        'half_damage_from': [{'name': 'ground'}, {'name': 'water'}, {'name': 'grass'}, {'name': 'electric'}],
+        'no_damage_from': [],
+    }
+}
+
+SAMPLE_POISON_TYPE_API_DATA = {
+    'name': 'poison',
+    'pokemon': [{'pokemon': {'name': 'bulbasaur', 'url': 'https://pokeapi.co/api/v2/pokemon/1/'}}],
+    'damage_relations': {
+        'double_damage_to': [{'name': 'grass'}, {'name': 'fairy'}],
+        'half_damage_to': [{'name': 'poison'}, {'name': 'ground'}, {'name': 'rock'}, {'name': 'ghost'}],
+        'no_damage_to': [{'name': 'steel'}],
+        'double_damage_from': [{'name': 'ground'}, {'name': 'psychic'}],
+        'half_damage_from': [{'name': 'fighting'}, {'name': 'poison'}, {'name': 'bug'}, {'name': 'grass'}, {'name': 'fairy'}],
+        'no_damage_from': [],
+    }
+}
+
+def mock_api_response(status_code, data=None, headers=None):
+    """A stand-in for requests.Response as returned by pokeapi.get()."""
+    response = MagicMock()
+    response.status_code = status_code
+    response.text = json.dumps(data) if data is not None else ''
+    response.json.return_value = data
+    response.headers = headers or {}
+    return response
+
+def _aget_through_get(path_or_url, headers=None):
+    return pokeapi.get(path_or_url, **({'headers': headers} if headers else {}))
+
+class PokedexTestCase(TestCase):
+    """
+    Gives every test empty caches (PokeAPI responses and sprites on a temp dir, rendered pages) and inline refreshes.
+    Async views' calls to pokeapi.aget() are routed to pokeapi.get(), so patching get() covers both.
+    """
+    route_aget_through_get = True
+
+    def setUp(self):
+        if self.route_aget_through_get:
+            aget_patcher = patch('pokedex_app.pokeapi.aget', side_effect=_aget_through_get)
+            aget_patcher.start()
+            self.addCleanup(aget_patcher.stop)
+        cache_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(cache_dir.cleanup)
+        # Background refreshes run inline so they never outlive the test's transaction
+        settings_override = override_settings(
+            POKEAPI_CACHE_DIR=cache_dir.name, POKEDEX_LOCK_DIR=str(Path(cache_dir.name) / 'locks'), POKEDEX_REFRESH_MODE='eager',
+            POKEDEX_SPRITE_DIR=str(Path(cache_dir.name) / 'sprites'),
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        response_cache.clear()
+        self.addCleanup(response_cache.clear)
+        sprite_store.clear()
+        search_index.clear()
+        pokeapi.breaker.reset()
+        cache.clear() # Rendered pages and fragments
+
+SAMPLE_SPECIES_API_DATA = {
+    'name': 'bulbasaur',
+    'varieties': [{'is_default': True, 'pokemon': {'name': 'bulbasaur'}}],
+    'evolution_chain': {'url': 'https://pokeapi.co/api/v2/evolution-chain/1/'}
+}
+
+SAMPLE_EVOLUTION_CHAIN_API_DATA = {
+    'id': 1,
+    'chain': {
+        'species': {'name': 'bulbasaur'},
+        'evolves_to': [{
+            'species': {'name': 'ivysaur'},
+            'evolves_to': [{'species': {'name': 'venusaur'}, 'evolves_to': []}]
+        }]
+    }
 }
 
 class ModelTests(TestCase):
@@ -47,9 +158,14 @@ class ModelTests(TestCase):
         pokemon_obj = Pokemon.objects.create(pokeapi_id=1, name='bulbasaur')
         self.assertEqual(str(pokemon_obj), 'Bulbasaur')
 
-class ViewTests(TestCase):
+class ViewTests(PokedexTestCase):
     def setUp(self):
+        super().setUp()
         self.client = Client()
+        # Views seed from PokeAPI when the DB is sparse; keep the tests off the network
+        offline_patcher = patch('pokedex_app.pokeapi.get', side_effect=requests.ConnectionError("offline"))
+        offline_patcher.start()
+        self.addCleanup(offline_patcher.stop)
         # Create some initial data that views might rely on
         self.type_grass = Type.objects.create(name='grass')
         self.type_poison = Type.objects.create(name='poison')
@@ -87,10 +203,8 @@ class ViewTests(TestCase):
 
     def test_pokemon_detail_view_not_existing_api_fail(self):
         # Mock API to simulate Pokemon not found
-        with patch('requests.get') as mock_get:
-            mock_response = MagicMock()
-            mock_response.status_code = 404
-            mock_get.return_value = mock_response
+        with patch('pokedex_app.pokeapi.get') as mock_get:
+            mock_get.return_value = mock_api_response(404)
             
             response = self.client.get(reverse('pokemon_detail', args=['nonexistentpokemon']))
             self.assertEqual(response.status_code, 200) # View itself returns 200
@@ -108,29 +222,56 @@ class ViewTests(TestCase):
         self.assertEqual(response.status_code, 200)
         self.assertTemplateUsed(response, 'pokedex_app/pokemon_compare.html')
         self.assertTrue('comparison_results' in response.context)
-        self.assertIsNotNone(response.context['pokemon1_data'])
-        self.assertIsNotNone(response.context['pokemon2_data'])
+        self.assertEqual([pokemon['name'] for pokemon in response.context['compared']], ['Bulbasaur', 'Pikachu'])
         self.assertContains(response, "Bulbasaur")
         self.assertContains(response, "Pikachu")
 
+    def test_pokemon_compare_view_with_several_pokemon(self):
+        Pokemon.objects.create(pokeapi_id=4, name='charmander', stats={"hp": 39, "attack": 52})
+        response = self.client.get(reverse('pokemon_compare'), {'pokemon': ['bulbasaur', 'pikachu', 'charmander']})
+        self.assertEqual([pokemon['total'] for pokemon in response.context['compared']], [94, 90, 91])
+        self.assertEqual([pokemon['total_rank'] for pokemon in response.context['compared']], [1, 3, 2])
+        self.assertEqual([cell['rank'] for cell in response.context['comparison_results']['Attack']], [3, 1, 2])
+        self.assertEqual(response.context['compare_slots'], ['bulbasaur', 'pikachu', 'charmander', ''])
+
     def test_pokemon_compare_view_same_pokemon(self):
         response = self.client.get(reverse('pokemon_compare'), {'pokemon1': 'bulbasaur', 'pokemon2': 'bulbasaur'})
         self.assertEqual(response.status_code, 200)
         self.assertTrue(response.context['error_message'])
         self.assertIn("Please select two different Pokémon", response.context['error_message'])
 
-class HelperFunctionTests(TestCase):
-    @patch('requests.get')
+    @patch('pokedex_app.pokeapi.get')
+    def test_type_filter_hydrates_missing_pokemon(self, mock_get):
+        type_response = mock_api_response(200, SAMPLE_TYPE_API_DATA)
+        ivysaur_data = dict(SAMPLE_POKEMON_API_DATA, id=2, name='ivysaur')
+        pokemon_responses = {
+            'pokemon/bulbasaur/': SAMPLE_POKEMON_API_DATA,
+            'pokemon/ivysaur/': ivysaur_data,
+        }
+
+        def fake_get(url):
+            if url in pokemon_responses:
+                return mock_api_response(200, pokemon_responses[url])
+            return type_response
+        mock_get.side_effect = fake_get
+
+        response = self.client.get(reverse('pokemon_list'), {'type_filter_name': 'grass'})
+
+        self.assertEqual(response.status_code, 200)
+        # bulbasaur is already in the DB from setUp, so only the type list and ivysaur are fetched
+        self.assertEqual(mock_get.call_count, 2)
+        names = [p.name for p in response.context['pokemon_list_from_db']]
+        self.assertEqual(names, ['bulbasaur', 'ivysaur'])
+
+class HelperFunctionTests(PokedexTestCase):
+    @patch('pokedex_app.pokeapi.get')
     def test_get_or_fetch_pokemon_details_new_pokemon(self, mock_get):
         # Configure the mock to return a successful response
-        mock_response = MagicMock()
-        mock_response.status_code = 200
-        mock_response.json.return_value = SAMPLE_POKEMON_API_DATA
-        mock_get.return_value = mock_response
+        mock_get.return_value = mock_api_response(200, SAMPLE_POKEMON_API_DATA)
 
         pokemon = get_or_fetch_pokemon_details('bulbasaur')
 
-        mock_get.assert_called_once_with('https://pokeapi.co/api/v2/pokemon/bulbasaur/')
+        mock_get.assert_called_once_with('pokemon/bulbasaur/')
         self.assertIsNotNone(pokemon)
         self.assertEqual(pokemon.name, 'bulbasaur')
         self.assertEqual(pokemon.pokeapi_id, 1)
@@ -148,38 +289,1299 @@ class HelperFunctionTests(TestCase):
             sprite_url='https://example.com/charmander.png'
         )
         
-        with patch('requests.get') as mock_get: # Ensure API is NOT called
+        with patch('pokedex_app.pokeapi.get') as mock_get: # Ensure API is NOT called
             pokemon = get_or_fetch_pokemon_details('charmander')
             mock_get.assert_not_called()
             self.assertIsNotNone(pokemon)
             self.assertEqual(pokemon.name, 'charmander')
 
-    @patch('requests.get')
+    @patch('pokedex_app.pokeapi.get')
     def test_get_or_fetch_pokemon_details_existing_needs_stats_update(self, mock_get):
         # Create Pokemon without stats
         Pokemon.objects.create(pokeapi_id=1, name='bulbasaur', sprite_url='url')
         
-        mock_response = MagicMock()
-        mock_response.status_code = 200
-        mock_response.json.return_value = SAMPLE_POKEMON_API_DATA # API will return full data with stats
-        mock_get.return_value = mock_response
+        mock_get.return_value = mock_api_response(200, SAMPLE_POKEMON_API_DATA) # API will return full data with stats
 
         pokemon = get_or_fetch_pokemon_details('bulbasaur')
 
-        mock_get.assert_called_once_with('https://pokeapi.co/api/v2/pokemon/bulbasaur/')
+        # The DB copy is served as is; the refresh (run inline in 'eager' mode) updates the row
         self.assertIsNotNone(pokemon)
-        self.assertIsNotNone(pokemon.stats) 
+        self.assertEqual(pokemon.stats, {}) # No stat columns set yet
+        mock_get.assert_called_once_with('pokemon/bulbasaur/')
+        pokemon.refresh_from_db()
         self.assertEqual(pokemon.stats.get('hp'), 45)
+        self.assertIsNotNone(pokemon.last_synced_at)
 
-    @patch('requests.get')
+    @patch('pokedex_app.pokeapi.get')
     def test_get_or_fetch_pokemon_details_api_failure(self, mock_get):
-        mock_response = MagicMock()
-        mock_response.status_code = 404
-        mock_get.return_value = mock_response
+        mock_get.return_value = mock_api_response(404)
 
         pokemon = get_or_fetch_pokemon_details('nonexistent')
         self.assertIsNone(pokemon)
 
+    @patch('pokedex_app.pokeapi.get')
+    def test_hydrate_pokemon_fetches_only_missing(self, mock_get):
+        Pokemon.objects.create(pokeapi_id=2, name='ivysaur', stats={"hp": 60})
+
+        mock_get.return_value = mock_api_response(200, SAMPLE_POKEMON_API_DATA)
+
+        synced = hydrate_pokemon(['Bulbasaur', 'ivysaur', 'bulbasaur'])
+
+        mock_get.assert_called_once_with('pokemon/bulbasaur/')
+        self.assertEqual(synced, 1)
+        self.assertEqual(Pokemon.objects.get(name='bulbasaur').types.count(), 2)
+
+    @patch('pokedex_app.pokeapi.get')
+    def test_refresh_pokedex_command_resyncs_only_stale_rows(self, mock_get):
+        long_ago = timezone.now() - timedelta(days=30)
+        Pokemon.objects.create(pokeapi_id=1, name='bulbasaur', stats={"hp": 1}, last_synced_at=long_ago)
+        Pokemon.objects.create(pokeapi_id=2, name='ivysaur', stats={"hp": 60}, last_synced_at=timezone.now())
+
+        mock_get.return_value = mock_api_response(200, SAMPLE_POKEMON_API_DATA)
+        call_command('refresh_pokedex', stdout=io.StringIO())
+
+        mock_get.assert_called_once_with('pokemon/bulbasaur/')
+        self.assertEqual(Pokemon.objects.get(name='bulbasaur').stats.get('hp'), 45)
+
+    @override_settings(POKEDEX_REFRESH_MODE='thread')
+    def test_refresh_queue_deduplicates_in_flight_refreshes(self):
+        release = threading.Event()
+        queue = RefreshQueue()
+        with patch('pokedex_app.refresh.refresh_pokemon', side_effect=lambda name: release.wait(5)) as mock_refresh:
+            futures = [queue.enqueue('bulbasaur') for _ in range(5)]
+            self.assertEqual(queue.pending(), ['bulbasaur'])
+            release.set()
+            futures[0].result(timeout=5)
+        self.assertTrue(all(future is futures[0] for future in futures))
+        mock_refresh.assert_called_once_with('bulbasaur')
+
+class SingleFlightTests(PokedexTestCase):
+    def test_concurrent_callers_share_one_call(self):
+        flight = SingleFlight()
+        release = threading.Event()
+        calls = []
+
+        def leader_work():
+            calls.append(threading.get_ident())
+            release.wait(5)
+            return 42
+
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(flight.do('pokemon:charizard', leader_work))) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        while len(flight.in_flight()) == 0:
+            time.sleep(0.01)
+        time.sleep(0.05) # Let the followers pile up behind the leader
+        release.set()
+        for thread in threads:
+            thread.join(5)
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, [42] * 8)
+        self.assertEqual(flight.in_flight(), [])
+
+    def test_leader_error_is_raised_and_not_cached(self):
+        flight = SingleFlight()
+        with self.assertRaises(requests.ConnectionError):
+            flight.do('pokemon:charizard', MagicMock(side_effect=requests.ConnectionError("offline")))
+        self.assertEqual(flight.do('pokemon:charizard', lambda: 6), 6)
+
+    @patch('pokedex_app.pokeapi.get')
+    def test_leader_rechecks_db_after_taking_the_lock(self, mock_get):
+        # Simulates another process having synced the Pokemon while this one waited for the lock
+        def synced_elsewhere(key, func):
+            Pokemon.objects.create(pokeapi_id=6, name='charizard', stats={"hp": 78})
+            return func()
+
+        with patch('pokedex_app.views.single_flight.do', side_effect=synced_elsewhere):
+            pokemon = get_or_fetch_pokemon_details('Charizard')
+
+        mock_get.assert_not_called()
+        self.assertEqual(pokemon.pokeapi_id, 6)
+
+def _fake_pokemon_payload(pokeapi_id):
+    """A distinct /pokemon/ payload per id, with a type and ability unique to it plus shared ones."""
+    return dict(
+        SAMPLE_POKEMON_API_DATA,
+        id=pokeapi_id,
+        name=f'pokemon-{pokeapi_id}',
+        types=[{'type': {'name': 'grass'}}, {'type': {'name': f'type-{pokeapi_id}'}}],
+        abilities=[{'ability': {'name': 'overgrow'}}, {'ability': {'name': f'ability-{pokeapi_id}'}}],
+    )
+
+class IngestTests(TestCase):
+    def test_ingest_creates_pokemon_with_relations(self):
+        saved = ingest_pokemon_payloads([SAMPLE_POKEMON_API_DATA])
+
+        self.assertEqual([p.name for p in saved], ['bulbasaur'])
+        bulbasaur = Pokemon.objects.get(name='bulbasaur')
+        self.assertEqual(saved[0].pk, bulbasaur.pk)
+        self.assertEqual(bulbasaur.stats, {'hp': 45, 'attack': 49})
+        self.assertEqual(sorted(t.name for t in bulbasaur.types.all()), ['grass', 'poison'])
+        self.assertEqual(sorted(a.name for a in bulbasaur.abilities.all()), ['chlorophyll', 'overgrow'])
+
+    def test_ingest_updates_existing_and_replaces_relations(self):
+        existing = Pokemon.objects.create(pokeapi_id=1, name='bulbasaur')
+        existing.types.add(Type.objects.create(name='fire'))
+
+        ingest_pokemon_payloads([SAMPLE_POKEMON_API_DATA])
+
+        self.assertEqual(Pokemon.objects.count(), 1)
+        existing.refresh_from_db()
+        self.assertEqual(existing.height, 7)
+        self.assertEqual(sorted(t.name for t in existing.types.all()), ['grass', 'poison'])
+
+    def test_ingest_query_count_does_not_grow_with_batch_size(self):
+        Pokemon.objects.create(pokeapi_id=1, name='pokemon-1')
+        # 3 type + 3 ability resolves (lookup, insert of the new names, their pks), existing lookup, bulk update,
+        # bulk create, pk lookup, a delete + insert per through table, plus the savepoint and its release
+        with self.assertNumQueries(16):
+            ingest_pokemon_payloads([_fake_pokemon_payload(i) for i in range(1, 4)])
+        with self.assertNumQueries(16):
+            ingest_pokemon_payloads([_fake_pokemon_payload(i) for i in range(1, 61)])
+        # Types and abilities all known: one lookup each
+        with self.assertNumQueries(11):
+            ingest_pokemon_payloads([_fake_pokemon_payload(i) for i in range(1, 61)])
+        self.assertEqual(Pokemon.objects.count(), 60)
+        self.assertEqual(Pokemon.types.through.objects.count(), 120)
+
+    def test_resolving_known_names_leaves_the_page_cache_alone(self):
+        Type.objects.create(name='grass')
+        generation = page_cache_generation()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(list(resolve_names(Type, ['grass'])), ['grass'])
+        self.assertEqual(page_cache_generation(), generation)
+        with self.captureOnCommitCallbacks(execute=True):
+            resolve_names(Type, ['grass', 'fire'])
+        self.assertNotEqual(page_cache_generation(), generation)
+
+class PageCacheTests(PokedexTestCase):
+    def setUp(self):
+        super().setUp()
+        self.bulbasaur = Pokemon.objects.create(pokeapi_id=1, name='bulbasaur', stats={'hp': 45})
+        offline_patcher = patch('pokedex_app.pokeapi.get', side_effect=requests.ConnectionError("offline"))
+        offline_patcher.start()
+        self.addCleanup(offline_patcher.stop)
+
+    def test_detail_page_is_cached_until_the_pokemon_changes(self):
+        url = reverse('pokemon_detail', args=['bulbasaur'])
+        self.assertEqual(self.client.get(url)['X-Page-Cache'], 'MISS')
+        with self.assertNumQueries(0):
+            response = self.client.get(url)
+        self.assertEqual(response['X-Page-Cache'], 'HIT')
+        self.assertContains(response, 'Bulbasaur')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            ingest_pokemon_payloads([dict(SAMPLE_POKEMON_API_DATA, height=99)])
+        response = self.client.get(url)
+        self.assertEqual(response['X-Page-Cache'], 'MISS')
+        self.assertContains(response, '99 dm')
+
+    def test_deleting_a_type_drops_the_detail_pages_listing_it(self):
+        grass = Type.objects.create(name='grass')
+        self.bulbasaur.types.add(grass)
+        self.client.get(reverse('pokemon_detail', args=['bulbasaur']))
+        self.assertIsNotNone(cache.get(detail_key('bulbasaur')))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            grass.delete()
+        self.assertIsNone(cache.get(detail_key('bulbasaur')))
+
+    def test_detail_page_by_id_redirects_to_the_cached_canonical_page(self):
+        response = self.client.get(reverse('pokemon_detail', args=[str(self.bulbasaur.pokeapi_id)]))
+        self.assertRedirects(response, reverse('pokemon_detail', args=['bulbasaur']), fetch_redirect_response=False)
+        self.assertIsNone(cache.get(detail_key(str(self.bulbasaur.pokeapi_id))))
+
+    def test_cached_detail_page_queues_a_refresh_once_its_data_is_stale(self):
+        Pokemon.objects.filter(pk=self.bulbasaur.pk).update(last_synced_at=timezone.now())
+        url = reverse('pokemon_detail', args=['Bulbasaur'])
+        with patch('pokedex_app.views.refresh_queue.enqueue') as mock_enqueue:
+            self.client.get(url)
+            self.assertEqual(self.client.get(url)['X-Page-Cache'], 'HIT')
+            mock_enqueue.assert_not_called()
+
+            later = time.time() + settings.POKEDEX_REFRESH_MAX_AGE + 1
+            # page_cache's own clock only: the cache backend's expiry must keep the real one
+            with patch('pokedex_app.page_cache.time', MagicMock(time=MagicMock(return_value=later))):
+                self.assertEqual(self.client.get(url)['X-Page-Cache'], 'HIT')
+            mock_enqueue.assert_called_once_with('bulbasaur')
+
+    @override_settings(POKEDEX_INLINE_SEEDING=False) # An offline seeding attempt would flag the page as an error
+    def test_list_pages_are_retired_by_any_data_change(self):
+        url = reverse('pokemon_list')
+        self.client.get(url)
+        self.assertEqual(self.client.get(url)['X-Page-Cache'], 'HIT')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Pokemon.objects.create(pokeapi_id=4, name='charmander', stats={'hp': 39})
+        response = self.client.get(url)
+        self.assertEqual(response['X-Page-Cache'], 'MISS')
+        self.assertContains(response, 'Charmander')
+
+    def test_error_pages_are_not_cached(self):
+        url = reverse('pokemon_detail', args=['missingno'])
+        self.client.get(url)
+        self.assertEqual(self.client.get(url)['X-Page-Cache'], 'MISS')
+
+    def test_evolution_fragment_is_shared_and_invalidated_per_chain(self):
+        ingest_evolution_chains([SAMPLE_EVOLUTION_CHAIN_API_DATA])
+        ivysaur = Pokemon.objects.create(pokeapi_id=2, name='ivysaur', stats={'hp': 60}, species=Species.objects.get(name='ivysaur'))
+        chain_id = ivysaur.species.chain_id
+
+        self.client.get(reverse('pokemon_detail', args=['bulbasaur']))
+        self.assertIsNotNone(cache.get(evolution_fragment_key(chain_id)))
+        # ivysaur's page renders the chain from the fragment: no edge or chain member queries
+        with patch('pokedex_app.views.load_evolution_tree') as mock_load:
+            response = self.client.get(reverse('pokemon_detail', args=['ivysaur']))
+            mock_load.assert_not_called()
+        self.assertContains(response, 'Ivysaur')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            ivysaur.sprite_url = 'https://example.com/ivysaur-new.png'
+            ivysaur.save()
+        self.assertIsNone(cache.get(evolution_fragment_key(chain_id)))
+        self.assertIsNone(cache.get(detail_key('bulbasaur')))
+
+@override_settings(POKEDEX_INLINE_SEEDING=False)
+class ListQueryBudgetTests(PokedexTestCase):
+    """The list page runs a fixed number of queries per filter mode, however many rows it shows."""
+
+    def setUp(self):
+        super().setUp()
+        ingest_pokemon_payloads([_fake_pokemon_payload(pokeapi_id) for pokeapi_id in range(1, 26)])
+        self.type_payload = dict(SAMPLE_TYPE_API_DATA, pokemon=[{'pokemon': {'name': f'pokemon-{i}'}} for i in range(1, 26)])
+        ingest_type_payloads([self.type_payload])
+        api_patcher = patch('pokedex_app.pokeapi.get', return_value=mock_api_response(200, self.type_payload))
+        self.mock_get = api_patcher.start()
+        self.addCleanup(api_patcher.stop)
+        # Warm the dropdown vocabularies and the filter index, as any earlier request would have
+        filter_vocabulary(Type)
+        filter_vocabulary(Ability)
+        filter_index.ensure_current()
+        search_index.ensure_current()
+        type_chart.ensure_current()
+
+    def assert_list_queries(self, expected_queries, params):
+        with self.assertNumQueries(expected_queries):
+            response = self.client.get(reverse('pokemon_list'), params)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_unfiltered_pages(self):
+        # COUNT, page rows, types prefetch, abilities prefetch
+        response = self.assert_list_queries(4, {})
+        self.assertContains(response, 'Type-1')
+        self.assertContains(response, 'Ability-20')
+        self.assert_list_queries(4, {'page': 2})
+
+    def test_type_filter(self):
+        # Hydration check, then page rows, types, abilities; the matches come from the filter index
+        response = self.assert_list_queries(4, {'type_filter_name': 'grass'})
+        self.assertEqual(len(response.context['pokemon_list_from_db']), 20)
+        self.assertEqual(response.context['pokemon_list_from_db'].paginator.count, 25)
+
+    def test_ability_filter(self):
+        response = self.assert_list_queries(3, {'ability_filter_name': 'ability-3'})
+        self.assertEqual([p.name for p in response.context['pokemon_list_from_db']], ['pokemon-3'])
+
+    def test_name_search_redirect(self):
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('pokemon_list'), {'q': 'pokemon-7'})
+        self.assertRedirects(response, reverse('pokemon_detail', args=['pokemon-7']), fetch_redirect_response=False)
+
+    def test_vocabulary_is_reloaded_when_types_change(self):
+        self.assertNotIn('shadow', filter_vocabulary(Type))
+        with self.captureOnCommitCallbacks(execute=True):
+            Type.objects.create(name='shadow')
+        self.assertIn('shadow', filter_vocabulary(Type))
+
+@override_settings(POKEDEX_INLINE_SEEDING=False)
+class MultiFilterTests(PokedexTestCase):
+    def setUp(self):
+        super().setUp()
+        payloads = []
+        for pokeapi_id in range(1, 31):
+            payload = _fake_pokemon_payload(pokeapi_id)
+            payload['types'] = [{'type': {'name': 'fire' if pokeapi_id % 2 else 'water'}}]
+            if pokeapi_id % 3 == 0:
+                payload['types'].append({'type': {'name': 'flying'}})
+            payload['stats'] = [{'stat': {'name': 'hp'}, 'base_stat': pokeapi_id * 10}, {'stat': {'name': 'speed'}, 'base_stat': 50}]
+            payloads.append(payload)
+        ingest_pokemon_payloads(payloads)
+        # Type filters ask PokeAPI for the type's members; everything is in the DB already
+        patcher = patch('pokedex_app.pokeapi.get', return_value=mock_api_response(200, {'pokemon': []}))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def matched_ids(self, **kwargs):
+        return list(iter_ids(filter_index.match(**kwargs)))
+
+    def test_type_combinations(self):
+        self.assertEqual(self.matched_ids(type_names=['fire', 'flying']), [3, 9, 15, 21, 27])
+        self.assertEqual(self.matched_ids(type_names=['water', 'flying'], type_match='any'), [
+            pokeapi_id for pokeapi_id in range(1, 31) if pokeapi_id % 2 == 0 or pokeapi_id % 3 == 0
+        ])
+        self.assertEqual(self.matched_ids(type_names=['fire', 'water']), [])
+        self.assertEqual(self.matched_ids(type_names=['no-such-type']), [])
+
+    def test_abilities_stat_ranges_and_names(self):
+        self.assertEqual(self.matched_ids(ability_names=['ability-4', 'ability-5']), [4, 5])
+        self.assertEqual(self.matched_ids(type_names=['water'], stat_ranges={'hp': (100, 160)}), [10, 12, 14, 16])
+        self.assertEqual(self.matched_ids(stat_ranges={'hp': (None, 30), 'speed': (50, 50)}), [1, 2, 3])
+        self.assertEqual(self.matched_ids(type_names=['fire'], name_contains='pokemon-1'), [1, 11, 13, 15, 17, 19])
+
+    def test_list_view_combines_filters(self):
+        response = self.client.get(reverse('pokemon_list'), {
+            'type_filter_name': ['fire', 'flying'], 'type_match': 'all', 'hp_min': '100',
+        })
+        self.assertEqual([p.pokeapi_id for p in response.context['pokemon_list_from_db']], [15, 21, 27])
+        self.assertIsNone(response.context['search_error'])
+
+        response = self.client.get(reverse('pokemon_list'), {'hp_min': 'lots'})
+        self.assertIn('whole numbers', response.context['search_error'])
+
+    def test_list_view_sorts_and_ranges_on_stat_columns(self):
+        response = self.client.get(reverse('pokemon_list'), {'type_filter_name': 'water', 'sort': '-hp'})
+        self.assertEqual([p.pokeapi_id for p in response.context['pokemon_list_from_db']][:3], [30, 28, 26])
+        self.assertFalse(response.context['use_keyset'])
+
+        response = self.client.get(reverse('pokemon_list'), {'total_min': '300', 'sort': 'total'})
+        self.assertEqual([p.pokeapi_id for p in response.context['pokemon_list_from_db']], [25, 26, 27, 28, 29, 30])
+
+    def test_stat_sorts_and_ranges_use_the_stat_indexes(self):
+        plan = Pokemon.objects.filter(speed__gte=40).order_by('-speed', 'pokeapi_id').explain()
+        self.assertIn('pokemon_speed_idx', plan)
+
+    def test_pagination_links_keep_every_filter(self):
+        response = self.client.get(reverse('pokemon_list'), {'type_filter_name': ['fire', 'water'], 'type_match': 'any'})
+        self.assertEqual(response.context['pokemon_list_from_db'].paginator.count, 30)
+        self.assertContains(response, '?page=2&type_filter_name=fire&amp;type_filter_name=water&amp;type_match=any')
+
+    def test_index_catches_up_on_synced_rows(self):
+        self.assertEqual(self.matched_ids(type_names=['grass']), [])
+        with self.captureOnCommitCallbacks(execute=True):
+            ingest_pokemon_payloads([_fake_pokemon_payload(31), dict(_fake_pokemon_payload(2), types=[{'type': {'name': 'grass'}}])])
+        with self.assertNumQueries(3): # Only the rows synced since the last read, their types and abilities
+            self.assertEqual(self.matched_ids(type_names=['grass']), [2, 31])
+        self.assertNotIn(2, self.matched_ids(type_names=['water']))
+
+    def test_index_rebuilds_after_other_changes(self):
+        Pokemon.objects.get(pokeapi_id=4).types.add(Type.objects.get(name='flying'))
+        self.assertIn(4, self.matched_ids(type_names=['flying']))
+        Pokemon.objects.filter(pokeapi_id=6).delete()
+        self.assertNotIn(6, self.matched_ids(type_names=['flying']))
+
+SAMPLE_NAME_LIST_API_DATA = {
+    'count': 6,
+    'results': [{'name': name} for name in ('bulbasaur', 'ivysaur', 'pichu', 'pikachu', 'raichu', 'mr-mime')],
+}
+
+@override_settings(POKEDEX_INLINE_SEEDING=False)
+class StatsMatrixTests(PokedexTestCase):
+    def setUp(self):
+        super().setUp()
+        payloads = []
+        for pokeapi_id in range(1, 11):
+            payload = _fake_pokemon_payload(pokeapi_id)
+            payload['types'] = [{'type': {'name': 'fire' if pokeapi_id % 2 else 'water'}}]
+            payload['stats'] = [
+                {'stat': {'name': 'hp'}, 'base_stat': pokeapi_id * 10},
+                {'stat': {'name': 'speed'}, 'base_stat': 100 - pokeapi_id * 5},
+            ]
+            payloads.append(payload)
+        ingest_pokemon_payloads(payloads)
+
+    def test_compare_ranks_and_percentiles(self):
+        comparison = stats_matrix.compare([{'hp': 100, 'speed': 50}, {'hp': 10, 'speed': 95}, {'hp': 10, 'speed': 0}])
+        self.assertEqual(comparison['stats']['hp']['ranks'], [1, 2, 2])
+        self.assertEqual(comparison['stats']['hp']['percentiles'], [100.0, 10.0, 10.0])
+        self.assertEqual(comparison['stats']['speed']['ranks'], [2, 1, 3])
+        self.assertEqual(comparison['stats']['attack']['values'], [0, 0, 0])
+        self.assertEqual(comparison['totals']['values'], [150, 105, 10])
+        self.assertEqual(comparison['totals']['ranks'], [1, 2, 3])
+
+    def test_top_by_stat_within_a_type(self):
+        self.assertEqual([name for name, _, _ in stats_matrix.top('hp', 3)], ['pokemon-10', 'pokemon-9', 'pokemon-8'])
+        fire = filter_index.match(type_names=['fire'])
+        self.assertEqual(stats_matrix.top('speed', 2, fire), [('pokemon-1', 1, 95), ('pokemon-3', 3, 85)])
+        with self.assertNumQueries(0):
+            stats_matrix.top('total', 1)
+
+    def test_matrix_is_rebuilt_after_a_sync(self):
+        self.assertEqual(stats_matrix.top('hp', 1)[0][0], 'pokemon-10')
+        payload = _fake_pokemon_payload(11)
+        payload['stats'] = [{'stat': {'name': 'hp'}, 'base_stat': 255}]
+        ingest_pokemon_payloads([payload])
+        self.assertEqual(stats_matrix.top('hp', 1), [('pokemon-11', 11, 255)])
+
+    def test_similar_ranks_by_normalized_distance(self):
+        self.assertEqual([name for name, _, _ in stats_matrix.similar('pokemon-5', 2)], ['pokemon-4', 'pokemon-6'])
+        fire = filter_index.match(type_names=['fire'])
+        self.assertEqual([name for name, _, _ in stats_matrix.similar('pokemon-5', 2, fire)], ['pokemon-3', 'pokemon-7'])
+        self.assertEqual(stats_matrix.similar('missingno'), [])
+
+    def test_similar_catches_up_on_resynced_rows_only(self):
+        stats_matrix.similar('pokemon-5')
+        payload = _fake_pokemon_payload(1)
+        payload['stats'] = [{'stat': {'name': 'hp'}, 'base_stat': 50}, {'stat': {'name': 'speed'}, 'base_stat': 75}]
+        ingest_pokemon_payloads([payload])
+        with self.assertNumQueries(1): # Just the re-synced rows
+            self.assertEqual(stats_matrix.similar('pokemon-5', 1), [('pokemon-1', 1, 0.0)])
+
+    @patch('pokedex_app.pokeapi.get', side_effect=requests.ConnectionError("offline"))
+    def test_similar_endpoint_and_detail_panel(self, mock_get):
+        response = self.client.get(reverse('api_pokemon_similar', args=['pokemon-5']), {'limit': 2, 'same_type': '1'})
+        self.assertEqual([result['name'] for result in response.json()['results']], ['pokemon-3', 'pokemon-7'])
+        self.assertEqual(self.client.get(reverse('api_pokemon_similar', args=['missingno'])).status_code, 404)
+
+        response = self.client.get(reverse('pokemon_detail', args=['pokemon-5']))
+        self.assertEqual([similar['name'] for similar in response.context['similar_pokemon']][:2], ['pokemon-4', 'pokemon-6'])
+        self.assertContains(response, 'Similar Pokémon')
+
+    @patch('pokedex_app.pokeapi.get', side_effect=requests.ConnectionError("offline"))
+    def test_detail_panel_follows_syncs_of_other_pokemon(self, mock_get):
+        url = reverse('pokemon_detail', args=['pokemon-5'])
+        self.client.get(url)
+        self.assertEqual(self.client.get(url)['X-Page-Cache'], 'HIT')
+
+        payload = _fake_pokemon_payload(1)
+        payload['stats'] = [{'stat': {'name': 'hp'}, 'base_stat': 50}, {'stat': {'name': 'speed'}, 'base_stat': 75}]
+        with self.captureOnCommitCallbacks(execute=True):
+            ingest_pokemon_payloads([payload]) # pokemon-1 now has pokemon-5's exact stats
+        response = self.client.get(url)
+        self.assertEqual(response['X-Page-Cache'], 'MISS')
+        self.assertEqual(response.context['similar_pokemon'][0]['name'], 'pokemon-1')
+
+    def test_top_endpoint(self):
+        response = self.client.get(reverse('api_pokemon_top'), {'stat': 'hp', 'type_filter_name': 'water', 'limit': 2})
+        self.assertEqual(response.json(), {'stat': 'hp', 'results': [
+            {'name': 'pokemon-10', 'id': 10, 'value': 100}, {'name': 'pokemon-8', 'id': 8, 'value': 80},
+        ]})
+        # Filter names are matched case-insensitively, as on the list page
+        mixed_case = self.client.get(reverse('api_pokemon_top'), {'stat': 'hp', 'type_filter_name': ['Water', 'WATER'], 'limit': 2})
+        self.assertEqual(mixed_case.json(), response.json())
+        self.assertEqual(self.client.get(reverse('api_pokemon_top'), {'stat': 'luck'}).status_code, 400)
+
+class CarouselSamplerTests(PokedexTestCase):
+    def setUp(self):
+        super().setUp()
+        ingest_pokemon_payloads([_fake_pokemon_payload(pokeapi_id) for pokeapi_id in range(1, 11)])
+        Pokemon.objects.create(pokeapi_id=11, name='pokemon-11') # No sprite: never picked
+        carousel_sampler.ensure_current()
+
+    def test_sample_is_one_query_for_the_chosen_rows(self):
+        with self.assertNumQueries(1):
+            picked = carousel_sampler.sample(5)
+        self.assertEqual(len({p.pokeapi_id for p in picked}), 5)
+        self.assertTrue(all(p.sprite_url for p in picked))
+        self.assertEqual(len(carousel_sampler.sample(50)), 10)
+
+    def test_follows_syncs_and_edits(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            ingest_pokemon_payloads([_fake_pokemon_payload(12)])
+        with self.captureOnCommitCallbacks(execute=True):
+            Pokemon.objects.filter(pokeapi_id=3).first().delete()
+            pokemon_obj = Pokemon.objects.get(pokeapi_id=4)
+            pokemon_obj.sprite_url = None
+            pokemon_obj.save()
+
+        picked_ids = {p.pokeapi_id for p in carousel_sampler.sample(50)}
+        self.assertEqual(picked_ids, {1, 2, 5, 6, 7, 8, 9, 10, 12})
+        self.assertEqual(len(carousel_sampler), 9)
+
+    def test_index_shows_sampled_pokemon(self):
+        response = self.client.get(reverse('index'))
+        carousel = response.context['random_pokemon_carousel']
+        self.assertEqual(len(carousel), CAROUSEL_SIZE)
+        self.assertContains(response, carousel[0].sprite_src)
+
+class TypeChartTests(PokedexTestCase):
+    def setUp(self):
+        super().setUp()
+        ingest_pokemon_payloads([SAMPLE_POKEMON_API_DATA])
+        ingest_type_payloads([SAMPLE_TYPE_API_DATA, SAMPLE_POISON_TYPE_API_DATA])
+
+    def multipliers(self, type_names):
+        matchup = type_chart.matchup([type_names])
+        return dict(zip(matchup['types'], matchup['defensive'][0].tolist()))
+
+    def test_dual_types_multiply_and_coverage_takes_the_best_hit(self):
+        bulbasaur = self.multipliers(['grass', 'poison'])
+        self.assertEqual((bulbasaur['fire'], bulbasaur['psychic'], bulbasaur['ground'], bulbasaur['grass']), (2, 2, 1, 0.25))
+        self.assertEqual(self.multipliers([])['fire'], 1)
+        coverage = dict(zip(type_chart.names, type_chart.matchup([['grass'], ['poison']])['coverage'].tolist()))
+        self.assertEqual((coverage['water'], coverage['fairy'], coverage['steel']), (2, 2, 0.5))
+        self.assertEqual(type_chart.missing(['grass', 'fire']), ['fire'])
+
+    def test_resync_replaces_a_types_pairs(self):
+        relations = dict(SAMPLE_TYPE_API_DATA['damage_relations'], double_damage_from=[{'name': 'ice'}])
+        ingest_type_payloads([dict(SAMPLE_TYPE_API_DATA, damage_relations=relations)])
+        self.assertEqual(self.multipliers(['grass'])['fire'], 1)
+        self.assertEqual(self.multipliers(['grass'])['electric'], 0.5)
+
+    @patch('pokedex_app.pokeapi.get', side_effect=requests.ConnectionError("offline"))
+    def test_matchup_endpoint(self, mock_get):
+        response = self.client.get(reverse('api_type_matchup'), {'pokemon': 'bulbasaur', 'types': ['poison', 'fire,flying']})
+        body = response.json()
+        self.assertEqual([result['name'] for result in body['results']], ['bulbasaur', 'poison', 'fire/flying'])
+        self.assertEqual(sorted(body['results'][0]['weak_to']), ['fire', 'flying', 'ice', 'psychic'])
+        self.assertEqual(body['results'][0]['multipliers']['grass'], 0.25)
+        self.assertEqual(body['coverage']['fairy'], 2)
+        self.assertEqual(sorted(body['unsynced_types']), ['fire', 'flying'])
+        self.assertEqual(self.client.get(reverse('api_type_matchup'), {'pokemon': 'missingno'}).status_code, 404)
+        self.assertEqual(self.client.get(reverse('api_type_matchup')).status_code, 400)
+
+    def test_compare_page_fetches_missing_relations(self):
+        Type.objects.filter(name='poison').update(relations_synced_at=None)
+        Pokemon.objects.create(pokeapi_id=25, name='pikachu', stats={'hp': 35})
+        with patch('pokedex_app.pokeapi.get', return_value=mock_api_response(200, SAMPLE_POISON_TYPE_API_DATA)) as mock_get:
+            response = self.client.get(reverse('pokemon_compare'), {'pokemon': ['bulbasaur', 'pikachu']})
+        self.assertEqual([call.args[0] for call in mock_get.call_args_list], ['type/poison/'])
+        rows = {row['type']: row for row in response.context['type_matchups']}
+        self.assertEqual([cell['label'] for cell in rows['Grass']['cells']], ['¼', '1'])
+        self.assertEqual(rows['Steel']['coverage']['multiplier'], 0.5)
+        self.assertContains(response, 'Type Matchups')
+
+class SearchIndexTests(PokedexTestCase):
+    def setUp(self):
+        super().setUp()
+        ingest_pokemon_payloads([SAMPLE_POKEMON_API_DATA, dict(SAMPLE_POKEMON_API_DATA, id=25, name='pikachu')])
+        self.api_responses = {'pokemon?limit=100000': mock_api_response(200, SAMPLE_NAME_LIST_API_DATA)}
+        patcher = patch('pokedex_app.pokeapi.get', side_effect=lambda url, **kwargs: self.api_responses.get(url, mock_api_response(404)))
+        self.mock_get = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_prefix_and_fuzzy_lookups(self):
+        self.assertEqual(search_index.prefix('pi'), ['pichu', 'pikachu'])
+        self.assertEqual(search_index.prefix('x'), [])
+        self.assertEqual(search_index.fuzzy('pikachuu'), ['pikachu'])
+        self.assertEqual(search_index.fuzzy('bulbsaur'), ['bulbasaur'])
+        self.assertEqual(search_index.suggest('ichu'), ['pichu']) # raichu is two edits away
+        self.assertEqual(edit_distance('kitten', 'sitting', 5), 3)
+        self.assertEqual(edit_distance('kitten', 'sitting', 1), 2) # Gives up past the limit
+
+    def test_typo_search_suggests_without_calling_the_api(self):
+        response = self.client.get(reverse('pokemon_list'), {'q': 'Pikachuu'})
+        self.assertEqual(response.context['suggestions'], ['pikachu'])
+        self.assertContains(response, 'Did you mean')
+        self.assertNotIn('pokemon/pikachuu/', [call.args[0] for call in self.mock_get.call_args_list])
+
+    def test_names_known_upstream_are_fetched(self):
+        self.api_responses['pokemon/raichu/'] = mock_api_response(200, dict(SAMPLE_POKEMON_API_DATA, id=26, name='raichu'))
+        response = self.client.get(reverse('pokemon_list'), {'q': 'raichu'})
+        self.assertRedirects(response, reverse('pokemon_detail', args=['raichu']), fetch_redirect_response=False)
+        self.assertEqual(search_index.prefix('rai'), ['raichu'])
+        self.assertEqual(search_index.ids['raichu'], 26)
+
+    def test_404s_are_remembered_when_the_name_list_is_unavailable(self):
+        del self.api_responses['pokemon?limit=100000']
+        self.client.get(reverse('pokemon_list'), {'q': 'missingno'})
+        self.client.get(reverse('pokemon_list'), {'q': 'missingno'})
+        fetched = [call.args[0] for call in self.mock_get.call_args_list]
+        self.assertEqual(fetched.count('pokemon/missingno/'), 1)
+
+    def test_synced_pokemon_are_added_without_a_rebuild(self):
+        search_index.ensure_current()
+        ingest_pokemon_payloads([dict(SAMPLE_POKEMON_API_DATA, id=172, name='pichu')])
+        # One query for the rows synced since the last read; the other names stay as they are
+        with self.assertNumQueries(1), patch.object(search_index, '_build') as mock_build:
+            search_index.ensure_current()
+        mock_build.assert_not_called()
+        self.assertEqual(search_index.ids['pichu'], 172)
+        self.assertEqual(search_index.prefix('pi'), ['pichu', 'pikachu'])
+
+    @override_settings(POKEDEX_REFRESH_MODE='thread')
+    def test_name_list_loads_in_the_background(self):
+        release = threading.Event()
+        answer = self.mock_get.side_effect
+        self.mock_get.side_effect = lambda url, **kwargs: release.wait(5) and answer(url, **kwargs)
+        # The name list is still on its way: lookups answer from the DB names meanwhile
+        self.assertEqual(search_index.prefix('pi'), ['pikachu'])
+        release.set()
+        for thread in threading.enumerate():
+            if thread.name == 'pokedex-search-upstream':
+                thread.join(5)
+        self.assertEqual(search_index.prefix('pi'), ['pichu', 'pikachu'])
+
+    def test_autocomplete_endpoint(self):
+        response = self.client.get(reverse('api_pokemon_autocomplete'), {'q': 'Pi'})
+        self.assertEqual(response.json(), {
+            'query': 'pi', 'results': [{'name': 'pichu', 'id': None}, {'name': 'pikachu', 'id': 25}],
+        })
+        self.assertEqual(self.client.get(reverse('api_pokemon_autocomplete'), {'q': 'mr mime'}).json()['results'], [
+            {'name': 'mr-mime', 'id': None},
+        ])
+
+@override_settings(POKEDEX_INLINE_SEEDING=False)
+class KeysetPaginationTests(PokedexTestCase):
+    def setUp(self):
+        super().setUp()
+        ingest_pokemon_payloads([_fake_pokemon_payload(pokeapi_id) for pokeapi_id in range(1, 46)])
+        filter_vocabulary(Type)
+        filter_vocabulary(Ability)
+
+    def test_list_page_walks_forward_and_back_with_cursors(self):
+        response = self.client.get(reverse('pokemon_list'), {'cursor': ''})
+        first_page = response.context['pokemon_list_from_db']
+        self.assertEqual([p.pokeapi_id for p in first_page], list(range(1, 21)))
+        self.assertFalse(first_page.has_previous)
+
+        # A deep page skips the COUNT: rows, types and abilities only
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse('pokemon_list'), {'cursor': first_page.next_cursor})
+        second_page = response.context['pokemon_list_from_db']
+        self.assertEqual([p.pokeapi_id for p in second_page], list(range(21, 41)))
+        self.assertContains(response, f'?cursor={second_page.next_cursor}')
+
+        response = self.client.get(reverse('pokemon_list'), {'cursor': second_page.next_cursor})
+        last_page = response.context['pokemon_list_from_db']
+        self.assertEqual([p.pokeapi_id for p in last_page], list(range(41, 46)))
+        self.assertFalse(last_page.has_next)
+
+        response = self.client.get(reverse('pokemon_list'), {'cursor': last_page.previous_cursor})
+        self.assertEqual([p.pokeapi_id for p in response.context['pokemon_list_from_db']], list(range(21, 41)))
+
+    def test_list_page_falls_back_to_first_page_on_a_bad_cursor(self):
+        response = self.client.get(reverse('pokemon_list'), {'cursor': 'not-a-cursor'})
+        self.assertEqual(response.context['pokemon_list_from_db'][0].pokeapi_id, 1)
+        self.assertContains(response, 'not valid anymore')
+
+    def test_filtered_list_falls_back_to_first_page_on_an_out_of_range_cursor(self):
+        for raw in ('n-5', 'p-5', 'n999999999', 'p999999999'):
+            cursor = base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+            response = self.client.get(reverse('pokemon_list'), {'ability_filter_name': 'overgrow', 'cursor': cursor})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.context['pokemon_list_from_db'][0].pokeapi_id, 1)
+            self.assertContains(response, 'not valid anymore')
+
+    def test_api_walks_the_whole_dex(self):
+        url, seen = reverse('api_pokemon_list') + '?limit=20', []
+        while url:
+            # Rows, their types and "is there more?" (a short last page already knows it is the last)
+            with self.assertNumQueries(3 if len(seen) < 40 else 2):
+                response = self.client.get(url)
+                data = json.loads(b''.join(response.streaming_content))
+            self.assertEqual(response['Content-Type'], 'application/json')
+            seen.extend(row['id'] for row in data['results'])
+            url = data['next']
+        self.assertEqual(seen, list(range(1, 46)))
+
+    def test_api_rows_and_filters(self):
+        response = self.client.get(reverse('api_pokemon_list'), {'type': 'type-7'})
+        data = json.loads(b''.join(response.streaming_content))
+        self.assertEqual(data, {'results': [{
+            'id': 7, 'name': 'pokemon-7', 'sprite': 'https://example.com/bulbasaur.png', 'types': ['grass', 'type-7'],
+        }], 'next': None})
+
+    def test_api_rejects_bad_parameters(self):
+        self.assertEqual(self.client.get(reverse('api_pokemon_list'), {'cursor': 'bogus'}).status_code, 400)
+        for raw in ('n-5', f'n{2 ** 31}'):
+            cursor = base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+            self.assertEqual(self.client.get(reverse('api_pokemon_list'), {'cursor': cursor}).status_code, 400)
+        self.assertEqual(self.client.get(reverse('api_pokemon_list'), {'limit': '5000'}).status_code, 400)
+
+class EvolutionGraphTests(PokedexTestCase):
+    def setUp(self):
+        super().setUp()
+        for pokeapi_id, name in [(133, 'eevee'), (134, 'vaporeon'), (135, 'jolteon'), (136, 'flareon')]:
+            Pokemon.objects.create(pokeapi_id=pokeapi_id, name=name, stats={'hp': 50})
+        self.eevee_chain = {
+            'id': 67,
+            'chain': {
+                'species': {'name': 'eevee'},
+                'evolves_to': [
+                    {'species': {'name': name}, 'evolves_to': []} for name in ['vaporeon', 'jolteon', 'flareon']
+                ]
+            }
+        }
+
+    def test_ingest_links_species_and_edges(self):
+        ingest_evolution_chains([self.eevee_chain])
+
+        eevee = Pokemon.objects.select_related('species__chain').get(name='eevee')
+        self.assertEqual(eevee.species.chain.pokeapi_id, 67)
+        self.assertEqual(EvolutionEdge.objects.filter(from_species=eevee.species).count(), 3)
+
+    def test_tree_loads_in_two_queries(self):
+        ingest_evolution_chains([self.eevee_chain])
+        jolteon = Pokemon.objects.select_related('species').get(name='jolteon')
+
+        with self.assertNumQueries(2):
+            tree = load_evolution_tree(jolteon)
+
+        self.assertEqual(tree['name'], 'Eevee')
+        self.assertEqual([node['name'] for node in tree['evolves_to']], ['Vaporeon', 'Jolteon', 'Flareon'])
+
+    def test_unsynced_chain_returns_none(self):
+        eevee = Pokemon.objects.select_related('species').get(name='eevee')
+        self.assertIsNone(load_evolution_tree(eevee))
+
+    @patch('pokedex_app.pokeapi.get')
+    def test_detail_view_syncs_chain_once(self, mock_get):
+        api_documents = {
+            'pokemon/bulbasaur/': dict(SAMPLE_POKEMON_API_DATA, species={'name': 'bulbasaur', 'url': 'https://pokeapi.co/api/v2/pokemon-species/1/'}),
+            # Requested by name alongside the Pokemon, so the id URL the payload links to is never needed
+            'pokemon-species/bulbasaur/': SAMPLE_SPECIES_API_DATA,
+            'https://pokeapi.co/api/v2/evolution-chain/1/': SAMPLE_EVOLUTION_CHAIN_API_DATA,
+            'pokemon/ivysaur/': dict(SAMPLE_POKEMON_API_DATA, id=2, name='ivysaur', species={'name': 'ivysaur'}),
+            'pokemon/venusaur/': dict(SAMPLE_POKEMON_API_DATA, id=3, name='venusaur', species={'name': 'venusaur'}),
+        }
+        mock_get.side_effect = lambda path, **kwargs: mock_api_response(200, api_documents[path])
+
+        response = self.client.get(reverse('pokemon_detail', args=['bulbasaur']))
+        self.assertEqual(mock_get.call_count, len(api_documents))
+        chain = response.context['evolution_chain']
+        self.assertEqual(chain['evolves_to'][0]['evolves_to'][0]['name'], 'Venusaur')
+
+        # Even with no cached page or raw response left, the stored graph needs no API call
+        response_cache.clear()
+        cache.clear()
+        mock_get.reset_mock()
+        response = self.client.get(reverse('pokemon_detail', args=['bulbasaur']))
+        mock_get.assert_not_called()
+        self.assertEqual(response.context['evolution_chain']['evolves_to'][0]['name'], 'Ivysaur')
+
+class ImportPokedexCommandTests(PokedexTestCase):
+    def setUp(self):
+        super().setUp()
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        self.dump_dir = Path(tmp_dir.name) / 'dump'
+        self.checkpoint = Path(tmp_dir.name) / 'checkpoint.json'
+        documents = {
+            'type': {'results': [{'name': 'grass'}, {'name': 'poison'}]},
+            'type/grass': SAMPLE_TYPE_API_DATA,
+            'type/poison': SAMPLE_POISON_TYPE_API_DATA,
+            'ability': {'results': [{'name': 'overgrow'}]},
+            'pokemon': {'results': [{'name': 'bulbasaur'}, {'name': 'ivysaur'}]},
+            'pokemon/bulbasaur': SAMPLE_POKEMON_API_DATA,
+            'pokemon/ivysaur': dict(SAMPLE_POKEMON_API_DATA, id=2, name='ivysaur'),
+            'pokemon-species': {'results': [{'name': 'bulbasaur'}]},
+            'pokemon-species/bulbasaur': SAMPLE_SPECIES_API_DATA,
+            'evolution-chain': {'results': [{'url': 'https://pokeapi.co/api/v2/evolution-chain/1/'}]},
+            'evolution-chain/1': SAMPLE_EVOLUTION_CHAIN_API_DATA,
+        }
+        for path, document in documents.items():
+            dump_file = self.dump_dir / f'{path}.json'
+            dump_file.parent.mkdir(parents=True, exist_ok=True)
+            dump_file.write_text(json.dumps(document))
+
+    def run_import(self, *extra_args):
+        call_command(
+            'import_pokedex', '--from-dir', str(self.dump_dir), '--checkpoint', str(self.checkpoint),
+            '--batch-size', '1', *extra_args, stdout=io.StringIO()
+        )
+
+    def test_import_from_dump_dir(self):
+        with patch('pokedex_app.pokeapi.get') as mock_get:
+            self.run_import()
+            mock_get.assert_not_called()
+        self.assertEqual(list(Pokemon.objects.order_by('pokeapi_id').values_list('name', flat=True)), ['bulbasaur', 'ivysaur'])
+        self.assertTrue(Type.objects.filter(name='poison').exists())
+        self.assertEqual(type_chart.matchup([['grass', 'poison']])['coverage'][type_chart.names.index('steel')], 0.5)
+        self.assertEqual(EvolutionEdge.objects.count(), 2)
+        self.assertEqual(Pokemon.objects.get(name='ivysaur').species.chain.pokeapi_id, 1)
+        self.assertFalse(self.checkpoint.exists())
+
+    def test_import_resumes_from_checkpoint(self):
+        self.checkpoint.write_text(json.dumps({'type': ['grass', 'poison'], 'pokemon': ['bulbasaur']}))
+        self.run_import()
+        self.assertEqual(list(Pokemon.objects.values_list('name', flat=True)), ['ivysaur'])
+
+    def test_failed_entries_keep_the_checkpoint(self):
+        (self.dump_dir / 'pokemon' / 'ivysaur.json').unlink()
+        self.run_import()
+        self.assertEqual(json.loads(self.checkpoint.read_text())['pokemon'], ['bulbasaur'])
+
+    def test_entries_gone_upstream_are_skipped_not_retried(self):
+        (self.dump_dir / 'pokemon' / 'ivysaur.json').unlink()
+
+        def fetch_from_dump(path):
+            dump_file = self.dump_dir / (path.split('?', 1)[0].strip('/') + '.json')
+            return pokeapi.CachedResponse(200, dump_file.read_text()) if dump_file.exists() else pokeapi.CachedResponse(404)
+
+        stdout = io.StringIO()
+        with patch('pokedex_app.pokeapi.fetch', side_effect=fetch_from_dump):
+            call_command('import_pokedex', '--checkpoint', str(self.checkpoint), stdout=stdout, stderr=io.StringIO())
+        self.assertIn('1 listed entries were not found upstream', stdout.getvalue())
+        self.assertFalse(self.checkpoint.exists())
+        self.assertEqual(list(Pokemon.objects.values_list('name', flat=True)), ['bulbasaur'])
+
+class _StubPokeAPIHandler(BaseHTTPRequestHandler):
+    """
+    Answers any GET with SAMPLE_POKEMON_API_DATA and an ETag (304 when If-None-Match matches),
+    after failing `failures_left` times with 503, each after `delay` seconds. Paths containing 'missingno' are 404s,
+    and paths ending in .png get SAMPLE_SPRITE_PNG.
+    """
+    failures_left = 0
+    delay = 0
+    etag = '"v1"'
+
+    def do_GET(self):
+        time.sleep(_StubPokeAPIHandler.delay)
+        if 'missingno' in self.path:
+            self.send_response(404)
+            self.end_headers()
+            return
+        if _StubPokeAPIHandler.failures_left > 0:
+            _StubPokeAPIHandler.failures_left -= 1
+            self.send_response(503)
+            self.end_headers()
+            return
+        if self.headers.get('If-None-Match') == self.etag:
+            self.send_response(304)
+            self.end_headers()
+            return
+        body = SAMPLE_SPRITE_PNG if self.path.endswith('.png') else json.dumps(SAMPLE_POKEMON_API_DATA).encode()
+        self.send_response(200)
+        self.send_header('ETag', self.etag)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+def _png(width, height):
+    buffer = io.BytesIO()
+    Image.new('RGBA', (width, height), (200, 30, 30, 255)).save(buffer, format='PNG')
+    return buffer.getvalue()
+
+SAMPLE_SPRITE_PNG = _png(96, 96)
+
+class _StubPokeAPIServer(ThreadingHTTPServer):
+    request_queue_size = 64 # Concurrent connects beyond the default backlog of 5 would wait out a SYN retry
+
+class StubPokeAPITestCase(PokedexTestCase):
+    """Points the PokeAPI clients, sync and async, at a local _StubPokeAPIHandler server."""
+    route_aget_through_get = False
+
+    def setUp(self):
+        super().setUp()
+        self.server = _StubPokeAPIServer(('127.0.0.1', 0), _StubPokeAPIHandler)
+        threading.Thread(target=self.server.serve_forever, kwargs={'poll_interval': 0.05}, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        base_url = f'http://127.0.0.1:{self.server.server_port}/api/v2/'
+        settings_override = override_settings(POKEAPI_BASE_URL=base_url, POKEAPI_RETRY_BACKOFF=0)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        # The session captures the retry settings when it is built
+        pokeapi.close_session()
+        self.addCleanup(pokeapi.close_session)
+        pokeapi.stats.reset()
+
+class PokeAPIClientTests(StubPokeAPITestCase):
+    def test_api_url_rewrites_canonical_urls_onto_base_url(self):
+        self.assertEqual(pokeapi.api_url('pokemon/1/'), f'http://127.0.0.1:{self.server.server_port}/api/v2/pokemon/1/')
+        self.assertEqual(
+            pokeapi.api_url('https://pokeapi.co/api/v2/evolution-chain/1/'),
+            f'http://127.0.0.1:{self.server.server_port}/api/v2/evolution-chain/1/'
+        )
+
+    def test_get_retries_5xx_and_counts(self):
+        _StubPokeAPIHandler.failures_left = 2
+        response = pokeapi.get('pokemon/bulbasaur/')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['name'], 'bulbasaur')
+        counters = pokeapi.stats.snapshot()
+        self.assertEqual(counters['requests'], 1)
+        self.assertEqual(counters['retries'], 2)
+        self.assertGreater(counters['total_latency'], 0)
+
+    def test_get_or_fetch_pokemon_details_through_stub_server(self):
+        pokemon = get_or_fetch_pokemon_details('bulbasaur')
+        self.assertEqual(pokemon.pokeapi_id, 1)
+        self.assertEqual(pokeapi.stats.snapshot()['requests'], 1)
+
+class AsyncPokeAPIClientTests(StubPokeAPITestCase):
+    async def test_afetch_retries_then_caches(self):
+        _StubPokeAPIHandler.failures_left = 2
+        first = await pokeapi.afetch('pokemon/bulbasaur/')
+        second = await pokeapi.afetch('pokemon/bulbasaur/')
+
+        self.assertEqual((first.status_code, first.from_cache, first.json()['name']), (200, False, 'bulbasaur'))
+        self.assertTrue(second.from_cache)
+        self.assertEqual(pokeapi.stats.snapshot()['retries'], 2)
+
+    async def test_afetch_revalidates_expired_entry_with_etag(self):
+        with override_settings(POKEAPI_CACHE_TTL={'default': 0}):
+            await pokeapi.afetch('pokemon/bulbasaur/')
+            response = await pokeapi.afetch('pokemon/bulbasaur/')
+
+        self.assertTrue(response.from_cache)
+        self.assertEqual(response.json()['id'], 1)
+        self.assertEqual(response_cache.stats.snapshot()['revalidations'], 1)
+
+    async def test_afetch_keeps_disk_io_off_the_event_loop(self):
+        disk_threads = []
+        read_disk, write_disk = response_cache._read_disk, response_cache._write_disk
+
+        def recording(method):
+            def wrapper(*args):
+                disk_threads.append(threading.get_ident())
+                return method(*args)
+            return wrapper
+
+        with patch.object(response_cache, '_read_disk', recording(read_disk)), \
+                patch.object(response_cache, '_write_disk', recording(write_disk)):
+            await pokeapi.afetch('pokemon/bulbasaur/')
+            await pokeapi.afetch('pokemon/bulbasaur/') # A memory hit: no disk access at all
+
+        self.assertEqual(len(disk_threads), 2)
+        self.assertNotIn(threading.get_ident(), disk_threads)
+
+    async def test_afetch_raises_requests_errors(self):
+        self.assertEqual((await pokeapi.afetch('pokemon/missingno/')).status_code, 404)
+        with override_settings(POKEAPI_BASE_URL='http://127.0.0.1:1/api/v2/', POKEAPI_MAX_RETRIES=0):
+            with self.assertRaises(requests.ConnectionError):
+                await pokeapi.aget('pokemon/bulbasaur/')
+
+    async def test_requests_run_concurrently_on_the_event_loop(self):
+        _StubPokeAPIHandler.delay = 0.2
+        self.addCleanup(setattr, _StubPokeAPIHandler, 'delay', 0)
+        started_at = time.perf_counter()
+        responses = await asyncio.gather(*(pokeapi.afetch(f'pokemon/{pokeapi_id}/') for pokeapi_id in range(1, 9)))
+        self.assertEqual([response.status_code for response in responses], [200] * 8)
+        self.assertLess(time.perf_counter() - started_at, 0.2 * 8 / 2) # Serially it would take 1.6s
+
+    async def test_ado_shares_one_call(self):
+        flight = SingleFlight()
+        release = asyncio.Event()
+        calls = []
+
+        async def leader_work():
+            calls.append(1)
+            await release.wait()
+            return 42
+
+        waiters = [asyncio.ensure_future(flight.ado('pokemon:charizard', leader_work)) for _ in range(8)]
+        await asyncio.sleep(0.05)
+        self.assertEqual(flight.in_flight(), ['pokemon:charizard'])
+        release.set()
+        self.assertEqual(await asyncio.gather(*waiters), [42] * 8)
+        self.assertEqual(calls, [1])
+        self.assertEqual(flight.in_flight(), [])
+
+    async def test_ado_outlives_a_cancelled_leader(self):
+        flight = SingleFlight()
+        release = asyncio.Event()
+
+        async def leader_work():
+            await release.wait()
+            return 42
+
+        leader = asyncio.ensure_future(flight.ado('pokemon:charizard', leader_work))
+        followers = [asyncio.ensure_future(flight.ado('pokemon:charizard', leader_work)) for _ in range(3)]
+        await asyncio.sleep(0.05)
+        leader.cancel() # Its client disconnected
+        await asyncio.sleep(0)
+        release.set()
+
+        self.assertEqual(await asyncio.gather(*followers), [42] * 3)
+        self.assertTrue(leader.cancelled())
+        self.assertEqual(flight.in_flight(), [])
+
+    async def test_afile_lock_only_hands_back_a_lock_it_acquired(self):
+        attempt = threading.Event()
+        lock = MagicMock()
+
+        def failing_enter():
+            attempt.wait()
+            raise OSError('flock failed')
+
+        lock.__enter__.side_effect = failing_enter
+        with patch('pokedex_app.single_flight.file_lock', return_value=lock):
+            async def hold():
+                async with afile_lock('pokemon:charizard'):
+                    pass
+
+            waiter = asyncio.ensure_future(hold())
+            await asyncio.sleep(0.05)
+            waiter.cancel()
+            await asyncio.sleep(0)
+            attempt.set()
+            with self.assertRaises(asyncio.CancelledError):
+                await waiter
+            await asyncio.sleep(0.1) # Lets the acquiring thread fail and its done-callback run
+
+        lock.__exit__.assert_not_called()
+
+    def test_detail_view_syncs_a_missing_pokemon_through_the_async_client(self):
+        response = self.client.get(reverse('pokemon_detail', args=['bulbasaur']))
+        self.assertEqual(response.context['pokemon_data']['id'], 1)
+        self.assertTrue(Pokemon.objects.filter(name='bulbasaur').exists())
+
+class InstrumentationTests(StubPokeAPITestCase):
+    def setUp(self):
+        super().setUp()
+        registry.reset()
+        self.addCleanup(registry.reset)
+
+    def test_server_timing_counts_queries_upstream_calls_and_cache_lookups(self):
+        response = self.client.get(reverse('pokemon_detail', args=['bulbasaur']))
+        timing = response['Server-Timing']
+        self.assertRegex(timing, r'db;desc="[1-9]\d* queries";dur=')
+        self.assertRegex(timing, r'pokeapi;desc="[1-9]\d* calls";dur=')
+        self.assertIn('cache-page;desc="0 hits, 1 misses"', timing)
+        self.assertIn('total;dur=', timing)
+
+        # The same page again comes out of the page cache without a query to PokeAPI
+        timing = self.client.get(reverse('pokemon_detail', args=['bulbasaur']))['Server-Timing']
+        self.assertIn('pokeapi;desc="0 calls"', timing)
+        self.assertIn('cache-page;desc="1 hits, 0 misses"', timing)
+
+    def test_metrics_endpoint_reports_per_view_counters(self):
+        self.client.get(reverse('pokemon_detail', args=['bulbasaur']))
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        body = response.content.decode()
+        self.assertIn('pokedex_http_requests_total{view="pokemon_detail",method="GET",status="200"} 1', body)
+        self.assertIn('pokedex_http_request_duration_seconds_count{view="pokemon_detail"} 1', body)
+        self.assertIn('pokedex_cache_requests_total{view="pokemon_detail",cache="page",result="miss"} 1', body)
+        self.assertRegex(body, r'pokedex_pokeapi_requests_total\{view="pokemon_detail"\} [1-9]')
+        self.assertRegex(body, r'pokedex_db_queries_total\{view="pokemon_detail"\} [1-9]')
+        self.assertIn('pokedex_pokeapi_breaker_open 0', body)
+
+    def test_metrics_endpoint_refuses_other_addresses(self):
+        response = self.client.get(reverse('metrics'), REMOTE_ADDR='203.0.113.7')
+        self.assertEqual(response.status_code, 403)
+
+class DatabaseTuningTests(TestCase):
+    def test_through_tables_have_reverse_lookup_indexes(self):
+        for table, column, index_name in [
+            ('pokedex_app_pokemon_types', 'type_id', 'pokemon_types_reverse_idx'),
+            ('pokedex_app_pokemon_abilities', 'ability_id', 'pokemon_abilities_reverse_idx'),
+        ]:
+            with connection.cursor() as cursor:
+                constraints = connection.introspection.get_constraints(cursor, table)
+            self.assertEqual(constraints[index_name]['columns'], [column, 'pokemon_id'])
+
+    @skipUnless(connection.vendor == 'sqlite', "SQLite PRAGMAs")
+    def test_sqlite_connections_are_tuned(self):
+        with connection.cursor() as cursor:
+            self.assertEqual(cursor.execute('PRAGMA synchronous').fetchone()[0], 1) # NORMAL
+            self.assertEqual(cursor.execute('PRAGMA temp_store').fetchone()[0], 2) # MEMORY
+            self.assertEqual(cursor.execute('PRAGMA busy_timeout').fetchone()[0], 20000)
+
+    @skipUnless(connection.vendor == 'sqlite', "SQLite PRAGMAs")
+    def test_sqlite_file_database_uses_wal(self):
+        # The test database lives in memory, where WAL does not apply; open a file-backed one with the same settings
+        with tempfile.TemporaryDirectory() as temp_dir:
+            file_connection = type(connections['default'])({**connection.settings_dict, 'NAME': str(Path(temp_dir) / 'db.sqlite3')}, alias='wal_test')
+            try:
+                with file_connection.cursor() as cursor:
+                    self.assertEqual(cursor.execute('PRAGMA journal_mode').fetchone()[0], 'wal')
+                with file_connection.cursor() as cursor:
+                    self.assertGreater(cursor.execute('PRAGMA mmap_size').fetchone()[0], 0)
+            finally:
+                file_connection.close()
+
+class StaticFilesTests(TestCase):
+    @override_settings(WHITENOISE_USE_FINDERS=True)
+    async def test_static_files_are_served_under_asgi(self):
+        response = await self.async_client.get('/static/pokedex_app/images/pokemon_placeholder.png')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'image/png')
+        body = b''.join([chunk async for chunk in response.streaming_content])
+        self.assertEqual(body, (Path(__file__).parent / 'static/pokedex_app/images/pokemon_placeholder.png').read_bytes())
+
+class SpriteTests(StubPokeAPITestCase):
+    def _pokemon_with_sprite(self, pokeapi_id, path=None):
+        return Pokemon.objects.create(
+            pokeapi_id=pokeapi_id, name=f'pokemon-{pokeapi_id}', sprite_url=pokeapi.api_url(path or f'sprites/{pokeapi_id}.png')
+        )
+
+    def test_sprite_is_downloaded_once_and_revalidated_by_etag(self):
+        self._pokemon_with_sprite(1)
+        response = self.client.get(reverse('pokemon_sprite', args=[1]))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'image/png')
+        self.assertEqual(response.content, SAMPLE_SPRITE_PNG)
+        self.assertIn('max-age=', response['Cache-Control'])
+        etag = response['ETag']
+
+        # A new worker serves it from disk: upstream would fail now
+        sprite_store.clear()
+        _StubPokeAPIHandler.failures_left = 100
+        self.addCleanup(setattr, _StubPokeAPIHandler, 'failures_left', 0)
+        self.assertEqual(self.client.get(reverse('pokemon_sprite', args=[1])).content, SAMPLE_SPRITE_PNG)
+        not_modified = self.client.get(reverse('pokemon_sprite', args=[1]), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(not_modified.status_code, 304)
+        self.assertEqual(not_modified['ETag'], etag)
+
+    async def test_afetch_reads_and_writes_files_off_the_event_loop(self):
+        file_threads = []
+        lookup, store = sprite_store.lookup, sprite_store._store
+
+        def recording(method):
+            def wrapper(*args):
+                file_threads.append(threading.get_ident())
+                return method(*args)
+            return wrapper
+
+        with patch.object(sprite_store, 'lookup', recording(lookup)), patch.object(sprite_store, '_store', recording(store)):
+            sprite = await sprite_store.afetch(pokeapi.api_url('sprites/1.png'))
+            self.assertEqual(await sprite_store.afetch(pokeapi.api_url('sprites/1.png')), sprite) # Remembered: no file access
+
+        self.assertEqual(len(file_threads), 3) # Two lookups (before and inside the single flight), one store
+        self.assertNotIn(threading.get_ident(), file_threads)
+
+    def test_sprite_falls_back_to_upstream_url(self):
+        pokemon_obj = self._pokemon_with_sprite(1, 'pokemon/1/') # Not an image
+        response = self.client.get(reverse('pokemon_sprite', args=[1]))
+        self.assertRedirects(response, pokemon_obj.sprite_url, fetch_redirect_response=False)
+        self.assertEqual(self.client.get(reverse('pokemon_sprite', args=[2])).status_code, 404)
+
+    def test_pages_link_local_sprites(self):
+        pokemon_obj = self._pokemon_with_sprite(1)
+        self.assertEqual(pokemon_obj.sprite_src, reverse('pokemon_sprite', args=[1]))
+        with override_settings(POKEDEX_SPRITE_PROXY=False):
+            self.assertEqual(pokemon_obj.sprite_src, pokemon_obj.sprite_url)
+
+    @override_settings(POKEDEX_INLINE_SEEDING=False)
+    def test_list_page_bundles_cached_sprites_into_a_sheet(self):
+        for pokeapi_id in (1, 2, 3):
+            self._pokemon_with_sprite(pokeapi_id)
+        call_command('prewarm_sprites', stdout=io.StringIO())
+        self._pokemon_with_sprite(4) # Not downloaded yet: loads its own sprite
+
+        response = self.client.get(reverse('pokemon_list'))
+        sheet = response.context['sprite_sheet']
+        self.assertEqual(sheet['width'], 3 * 50)
+        self.assertEqual([p.sheet_position for p in response.context['pokemon_list_from_db']], [0, 50, 100, None])
+        self.assertContains(response, reverse('pokemon_sprite', args=[4]))
+
+        sheet_response = self.client.get(sheet['url'])
+        self.assertEqual(sheet_response.status_code, 200)
+        self.assertEqual(png_size(sheet_response.content), (3 * SHEET_CELL, SHEET_CELL))
+        self.assertIn('immutable', sheet_response['Cache-Control'])
+        self.assertEqual(self.client.get(sheet['url'], HTTP_IF_NONE_MATCH=sheet_response['ETag']).status_code, 304)
+        self.assertEqual(self.client.get(sheet['url'].replace('ids=1%2C2%2C3', 'ids=1%2C2%2C4')).status_code, 404)
+
+class ResponseCacheTests(StubPokeAPITestCase):
+    def test_fresh_entry_is_served_without_upstream_call(self):
+        first = pokeapi.fetch('pokemon/bulbasaur/')
+        second = pokeapi.fetch('https://pokeapi.co/api/v2/pokemon/bulbasaur/') # same URL once rewritten
+
+        self.assertFalse(first.from_cache)
+        self.assertTrue(second.from_cache)
+        self.assertEqual(second.json()['name'], 'bulbasaur')
+        self.assertEqual(pokeapi.stats.snapshot()['requests'], 1)
+        self.assertEqual(response_cache.stats.snapshot()['hits'], 1)
+        self.assertEqual(response_cache.stats.snapshot()['misses'], 1)
+
+    def test_expired_entry_is_revalidated_with_etag(self):
+        with override_settings(POKEAPI_CACHE_TTL={'default': 0}):
+            pokeapi.fetch('pokemon/bulbasaur/')
+            response = pokeapi.fetch('pokemon/bulbasaur/')
+
+        self.assertTrue(response.from_cache)
+        self.assertEqual(response.json()['id'], 1)
+        self.assertEqual(pokeapi.stats.snapshot()['requests'], 2)
+        self.assertEqual(response_cache.stats.snapshot()['revalidations'], 1)
+
+    def test_persistent_tier_survives_a_new_process(self):
+        pokeapi.fetch('pokemon/bulbasaur/')
+        fresh_process_cache = ResponseCache()
+
+        entry = fresh_process_cache.lookup(pokeapi.api_url('pokemon/bulbasaur/'))
+
+        self.assertIsNotNone(entry)
+        self.assertTrue(entry.is_fresh())
+        self.assertEqual(entry.etag, '"v1"')
+        self.assertEqual(fresh_process_cache.stats.snapshot()['disk_hits'], 1)
+
+    def test_memory_tier_evicts_least_recently_used(self):
+        body_size = len(json.dumps(SAMPLE_POKEMON_API_DATA))
+        with override_settings(POKEAPI_CACHE_MEMORY_MAX_BYTES=body_size * 2, POKEAPI_CACHE_DIR=''):
+            for name in ['bulbasaur', 'ivysaur', 'venusaur']:
+                pokeapi.fetch(f'pokemon/{name}/')
+
+            self.assertEqual(response_cache.sizes()['memory_entries'], 2)
+            self.assertEqual(response_cache.stats.snapshot()['memory_evictions'], 1)
+            self.assertIsNone(response_cache.lookup(pokeapi.api_url('pokemon/bulbasaur/')))
+
+    def test_disk_tier_respects_byte_cap(self):
+        with override_settings(POKEAPI_CACHE_DISK_MAX_BYTES=1500):
+            for name in ['bulbasaur', 'ivysaur', 'venusaur', 'charmander']:
+                pokeapi.fetch(f'pokemon/{name}/')
+
+        self.assertLessEqual(response_cache.sizes()['disk_bytes'], 1500)
+        self.assertGreater(response_cache.stats.snapshot()['disk_evictions'], 0)
+
+class NegativeCacheAndBreakerTests(StubPokeAPITestCase):
+    def test_404_is_cached(self):
+        first = pokeapi.fetch('pokemon/missingno/')
+        second = pokeapi.fetch('pokemon/missingno/')
+
+        self.assertEqual((first.status_code, second.status_code), (404, 404))
+        self.assertTrue(second.from_cache)
+        self.assertEqual(pokeapi.stats.snapshot()['requests'], 1)
+        self.assertEqual(response_cache.stats.snapshot()['negative_hits'], 1)
+
+    def test_transient_failures_are_held_only_briefly(self):
+        _StubPokeAPIHandler.failures_left = 100
+        self.addCleanup(setattr, _StubPokeAPIHandler, 'failures_left', 0)
+        with override_settings(POKEAPI_NEGATIVE_TTL_ERROR=0):
+            self.assertEqual(pokeapi.fetch('pokemon/bulbasaur/').status_code, 503)
+        self.assertEqual(pokeapi.fetch('pokemon/bulbasaur/').status_code, 503) # The first failure already expired
+        self.assertEqual(pokeapi.fetch('pokemon/bulbasaur/').status_code, 503) # This one is held
+        self.assertEqual(pokeapi.stats.snapshot()['requests'], 2)
+
+        response_cache.forget_negative(pokeapi.api_url('pokemon/bulbasaur/'))
+        _StubPokeAPIHandler.failures_left = 0
+        self.assertEqual(pokeapi.fetch('pokemon/bulbasaur/').status_code, 200)
+
+    def test_negative_cache_is_bounded(self):
+        with override_settings(POKEAPI_NEGATIVE_MAX_ENTRIES=2):
+            for url in ['a', 'b', 'c']:
+                response_cache.store_negative(url, 404)
+        self.assertIsNone(response_cache.lookup_negative('a'))
+        self.assertEqual(response_cache.lookup_negative('c'), 404)
+        self.assertEqual(response_cache.stats.snapshot()['negative_evictions'], 1)
+
+    @override_settings(POKEAPI_MAX_RETRIES=0, POKEAPI_BREAKER_MIN_REQUESTS=3, POKEAPI_BREAKER_ERROR_RATE=0.5)
+    def test_breaker_opens_on_errors_and_closes_after_a_good_trial(self):
+        pokeapi.close_session() # Pick up POKEAPI_MAX_RETRIES=0
+        _StubPokeAPIHandler.failures_left = 100
+        self.addCleanup(setattr, _StubPokeAPIHandler, 'failures_left', 0)
+        for _ in range(3):
+            self.assertEqual(pokeapi.get('pokemon/bulbasaur/').status_code, 503)
+        self.assertEqual(pokeapi.breaker.state, pokeapi.CircuitBreaker.OPEN)
+
+        with self.assertRaises(pokeapi.CircuitOpenError):
+            pokeapi.get('pokemon/bulbasaur/')
+        self.assertEqual(pokeapi.stats.snapshot()['requests'], 3)
+        self.assertEqual(pokeapi.stats.snapshot()['short_circuited'], 1)
+
+        _StubPokeAPIHandler.failures_left = 0
+        with override_settings(POKEAPI_BREAKER_COOLDOWN=0):
+            self.assertEqual(pokeapi.get('pokemon/bulbasaur/').status_code, 200)
+        self.assertEqual(pokeapi.breaker.state, pokeapi.CircuitBreaker.CLOSED)
+
+    def test_404s_do_not_open_the_breaker(self):
+        with override_settings(POKEAPI_BREAKER_MIN_REQUESTS=2):
+            for name in ['missingno', 'missingno-2', 'missingno-3']:
+                pokeapi.fetch(f'pokemon/{name}/')
+        self.assertEqual(pokeapi.breaker.state, pokeapi.CircuitBreaker.CLOSED)
+
+    def test_open_breaker_serves_the_detail_page_from_the_db(self):
+        Pokemon.objects.create(pokeapi_id=25, name='pikachu', stats={'hp': 35}, last_synced_at=timezone.now())
+        with override_settings(POKEAPI_BREAKER_MIN_REQUESTS=1, POKEAPI_BREAKER_COOLDOWN=60):
+            pokeapi.breaker.record(failed=True)
+            response = self.client.get(reverse('pokemon_detail', args=['pikachu']))
+            missing = self.client.get(reverse('pokemon_detail', args=['bulbasaur']))
+
+        self.assertContains(response, 'Pikachu')
+        self.assertContains(missing, 'Could not find or fetch data')
+        self.assertEqual(pokeapi.stats.snapshot()['requests'], 0)
+
 class UrlTests(TestCase):
     def test_index_url_resolves(self):
         url = reverse('index')
@@ -196,3 +1598,8 @@ class UrlTests(TestCase):
     def test_pokemon_compare_url_resolves(self):
         url = reverse('pokemon_compare')
         self.assertEqual(resolve(url).func, pokemon_compare)
+
+    def test_api_pokemon_list_url_resolves(self):
+        url = reverse('api_pokemon_list')
+        self.assertEqual(url, '/api/pokemon/')
+        self.assertEqual(resolve(url).func, api_pokemon_list)
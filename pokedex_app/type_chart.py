@@ -0,0 +1,82 @@
+"""
+In-memory type effectiveness chart: an N x N NumPy matrix of damage multipliers, rows attacking
+types and columns defending types, built from the TypeEffectiveness rows (pairs not stored are 1x).
+
+With the chart in memory, the defensive multipliers of any number of Pokemon (a dual type is the
+product of its two columns) and a team's offensive coverage are a few array operations for the
+whole batch. Each worker rebuilds its copy (in_process_index.py) when signals.py reports changed
+types, locally right away and elsewhere through the rebuild generation in the Django cache.
+"""
+import logging
+
+import numpy as np
+
+from .in_process_index import InProcessIndex
+from .models import Type, TypeEffectiveness
+
+logger = logging.getLogger(__name__)
+
+
+class TypeChart(InProcessIndex):
+    REBUILD_KEY = 'pokedex:type_chart:rebuild'
+    CHANGES_KEY = 'pokedex:type_chart:changes' # Never bumped: no bulk sync touches the chart incrementally
+
+    def __init__(self):
+        super().__init__()
+        self._reset()
+
+    def _reset(self):
+        self.names = () # Chart order: every type with relations stored, alphabetically
+        self._index = {}
+        self.matrix = np.ones((0, 0))
+        self.synced = frozenset() # Types whose own /type/ payload has been stored
+
+    # -- loading ---------------------------------------------------------------
+
+    def _build(self):
+        """Two queries: the pairs and the synced types."""
+        pairs = list(TypeEffectiveness.objects.values_list('attacking_type__name', 'defending_type__name', 'multiplier'))
+        synced = frozenset(Type.objects.filter(relations_synced_at__isnull=False).values_list('name', flat=True))
+        self._reset()
+        self.synced = synced
+        self.names = tuple(sorted(synced | {name for attacking, defending, _ in pairs for name in (attacking, defending)}))
+        self._index = {name: position for position, name in enumerate(self.names)}
+        self.matrix = np.ones((len(self.names), len(self.names)))
+        for attacking, defending, multiplier in pairs:
+            self.matrix[self._index[attacking], self._index[defending]] = multiplier
+        logger.info("Built %sx%s from %s pairs.", len(self.names), len(self.names), len(pairs))
+
+    # -- queries ---------------------------------------------------------------
+
+    def missing(self, type_names):
+        """The type_names whose damage relations have not been stored yet."""
+        self.ensure_current()
+        return [type_name for type_name in type_names if type_name not in self.synced]
+
+    def matchup(self, type_lists):
+        """
+        Type matchups of any number of Pokemon, given each one's type names, in one pass. Returns
+        {'types': attacking/defending type names in chart order,
+         'defensive': len(type_lists) x len(types) array of the multiplier each attacking type deals to each Pokemon,
+         'coverage': len(types) array of the best multiplier the team's own types deal to each defending type}.
+        Unknown types count as neutral.
+        """
+        self.ensure_current()
+        with self._lock:
+            type_count = len(self.names)
+            # A column of ones at index type_count pads single-typed Pokemon and stands in for unknown types
+            padded = np.hstack([self.matrix, np.ones((type_count, 1))])
+            width = max([len(type_names) for type_names in type_lists] + [1])
+            indexes = np.full((len(type_lists), width), type_count)
+            for row, type_names in enumerate(type_lists):
+                for column, type_name in enumerate(type_names):
+                    indexes[row, column] = self._index.get(type_name, type_count)
+            # padded[:, indexes] is attacking type x Pokemon x its types; a dual type multiplies its columns
+            defensive = padded[:, indexes].prod(axis=2).T
+
+            attacking = np.unique(indexes[indexes < type_count])
+            coverage = self.matrix[attacking, :].max(axis=0) if len(attacking) else np.ones(type_count)
+            return {'types': self.names, 'defensive': defensive, 'coverage': coverage}
+
+
+type_chart = TypeChart()
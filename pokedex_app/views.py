@@ -1,340 +1,756 @@
-from django.shortcuts import render, redirect, get_object_or_404
+import asyncio
+import logging
+
+from asgiref.sync import sync_to_async
+from django.shortcuts import render, redirect
 from django.urls import reverse
 import requests
-from .models import Pokemon, Type, Ability # Import new models
+from . import pokeapi
+from .models import STAT_FIELDS, Pokemon, Type, Ability, Species, EvolutionEdge # Import new models
+from .ingest import ingest_pokemon_payloads, ingest_species_payloads, ingest_evolution_chains, ingest_type_payloads, resolve_names
+from .page_cache import cached_page, detail_key, listing_key, mark_refresh_due, skip_page_cache
+from .refresh import is_stale, refresh_due_at, refresh_queue
+from .single_flight import single_flight
+from .vocabulary import filter_vocabulary
+from .pagination import NEXT, InvalidCursor, decode_cursor, encode_cursor, keyset_page, keyset_page_of_ids
+from .filter_index import STAT_NAMES, BitsetIds, bit_count, filter_index, iter_ids
+from .search_index import normalize_name, search_index
+from .stats_matrix import TOTAL, stats_matrix
+from .type_chart import type_chart
+from .carousel import carousel_sampler
+from .sprites import SHEET_MAX_MEMBERS, sprite_src, sprite_store
+from .instrumentation import in_request_context, process_memory, registry
+from .response_cache import response_cache
 from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger # For DB pagination
-from django.db.models import Q # For complex lookups
+from django.db.models import Prefetch
+from django.conf import settings
+from django.http import Http404, HttpResponse, HttpResponseForbidden, JsonResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import urlencode
+from django.utils.functional import SimpleLazyObject
+from concurrent.futures import ThreadPoolExecutor
+import json
+import time
+
+logger = logging.getLogger(__name__)
+
 # from django.db import models # This was an erroneously added import by the model
-import random
 
 # Create your views here.
 
-def get_or_fetch_pokemon_details(pokemon_name_or_id):
-    """Helper: Gets Pokemon from DB. If stats are missing or Pokemon not found, fetches/updates from API."""
-    identifier_kwargs = {}
+def _pokemon_identifier(pokemon_name_or_id):
+    """Helper: (DB lookup kwargs, name or id as the API path wants it) for a Pokemon name or pokeapi_id."""
     if isinstance(pokemon_name_or_id, int):
-        identifier_kwargs['pokeapi_id'] = pokemon_name_or_id
-        fetch_name_or_id_for_api = str(pokemon_name_or_id) # API needs string for ID too
+        return {'pokeapi_id': pokemon_name_or_id}, str(pokemon_name_or_id) # API needs string for ID too
+    name_lower = str(pokemon_name_or_id).lower()
+    return {'name': name_lower}, name_lower
+
+def _stored_pokemon(identifier_kwargs):
+    """Helper: The Pokemon from the DB, queueing a background re-sync if it is stale; None if it is not there."""
+    try:
+        pokemon_obj = Pokemon.objects.select_related('species').get(**identifier_kwargs)
+    except Pokemon.DoesNotExist:
+        return None
+    if is_stale(pokemon_obj): # Missing stats or old data: serve it now, re-sync in the background
+        logger.info("Serving %s from DB, background refresh queued.", pokemon_obj.name)
+        refresh_queue.enqueue(pokemon_obj.name)
     else:
-        name_lower = str(pokemon_name_or_id).lower()
-        identifier_kwargs['name'] = name_lower
-        fetch_name_or_id_for_api = name_lower
+        logger.debug("Fetched %s from DB (with stats).", pokemon_obj.name)
+    return pokemon_obj
 
+def _ingest_fetched_pokemon(response, fetch_name_or_id_for_api):
+    """Helper: Stores the Pokemon of a /pokemon/ response. Returns its pk, or None if the API had no data."""
+    if response.status_code == 200:
+        return ingest_pokemon_payloads([response.json()])[0].pk
+    else:
+        logger.warning("Failed to fetch %s from API. Status: %s", fetch_name_or_id_for_api, response.status_code)
+        return None
+
+def _sync_missing_pokemon(identifier_kwargs, fetch_name_or_id_for_api):
+    """
+    Helper: Fetches one Pokemon that was not in the DB and stores it. Returns its pk, or None.
+    Runs as the single-flight leader, so it re-checks the DB first: another process may have synced it meanwhile.
+    """
+    synced_pk = Pokemon.objects.filter(**identifier_kwargs).values_list('pk', flat=True).first()
+    if synced_pk is not None:
+        return synced_pk
+
+    logger.info("%s not in DB. Syncing from API.", fetch_name_or_id_for_api)
     try:
-        pokemon_obj = Pokemon.objects.get(**identifier_kwargs)
-        if not pokemon_obj.stats: # If stats are missing, force API re-fetch and update
-            print(f"[DB STATS MISSING] Stats missing for {pokemon_obj.name}. Will re-sync from API.")
-            raise Pokemon.DoesNotExist # Treat as if not found to trigger API path
-        print(f"[DB CACHE HIT] Fetched {pokemon_obj.name} from DB (with stats).")
+        response = pokeapi.fetch(f'pokemon/{fetch_name_or_id_for_api}/')
+    except requests.RequestException as e:
+        logger.warning("API error fetching %s: %s", fetch_name_or_id_for_api, e)
+        return None
+    return _ingest_fetched_pokemon(response, fetch_name_or_id_for_api)
+
+async def _async_missing_pokemon(identifier_kwargs, fetch_name_or_id_for_api):
+    """Helper: Async counterpart of _sync_missing_pokemon()."""
+    synced_pk = await Pokemon.objects.filter(**identifier_kwargs).values_list('pk', flat=True).afirst()
+    if synced_pk is not None:
+        return synced_pk
+
+    logger.info("%s not in DB. Syncing from API.", fetch_name_or_id_for_api)
+    try:
+        response = await pokeapi.afetch(f'pokemon/{fetch_name_or_id_for_api}/')
+    except requests.RequestException as e:
+        logger.warning("API error fetching %s: %s", fetch_name_or_id_for_api, e)
+        return None
+    return await sync_to_async(_ingest_fetched_pokemon)(response, fetch_name_or_id_for_api)
+
+def get_or_fetch_pokemon_details(pokemon_name_or_id):
+    """
+    Helper: Gets Pokemon from DB. Only a Pokemon that is not in the DB at all is fetched from the API
+    while the caller waits; a stale row (missing stats or too old) is served as is and re-synced in the background.
+    Concurrent misses on the same Pokemon share a single fetch (see single_flight.py).
+    """
+    identifier_kwargs, fetch_name_or_id_for_api = _pokemon_identifier(pokemon_name_or_id)
+    pokemon_obj = _stored_pokemon(identifier_kwargs)
+    if pokemon_obj is not None:
         return pokemon_obj
-    except Pokemon.DoesNotExist:
-        print(f"[API SYNC] {fetch_name_or_id_for_api} not in DB or needs stats update. Syncing from API.")
-        api_url = f'https://pokeapi.co/api/v2/pokemon/{fetch_name_or_id_for_api}/' # No trailing comma
-        response = requests.get(api_url)
-
-        if response.status_code == 200:
-            data = response.json()
-            api_stats = {stat['stat']['name']: stat['base_stat'] for stat in data.get('stats', [])}
-            
-            defaults = {
-                'name': data.get('name').lower(),
-                'pokeapi_id': data.get('id'),
-                'height': data.get('height'),
-                'weight': data.get('weight'),
-                'sprite_url': data.get('sprites', {}).get('front_default'),
-                'stats': api_stats
-            }
-            
-            # Use the original identifier_kwargs for lookup in update_or_create
-            # This ensures we find by name if name was passed, or by ID if ID was passed.
-            # The defaults will then update all fields, including potentially name (if API differs) or ID.
-            pokemon_obj, created = Pokemon.objects.update_or_create(
-                **identifier_kwargs, 
-                defaults=defaults
-            )
-
-            # Update types
-            db_types = []
-            for type_info in data.get('types', []):
-                type_obj, _ = Type.objects.get_or_create(name=type_info['type']['name'])
-                db_types.append(type_obj)
-            pokemon_obj.types.set(db_types)
-
-            # Update abilities
-            db_abilities = []
-            for ability_info in data.get('abilities', []):
-                ability_obj, _ = Ability.objects.get_or_create(name=ability_info['ability']['name'])
-                db_abilities.append(ability_obj)
-            pokemon_obj.abilities.set(db_abilities) # Save abilities after setting them
-            
-            action = "CREATED" if created else "UPDATED"
-            print(f"[API SYNC] Pokemon {pokemon_obj.name} {action} in DB.")
-            return pokemon_obj
-        else:
-            print(f"[API SYNC ERROR] Failed to fetch {fetch_name_or_id_for_api} from API. Status: {response.status_code}")
-            return None
+    synced_pk = single_flight.do(
+        f'pokemon:{fetch_name_or_id_for_api}',
+        lambda: _sync_missing_pokemon(identifier_kwargs, fetch_name_or_id_for_api)
+    )
+    if synced_pk is None:
+        return None
+    return Pokemon.objects.select_related('species').get(pk=synced_pk)
 
-def pokemon_list(request):
-    query = request.GET.get('q')
-    selected_type_name = request.GET.get('type_filter_name')
-    selected_ability_name = request.GET.get('ability_filter_name')
-    search_error = None
-    all_types_for_filter = []
-    all_abilities_for_filter = []
-
-    # Fetch all available Pokemon types for the filter dropdown (same as before)
-    all_types_from_db = Type.objects.all().order_by('name')
-    if not all_types_from_db:
-        try:
-            types_response = requests.get('https://pokeapi.co/api/v2/type?limit=100') 
-            if types_response.status_code == 200:
-                api_types_results = types_response.json().get('results', [])
-                for api_type in api_types_results:
-                    type_obj, _ = Type.objects.get_or_create(name=api_type['name'])
-                    all_types_for_filter.append(type_obj)
-            else:
-                search_error = "Could not fetch Pokemon types for filtering."
-        except requests.RequestException:
-            search_error = "Error connecting to API to fetch types."
+async def aget_or_fetch_pokemon_details(pokemon_name_or_id):
+    """Helper: Async counterpart of get_or_fetch_pokemon_details(), for async views."""
+    identifier_kwargs, fetch_name_or_id_for_api = _pokemon_identifier(pokemon_name_or_id)
+    pokemon_obj = await sync_to_async(_stored_pokemon)(identifier_kwargs)
+    if pokemon_obj is not None:
+        return pokemon_obj
+    synced_pk = await single_flight.ado(
+        f'pokemon:{fetch_name_or_id_for_api}',
+        lambda: _async_missing_pokemon(identifier_kwargs, fetch_name_or_id_for_api)
+    )
+    if synced_pk is None:
+        return None
+    return await Pokemon.objects.select_related('species').aget(pk=synced_pk)
+
+def _fetch_pokemon_api_data(pokemon_name):
+    """Helper: Fetches the raw /pokemon/ payload for one name. Safe to run in a worker thread (no DB access)."""
+    try:
+        response = pokeapi.fetch(f'pokemon/{pokemon_name}/')
+    except requests.RequestException as e:
+        logger.warning("API error fetching %s: %s", pokemon_name, e)
+        return None
+    return _pokemon_api_data(pokemon_name, response)
+
+async def _afetch_pokemon_api_data(pokemon_name, semaphore):
+    """Helper: Async counterpart of _fetch_pokemon_api_data(); semaphore caps the requests in flight."""
+    try:
+        async with semaphore:
+            response = await pokeapi.afetch(f'pokemon/{pokemon_name}/')
+    except requests.RequestException as e:
+        logger.warning("API error fetching %s: %s", pokemon_name, e)
+        return None
+    return _pokemon_api_data(pokemon_name, response)
+
+def _pokemon_api_data(pokemon_name, response):
+    if response.status_code != 200:
+        logger.warning("Failed to fetch %s from API. Status: %s", pokemon_name, response.status_code)
+        return None
+    return response.json()
+
+def _pokemon_to_hydrate(pokemon_names, refresh):
+    """Helper: (every wanted name, the ones already synced, the ones to fetch) for hydrate_pokemon() and ahydrate_pokemon()."""
+    wanted_names = list(dict.fromkeys(str(name).lower() for name in pokemon_names))
+    already_synced = set() if refresh else set(
+        Pokemon.objects.filter(name__in=wanted_names, stat_total__isnull=False)
+        .values_list('name', flat=True)
+    )
+    return wanted_names, already_synced, [name for name in wanted_names if name not in already_synced]
+
+def _log_hydration(label, wanted_names, already_synced, payloads, missing_names, started_at, fetched_at):
+    finished_at = time.perf_counter()
+    logger.info(
+        "Hydration %s: %s requested, %s already in DB, %s/%s fetched. fetch=%.3fs write=%.3fs total=%.3fs",
+        label, len(wanted_names), len(already_synced), len(payloads), len(missing_names),
+        fetched_at - started_at, finished_at - fetched_at, finished_at - started_at,
+    )
+
+def hydrate_pokemon(pokemon_names, label='hydration', refresh=False):
+    """
+    Helper: Makes sure every name in pokemon_names is in the DB with stats.
+    Only the missing ones are fetched (all of them with refresh=True), concurrently (at most
+    POKEAPI_MAX_CONCURRENCY in flight), and the results are written in one batch from the calling thread.
+    Returns the number of Pokemon that were synced from the API.
+    """
+    started_at = time.perf_counter()
+    wanted_names, already_synced, missing_names = _pokemon_to_hydrate(pokemon_names, refresh)
+
+    payloads = []
+    if missing_names:
+        max_workers = max(1, min(settings.POKEAPI_MAX_CONCURRENCY, len(missing_names)))
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            payloads = [data for data in executor.map(in_request_context(_fetch_pokemon_api_data), missing_names) if data]
+        fetched_at = time.perf_counter()
+
+        # DB writes stay on the request thread and go out as one bulk upsert.
+        ingest_pokemon_payloads(payloads)
     else:
-        all_types_for_filter = list(all_types_from_db)
+        fetched_at = started_at
 
-    # Fetch all available Pokemon abilities for the filter dropdown
-    all_abilities_from_db = Ability.objects.all().order_by('name')
-    if not all_abilities_from_db:
-        print("[ABILITY SEED] No abilities in DB, fetching from API.")
-        try:
-            # PokeAPI ability endpoint might be paginated, but let's try a high limit
-            # There are around 300-400 abilities
-            abilities_response = requests.get('https://pokeapi.co/api/v2/ability?limit=400') 
-            if abilities_response.status_code == 200:
-                api_abilities_results = abilities_response.json().get('results', [])
-                for api_ability in api_abilities_results:
-                    ability_obj, _ = Ability.objects.get_or_create(name=api_ability['name'])
-                    all_abilities_for_filter.append(ability_obj)
-                print(f"[ABILITY SEED] Fetched and saved {len(all_abilities_for_filter)} abilities.")
-            else:
-                search_error = (search_error or "") + " Could not fetch Pokemon abilities for filtering."
-        except requests.RequestException:
-            search_error = (search_error or "") + " Error connecting to API to fetch abilities."
+    _log_hydration(label, wanted_names, already_synced, payloads, missing_names, started_at, fetched_at)
+    return len(payloads)
+
+async def ahydrate_pokemon(pokemon_names, label='hydration', refresh=False):
+    """
+    Helper: Async counterpart of hydrate_pokemon(). The missing Pokemon are fetched as concurrent requests
+    on the event loop (at most POKEAPI_MAX_CONCURRENCY in flight) instead of on a thread pool.
+    """
+    started_at = time.perf_counter()
+    wanted_names, already_synced, missing_names = await sync_to_async(_pokemon_to_hydrate)(pokemon_names, refresh)
+
+    payloads = []
+    if missing_names:
+        semaphore = asyncio.Semaphore(settings.POKEAPI_MAX_CONCURRENCY)
+        fetched = await asyncio.gather(*(_afetch_pokemon_api_data(name, semaphore) for name in missing_names))
+        payloads = [data for data in fetched if data]
+        fetched_at = time.perf_counter()
+        await sync_to_async(ingest_pokemon_payloads)(payloads)
     else:
-        all_abilities_for_filter = list(all_abilities_from_db)
+        fetched_at = started_at
+
+    _log_hydration(label, wanted_names, already_synced, payloads, missing_names, started_at, fetched_at)
+    return len(payloads)
+
+def _list_page(pokemon_queryset, request, cursor, use_keyset, matched_ids=None, per_page=20):
+    """
+    Helper: Returns (page, row_count, error) for the list view. row_count is what the emptiness and seeding checks
+    go by: the paginator's COUNT in numbered mode, the size of the first keyset page, or None deeper in keyset mode.
+    With matched_ids (a bitset from the filter index) pages are cut from the bitset and only their rows are loaded.
+    """
+    if matched_ids is not None:
+        error = None
+        if use_keyset:
+            try:
+                page_obj = keyset_page_of_ids(matched_ids, cursor, per_page)
+            except InvalidCursor:
+                page_obj = keyset_page_of_ids(matched_ids, None, per_page)
+                error = "That page link is not valid anymore; showing the first page."
+        else:
+            paginator = Paginator(BitsetIds(matched_ids), per_page)
+            try:
+                page_obj = paginator.page(request.GET.get('page'))
+            except PageNotAnInteger:
+                page_obj = paginator.page(1)
+            except EmptyPage:
+                page_obj = paginator.page(paginator.num_pages)
+        page_obj.object_list = list(pokemon_queryset.filter(pokeapi_id__in=page_obj.object_list)) if page_obj.object_list else []
+        return page_obj, bit_count(matched_ids), error
+
+    if use_keyset:
+        try:
+            page_obj = keyset_page(pokemon_queryset, cursor, per_page)
+        except InvalidCursor:
+            return keyset_page(pokemon_queryset, None, per_page), None, "That page link is not valid anymore; showing the first page."
+        return page_obj, None if cursor else len(page_obj), None
+
+    paginator = Paginator(pokemon_queryset, per_page)
+    page_number = request.GET.get('page')
+    try:
+        page_obj = paginator.page(page_number)
+    except PageNotAnInteger:
+        page_obj = paginator.page(1)
+    except EmptyPage:
+        page_obj = paginator.page(paginator.num_pages)
+    return page_obj, paginator.count, None
+
+# Stat name (or 'total') -> indexed Pokemon column, for the list's stat ranges and sorts
+LIST_STAT_COLUMNS = {**STAT_FIELDS, TOTAL: 'stat_total'}
+LIST_SORT_OPTIONS = [
+    (f'{direction}{stat_name}', f"{stat_name.replace('-', ' ').capitalize()}, {label}")
+    for direction, label in (('-', 'highest first'), ('', 'lowest first')) for stat_name in LIST_STAT_COLUMNS
+]
+
+def _parse_stat_ranges(params):
+    """Helper: Reads hp_min, hp_max, special_attack_min, ..., total_max into {stat: (min, max)}. Returns (ranges, error)."""
+    stat_ranges = {}
+    for stat_name in LIST_STAT_COLUMNS:
+        param_prefix = stat_name.replace('-', '_')
+        bounds = []
+        for suffix in ('min', 'max'):
+            raw_value = params.get(f'{param_prefix}_{suffix}', '').strip()
+            if not raw_value:
+                bounds.append(None)
+                continue
+            try:
+                bounds.append(int(raw_value))
+            except ValueError:
+                return {}, f"Stat ranges must be whole numbers ('{raw_value}' given for {stat_name})."
+        if bounds != [None, None]:
+            stat_ranges[stat_name] = tuple(bounds)
+    return stat_ranges, None
+
+def _stat_range_lookups(stat_ranges):
+    """Helper: {stat: (min, max)} as ORM lookups on the indexed stat columns."""
+    lookups = {}
+    for stat_name, (low, high) in stat_ranges.items():
+        if low is not None:
+            lookups[f'{LIST_STAT_COLUMNS[stat_name]}__gte'] = low
+        if high is not None:
+            lookups[f'{LIST_STAT_COLUMNS[stat_name]}__lte'] = high
+    return lookups
+
+def _parse_sort(raw_sort):
+    """Helper: 'speed' (lowest first) or '-speed' (highest first) into (sort param, order_by fields), or ('', None)."""
+    stat_name = raw_sort.lstrip('-')
+    if stat_name not in LIST_STAT_COLUMNS:
+        return '', None
+    descending = raw_sort.startswith('-')
+    column = LIST_STAT_COLUMNS[stat_name]
+    # pokeapi_id breaks ties; rows come out of the (stat, pokeapi_id) index already ordered by the stat
+    return raw_sort, (f'-{column}' if descending else column, 'pokeapi_id')
+
+async def _ahydrate_type(type_name):
+    """Helper: Makes sure every Pokemon of a type is in the DB (the type's member list comes from the API). Returns an error or None."""
+    # This can be slow for types with many Pokemon if they are not already in DB.
+    logger.debug("Filtering by type: %s.", type_name)
+    try:
+        type_response = await pokeapi.afetch(f'type/{type_name}/')
+    except requests.RequestException as e:
+        return f"API error when fetching type details for {type_name}: {e}"
+    if type_response.status_code != 200:
+        # Filtering then falls back to what is in the DB for this type
+        return f"Could not fetch full list for type '{type_name.capitalize()}' from API. Status: {type_response.status_code}"
+    type_data = type_response.json()
+    if await sync_to_async(type_chart.missing)([type_name]):
+        # The same payload carries the type's damage relations; keep them for the type chart
+        await sync_to_async(ingest_type_payloads)([type_data])
+    pokemon_from_type_api = type_data.get('pokemon', [])
+    logger.debug("API returned %s Pokemon for type %s.", len(pokemon_from_type_api), type_name)
+    # Fetch whatever is missing from the DB concurrently, then save it in one batch
+    await ahydrate_pokemon([p_entry['pokemon']['name'] for p_entry in pokemon_from_type_api], label=f"type {type_name}")
+    return None
+
+def _fetch_type_api_data(type_name):
+    """Helper: Fetches the raw /type/ payload for one type. Safe to run in a worker thread (no DB access)."""
+    try:
+        response = pokeapi.fetch(f'type/{type_name}/')
+    except requests.RequestException as e:
+        logger.warning("API error fetching type %s: %s", type_name, e)
+        return None
+    return _type_api_data(type_name, response)
 
-    pokemon_queryset = Pokemon.objects.all().order_by('pokeapi_id')
+def _type_api_data(type_name, response):
+    if response.status_code != 200:
+        logger.warning("Failed to fetch type %s from API. Status: %s", type_name, response.status_code)
+        return None
+    return response.json()
+
+def hydrate_type_relations(type_names):
+    """
+    Helper: Makes sure the damage relations of every type in type_names are stored, fetching the missing
+    ones concurrently and writing them in one batch. Returns the names that are still missing.
+    """
+    missing_names = type_chart.missing(list(dict.fromkeys(type_names)))
+    if not missing_names:
+        return []
+    max_workers = max(1, min(settings.POKEAPI_MAX_CONCURRENCY, len(missing_names)))
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        payloads = [data for data in executor.map(in_request_context(_fetch_type_api_data), missing_names) if data]
+    ingest_type_payloads(payloads)
+    return type_chart.missing(missing_names)
+
+async def ahydrate_type_relations(type_names):
+    """Helper: Async counterpart of hydrate_type_relations()."""
+    missing_names = await sync_to_async(type_chart.missing)(list(dict.fromkeys(type_names)))
+    if not missing_names:
+        return []
+    semaphore = asyncio.Semaphore(settings.POKEAPI_MAX_CONCURRENCY)
+
+    async def fetch_type(type_name):
+        async with semaphore:
+            try:
+                response = await pokeapi.afetch(f'type/{type_name}/')
+            except requests.RequestException as e:
+                logger.warning("API error fetching type %s: %s", type_name, e)
+                return None
+        return _type_api_data(type_name, response)
+
+    payloads = [data for data in await asyncio.gather(*map(fetch_type, missing_names)) if data]
+    await sync_to_async(ingest_type_payloads)(payloads)
+    return await sync_to_async(type_chart.missing)(missing_names)
+
+def _format_multiplier(multiplier):
+    """2.0 -> '2', 0.25 -> '¼', as shown in the matchup tables."""
+    return {0.25: '¼', 0.5: '½'}.get(multiplier, f'{multiplier:g}')
+
+async def _afilter_vocabulary(model, seed_path):
+    """
+    Helper: The names for the list page's Type or Ability dropdown (from vocabulary.py), seeded from the
+    API list at seed_path when the DB has none. Returns (names, error or None).
+    """
+    names = await sync_to_async(filter_vocabulary)(model)
+    if names or not settings.POKEDEX_INLINE_SEEDING:
+        return names, None
+    label = model.__name__.lower()
+    logger.info("No %ss in DB, fetching from API.", label)
+    try:
+        response = await pokeapi.afetch(seed_path)
+    except requests.RequestException:
+        return names, f"Error connecting to API to fetch {label}s."
+    if response.status_code != 200:
+        return names, f"Could not fetch Pokemon {label}s for filtering."
+    api_names = [api_entry['name'] for api_entry in response.json().get('results', [])]
+    names = tuple(sorted(await sync_to_async(resolve_names)(model, api_names)))
+    logger.info("Fetched and saved %s %ss.", len(names), label)
+    return names, None
+
+def _pokemon_list_page(request, query, selected_type_names, type_match, selected_ability_names, stat_ranges, sort_order, has_filters):
+    """Helper: The DB side of the list page. Returns (page, row count or None, error or None, whether it is a keyset page)."""
+    # Only the columns and relations the list template renders
+    pokemon_queryset = (
+        Pokemon.objects.only('pk', 'pokeapi_id', 'name', 'sprite_url')
+        .prefetch_related(
+            Prefetch('types', queryset=Type.objects.only('pk', 'name')),
+            Prefetch('abilities', queryset=Ability.objects.only('pk', 'name')),
+        )
+        .order_by('pokeapi_id')
+    )
+
+    # Any combination of types (all or any of them), abilities (any) and a name fragment is answered from
+    # the in-memory filter index (filter_index.py); SQL only loads the rows of the page shown.
+    # Stat ranges and stat sorts run in SQL, as range scans on the (stat, pokeapi_id) indexes.
+    matched_ids = None
+    if has_filters and (selected_type_names or selected_ability_names or query):
+        matched_ids = filter_index.match(
+            type_names=selected_type_names, type_match=type_match, ability_names=selected_ability_names,
+            name_contains=query,
+        )
 
-    if query and not selected_type_name and not selected_ability_name:
-        pokemon_obj = get_or_fetch_pokemon_details(query)
+    if stat_ranges or sort_order:
+        pokemon_queryset = pokemon_queryset.filter(**_stat_range_lookups(stat_ranges))
+        if matched_ids is not None:
+            # At most one id per Pokemon in the dex, well under SQLite's bound parameter limit
+            pokemon_queryset = pokemon_queryset.filter(pokeapi_id__in=list(iter_ids(matched_ids)))
+            matched_ids = None
+        if sort_order:
+            pokemon_queryset = pokemon_queryset.order_by(*sort_order)
+
+    # Keyset mode (?cursor=..., or POKEDEX_LIST_PAGINATION='keyset') never runs the COUNT or the OFFSET scan.
+    # Its cursors walk pokeapi_id order, so a stat sort always pages by number.
+    cursor = request.GET.get('cursor')
+    use_keyset = (cursor is not None or settings.POKEDEX_LIST_PAGINATION == 'keyset') and not sort_order
+    page_obj, row_count, page_error = _list_page(
+        pokemon_queryset, request, cursor if use_keyset else None, use_keyset, matched_ids=matched_ids
+    )
+    return page_obj, row_count, page_error, use_keyset
+
+LIST_SPRITE_SIZE = 50 # px, as the list template shows them
+
+def _sprite_sheet(page_obj):
+    """
+    Helper: Bundles the small sprites of a list page that are already cached locally into one sheet (sprites.py).
+    Sets sheet_position (px) on the Pokemon in it, None on the others, which load their own sprite.
+    Returns {'url', 'width'} for the template, or None when fewer than two sprites would share the sheet.
+    """
+    pokemon_objs = page_obj.object_list = list(page_obj.object_list)
+    members = []
+    for pokemon_obj in pokemon_objs:
+        pokemon_obj.sheet_position = None
+        sprite = sprite_store.lookup(pokemon_obj.sprite_url) if pokemon_obj.sprite_url else None
+        if sprite is not None and sprite_store.fits_sheet(sprite) and len(members) < SHEET_MAX_MEMBERS:
+            members.append((pokemon_obj, sprite))
+    if not settings.POKEDEX_SPRITE_SHEETS or not settings.POKEDEX_SPRITE_PROXY or len(members) < 2:
+        return None
+    for position, (pokemon_obj, _) in enumerate(members):
+        pokemon_obj.sheet_position = position * LIST_SPRITE_SIZE
+    sheet_key = sprite_store.sheet_key([sprite for _, sprite in members])
+    ids = ','.join(str(pokemon_obj.pokeapi_id) for pokemon_obj, _ in members)
+    return {
+        'url': f"{reverse('pokemon_sprite_sheet', args=[sheet_key])}?{urlencode({'ids': ids})}",
+        'width': len(members) * LIST_SPRITE_SIZE,
+    }
+
+def _filter_names(request, param):
+    """Helper: the type or ability names of a repeatable filter param, lowercased like the index keys, without repeats."""
+    return list(dict.fromkeys(name.lower() for name in request.GET.getlist(param) if name))
+
+def _type_match(request):
+    return 'any' if request.GET.get('type_match') == 'any' else 'all'
+
+@cached_page(listing_key('list'))
+async def pokemon_list(request):
+    query = request.GET.get('q')
+    selected_type_names = _filter_names(request, 'type_filter_name')
+    type_match = _type_match(request)
+    selected_ability_names = _filter_names(request, 'ability_filter_name')
+    stat_ranges, stat_error = _parse_stat_ranges(request.GET)
+    sort, sort_order = _parse_sort(request.GET.get('sort', ''))
+
+    # Dropdown vocabularies come from an in-process cache (vocabulary.py); both are seeded at once if the DB has none
+    (all_types_for_filter, type_seed_error), (all_abilities_for_filter, ability_seed_error) = await asyncio.gather(
+        _afilter_vocabulary(Type, 'type?limit=100'),
+        # There are around 300-400 abilities
+        _afilter_vocabulary(Ability, 'ability?limit=400'),
+    )
+    search_error = ' '.join(error for error in (type_seed_error, ability_seed_error) if error) or None
+
+    suggestions = []
+    has_filters = bool(selected_type_names or selected_ability_names or stat_ranges)
+    search_error = search_error or stat_error
+    if query and not has_filters and not stat_error:
+        # The search index knows which names cannot exist, so typos never reach PokeAPI
+        query_name = normalize_name(query)
+        may_exist = await sync_to_async(search_index.may_exist)(query_name)
+        pokemon_obj = await aget_or_fetch_pokemon_details(query_name) if may_exist else None
         if pokemon_obj:
             return redirect(reverse('pokemon_detail', kwargs={'pokemon_name': pokemon_obj.name}))
         else:
             search_error = f"Pokemon '{query}' not found."
-    
-    elif selected_type_name and not query and not selected_ability_name:
-        # Filter by type
-        # First, check if we have any Pokemon of this type in DB
-        current_db_pokemon_of_type_count = Pokemon.objects.filter(types__name=selected_type_name).count()
-        
-        # Fetch all Pokemon of this type from API to ensure DB is complete for this type
-        # This can be slow for types with many Pokemon if they are not already in DB.
-        # Consider adding a flag or a more sophisticated check if this is too slow.
-        print(f"[TYPE FILTER] Filtering by type: {selected_type_name}.")
-        try:
-            type_api_url = f'https://pokeapi.co/api/v2/type/{selected_type_name.lower()}/'
-            type_response = requests.get(type_api_url)
-            if type_response.status_code == 200:
-                type_data = type_response.json()
-                pokemon_from_type_api = type_data.get('pokemon', [])
-                print(f"[TYPE FILTER] API returned {len(pokemon_from_type_api)} Pokemon for type {selected_type_name}.")
-                for p_entry in pokemon_from_type_api:
-                    pokemon_name_to_fetch = p_entry['pokemon']['name']
-                    # This helper will fetch from API and save to DB if not already present
-                    get_or_fetch_pokemon_details(pokemon_name_to_fetch) 
-                # After ensuring all Pokemon of this type are in DB, filter the queryset
-                pokemon_queryset = pokemon_queryset.filter(types__name=selected_type_name)
-                if not pokemon_queryset.exists() and not search_error:
-                    search_error = f"No Pokémon of type '{selected_type_name.capitalize()}' found even after API check (this shouldn't happen if API call was successful)."
-            else:
-                search_error = f"Could not fetch full list for type '{selected_type_name.capitalize()}' from API. Status: {type_response.status_code}"
-                # Fallback to filtering only what's in DB for this type
-                pokemon_queryset = pokemon_queryset.filter(types__name=selected_type_name)
-                if not pokemon_queryset.exists() and not search_error:
-                     search_error = search_error or f"No Pokémon of type '{selected_type_name.capitalize()}' found in local DB and API fetch failed."
-        except requests.RequestException as e:
-            search_error = f"API error when fetching type details for {selected_type_name}: {e}"
-            pokemon_queryset = pokemon_queryset.filter(types__name=selected_type_name) # Fallback
-
-    elif selected_ability_name and not query and not selected_type_name:
-        # Filter by ability
-        print(f"[ABILITY FILTER] Filtering by ability: {selected_ability_name}.")
-        # Similar to type: fetch all Pokemon with this ability from API to ensure DB is complete.
-        # This is a simplified version for now, filtering on existing DB data.
-        # A full implementation would hit the ability endpoint and use get_or_fetch_pokemon_details.
-        pokemon_queryset = pokemon_queryset.filter(abilities__name=selected_ability_name)
-        if not pokemon_queryset.exists() and not search_error:
-             search_error = f"No Pokémon with ability '{selected_ability_name.capitalize()}' found in the local database. Full fetch for abilities not yet implemented for list view."
+            suggestions = await sync_to_async(search_index.suggest)(query_name, limit=5)
+    elif has_filters:
+        # The member lists of all selected types are fetched and hydrated at the same time
+        for type_error in await asyncio.gather(*map(_ahydrate_type, selected_type_names)):
+            search_error = type_error or search_error
+        if selected_ability_names:
+            # Abilities filter the local DB only; there is no API-backed hydration for them (yet)
+            logger.debug("Filtering by abilities: %s.", ', '.join(selected_ability_names))
+
+    list_page = sync_to_async(_pokemon_list_page)
+    list_args = (request, query, selected_type_names, type_match, selected_ability_names, stat_ranges, sort_order, has_filters)
+    page_obj, row_count, page_error, use_keyset = await list_page(*list_args)
+    search_error = search_error or page_error
+    if row_count == 0 and has_filters and not search_error:
+        search_error = "No Pokémon match all of the selected filters in the local database."
 
     # Initial DB seeding (if no filters/query and DB is sparse)
-    # Check total Pokemon in DB, not just current queryset, to decide on seeding.
-    if Pokemon.objects.count() < 20 and not query and not selected_type_name and not selected_ability_name:
-        print("[DB SEED] DB has less than 20 Pokemon, attempting to seed first 20 from API.")
+    if settings.POKEDEX_INLINE_SEEDING and row_count is not None and row_count < 20 and not query and not has_filters:
+        logger.info("DB has less than 20 Pokemon, attempting to seed first 20 from API.")
         try:
-            initial_response = requests.get('https://pokeapi.co/api/v2/pokemon?limit=20')
+            initial_response = await pokeapi.afetch('pokemon?limit=20')
             if initial_response.status_code == 200:
-                for p_info in initial_response.json().get('results', []):
-                    get_or_fetch_pokemon_details(p_info['name'])
-                pokemon_queryset = Pokemon.objects.all().order_by('pokeapi_id') # Re-query after seeding
+                await ahydrate_pokemon(
+                    [p_info['name'] for p_info in initial_response.json().get('results', [])],
+                    label="list seed"
+                )
+                page_obj, row_count, _, use_keyset = await list_page(*list_args) # Re-query after seeding
             else:
                  search_error = search_error or "Failed to seed initial Pokemon data from API."
         except requests.RequestException:
             search_error = search_error or "API error during initial Pokemon data seed."
 
-    paginator = Paginator(pokemon_queryset, 20)
-    page_number = request.GET.get('page')
-    try:
-        page_obj = paginator.page(page_number)
-    except PageNotAnInteger:
-        page_obj = paginator.page(1)
-    except EmptyPage:
-        page_obj = paginator.page(paginator.num_pages)
-
     context = {
         'pokemon_list_from_db': page_obj,
+        'sprite_sheet': await sync_to_async(_sprite_sheet)(page_obj),
         'search_error': search_error,
+        'suggestions': suggestions,
         'query': query,
         'all_types_for_filter': all_types_for_filter,
-        'selected_type_name': selected_type_name,
+        'selected_type_names': selected_type_names,
+        'type_match': type_match,
         'all_abilities_for_filter': all_abilities_for_filter,
-        'selected_ability_name': selected_ability_name
+        'selected_ability_names': selected_ability_names,
+        'stat_filters': [
+            (stat_name, stat_name.replace('-', '_'), request.GET.get(f"{stat_name.replace('-', '_')}_min", ''),
+             request.GET.get(f"{stat_name.replace('-', '_')}_max", ''))
+            for stat_name in LIST_STAT_COLUMNS
+        ],
+        'sort': sort,
+        'sort_options': LIST_SORT_OPTIONS,
+        # Every filter parameter, for the pagination links
+        'filter_query': urlencode([(key, value) for key, value in request.GET.lists() if key not in ('page', 'cursor')], doseq=True),
+        'has_filters': has_filters,
+        'use_keyset': use_keyset,
     }
-    return render(request, 'pokedex_app/pokemon_list.html', context)
-
-def index(request):
-    random_pokemon_for_carousel = []
-    all_pokemon_in_db = list(Pokemon.objects.filter(sprite_url__isnull=False)) # Only those with sprites
-    
-    if len(all_pokemon_in_db) > 0:
-        # Try to get 5 unique random Pokemon, or fewer if not enough are available
-        num_to_select = min(len(all_pokemon_in_db), 5)
-        random_pokemon_for_carousel = random.sample(all_pokemon_in_db, num_to_select)
-    else:
+    response = await sync_to_async(render)(request, 'pokedex_app/pokemon_list.html', context)
+    return skip_page_cache(response) if search_error else response
+
+CAROUSEL_SIZE = 5
+
+async def index(request):
+    # Up to 5 unique random Pokemon with sprites, from the in-process id list (carousel.py) and one query
+    random_pokemon_for_carousel = await sync_to_async(carousel_sampler.sample)(CAROUSEL_SIZE)
+
+    if not random_pokemon_for_carousel and settings.POKEDEX_INLINE_SEEDING:
         # If DB is very empty, try to seed a few for the carousel to work on first load
-        print("[IndexPage] DB has no Pokemon with sprites for carousel, attempting to seed a few.")
+        logger.info("DB has no Pokemon with sprites for carousel, attempting to seed a few.")
         try:
-            # Let's fetch a few well-known ones that usually have sprites
+            # Let's fetch a few well-known ones that usually have sprites, all at once
             starter_names = ['bulbasaur', 'charmander', 'squirtle', 'pikachu', 'eevee']
-            for name in starter_names:
-                p = get_or_fetch_pokemon_details(name)
+            for p in await asyncio.gather(*map(aget_or_fetch_pokemon_details, starter_names)):
                 if p and p.sprite_url:
                     random_pokemon_for_carousel.append(p)
-                if len(random_pokemon_for_carousel) >= 3: # Get at least 3 for a decent carousel
-                    break
-            # If still not enough, try fetching first 5 from API list
+            # If still not enough (at least 3 for a decent carousel), try fetching first 5 from API list
             if len(random_pokemon_for_carousel) < 3:
-                response = requests.get('https://pokeapi.co/api/v2/pokemon?limit=5')
+                response = await pokeapi.afetch('pokemon?limit=5')
                 if response.status_code == 200:
-                    for p_info in response.json().get('results', []):
-                        p = get_or_fetch_pokemon_details(p_info['name'])
+                    listed_names = [p_info['name'] for p_info in response.json().get('results', [])]
+                    for p in await asyncio.gather(*map(aget_or_fetch_pokemon_details, listed_names)):
                         if p and p.sprite_url and p not in random_pokemon_for_carousel:
                             random_pokemon_for_carousel.append(p)
-                        if len(random_pokemon_for_carousel) >= 5:
-                            break
+                    random_pokemon_for_carousel = random_pokemon_for_carousel[:5]
         except requests.RequestException as e:
-            print(f"[IndexPage SEED ERROR] API error during Pokemon seed for carousel: {e}")
+            logger.warning("API error during Pokemon seed for carousel: %s", e)
 
     context = {
         'random_pokemon_carousel': random_pokemon_for_carousel,
         'title': "Welcome to the Pokedex!"
     }
-    return render(request, 'pokedex_app/index.html', context)
-
-# Helper function to recursively parse evolution stages
-def _parse_evolution_stage(stage_data):
-    species_name = stage_data['species']['name']
-    # Ensure Pokemon is in our DB and we have its details (sprite, etc.)
-    pokemon_obj = get_or_fetch_pokemon_details(species_name) 
+    return await sync_to_async(render)(request, 'pokedex_app/index.html', context)
 
-    if not pokemon_obj:
-        print(f"Warning: Could not get/fetch Pokemon details for {species_name} in evolution chain.")
-        return None 
-
-    current_evolution_node = {
-        'pokemon': pokemon_obj, 
+def _evolution_node(pokemon_obj):
+    return {
+        'pokemon': pokemon_obj,
         'name': pokemon_obj.name.capitalize(),
-        'sprite_url': pokemon_obj.sprite_url,
+        'sprite_src': pokemon_obj.sprite_src,
         'detail_url': reverse('pokemon_detail', kwargs={'pokemon_name': pokemon_obj.name}),
         'evolves_to': []
     }
-    
-    for next_stage_data in stage_data.get('evolves_to', []):
-        next_node = _parse_evolution_stage(next_stage_data) 
-        if next_node: 
-            current_evolution_node['evolves_to'].append(next_node)
-    
-    return current_evolution_node
-
-# Main function to fetch and process evolution chain
-def get_pokemon_evolution_chain(pokemon_name_or_id):
-    """
-    Fetches and processes the evolution chain for a given Pokemon.
-    Returns a structured dictionary representing the evolution tree.
-    """
-    # Step 1: Get the initial Pokemon's data to find its species URL
-    # We use its name for consistency in API calls, fetched via our helper
-    # to ensure it's a valid/known Pokemon name.
-    initial_pokemon_for_name = get_or_fetch_pokemon_details(pokemon_name_or_id)
-    if not initial_pokemon_for_name:
-        print(f"EvolutionChain: Initial Pokemon {pokemon_name_or_id} not found by helper.")
-        return None
-    
-    pokemon_api_url = f'https://pokeapi.co/api/v2/pokemon/{initial_pokemon_for_name.name.lower()}/'
-    try:
-        pokemon_response = requests.get(pokemon_api_url)
-        pokemon_response.raise_for_status()
-        pokemon_api_data = pokemon_response.json()
-    except requests.RequestException as e:
-        print(f"EvolutionChain: Error fetching Pokemon data from {pokemon_api_url}: {e}")
-        return None
 
-    species_url = pokemon_api_data.get('species', {}).get('url')
-    if not species_url:
-        print(f"EvolutionChain: Species URL not found for {initial_pokemon_for_name.name}.")
+def load_evolution_tree(pokemon_obj):
+    """
+    Builds the nested evolution tree for pokemon_obj from the stored graph, or returns None if its
+    chain has not been stored yet. Two queries: the chain's edges and the Pokemon of its species.
+    """
+    species = pokemon_obj.species
+    if species is None or species.chain_id is None:
         return None
 
-    # Step 2: Get species data to find the evolution chain URL
+    edges = list(
+        EvolutionEdge.objects.filter(chain_id=species.chain_id)
+        .values_list('from_species_id', 'to_species_id')
+    )
+    children = {}
+    for from_species_id, to_species_id in edges:
+        children.setdefault(from_species_id, []).append(to_species_id)
+    # The root is the only species that never appears as an evolution target
+    targets = {to_species_id for _, to_species_id in edges}
+    root_species_id = next((from_id for from_id, _ in edges if from_id not in targets), species.pk)
+
+    species_ids = {species.pk} | set(children) | targets
+    pokemon_by_species_id = {}
+    # Highest pokeapi_id first, so each species ends up shown by its default (lowest id) variety
+    for candidate in Pokemon.objects.filter(species_id__in=species_ids).order_by('-pokeapi_id'):
+        pokemon_by_species_id[candidate.species_id] = candidate
+
+    def build(species_id):
+        node_pokemon = pokemon_by_species_id.get(species_id)
+        if node_pokemon is None:
+            return None
+        node = _evolution_node(node_pokemon)
+        for child_species_id in children.get(species_id, []):
+            child_node = build(child_species_id)
+            if child_node:
+                node['evolves_to'].append(child_node)
+        return node
+
+    return build(root_species_id)
+
+def _store_evolution_chain(species_data, evolution_chain_data):
+    """Helper: Stores a species and its evolution chain as graph rows. Returns the names of the chain's species."""
+    ingest_species_payloads([species_data])
+    ingest_evolution_chains([evolution_chain_data])
+    return list(Species.objects.filter(chain__pokeapi_id=evolution_chain_data['id']).values_list('name', flat=True))
+
+async def _afetch_or_none(path_or_url):
+    """Helper: pokeapi.afetch(), or None when the request fails."""
     try:
-        species_response = requests.get(species_url)
-        species_response.raise_for_status()
-        species_data = species_response.json()
+        return await pokeapi.afetch(path_or_url)
     except requests.RequestException as e:
-        print(f"EvolutionChain: Error fetching species data from {species_url}: {e}")
+        logger.warning("API error fetching %s: %s", path_or_url, e)
         return None
 
-    evolution_chain_url = species_data.get('evolution_chain', {}).get('url')
-    if not evolution_chain_url:
-        print(f"EvolutionChain: Evolution chain URL not found in species data for {initial_pokemon_for_name.name}.")
-        return None
-
-    # Step 3: Get evolution chain data
+async def async_evolution_chain(pokemon_obj, species_response=None):
+    """
+    Fetches the species and evolution chain of pokemon_obj from the API and stores them as graph rows,
+    hydrating any Pokemon of the chain that are missing from the DB. Returns True on success.
+    species_response may be a /pokemon-species/ response fetched ahead of time; it is used if it is
+    the species the Pokemon's payload links to, saving that round trip.
+    """
     try:
-        chain_response = requests.get(evolution_chain_url)
+        pokemon_response = await pokeapi.afetch(f'pokemon/{pokemon_obj.name}/') # Usually a response cache hit
+        pokemon_response.raise_for_status()
+        species_ref = pokemon_response.json().get('species', {})
+        species_url = species_ref.get('url')
+        if not species_url:
+            logger.warning("Species URL not found for %s.", pokemon_obj.name)
+            return False
+
+        if species_response is None or species_response.status_code != 200 or species_response.json().get('name') != species_ref.get('name'):
+            species_response = await pokeapi.afetch(species_url)
+            species_response.raise_for_status()
+        species_data = species_response.json()
+        evolution_chain_url = species_data.get('evolution_chain', {}).get('url')
+        if not evolution_chain_url:
+            logger.warning("Evolution chain URL not found in species data for %s.", pokemon_obj.name)
+            return False
+
+        chain_response = await pokeapi.afetch(evolution_chain_url)
         chain_response.raise_for_status()
         evolution_chain_data = chain_response.json()
     except requests.RequestException as e:
-        print(f"EvolutionChain: Error fetching evolution chain data from {evolution_chain_url}: {e}")
-        return None
-    
+        logger.warning("Error fetching evolution data for %s: %s", pokemon_obj.name, e)
+        return False
+
     if not evolution_chain_data or 'chain' not in evolution_chain_data:
-        print("EvolutionChain: Evolution chain data is malformed or 'chain' key is missing.")
-        return None
+        logger.warning("Evolution chain data is malformed or 'chain' key is missing.")
+        return False
 
-    # Step 4: Parse the chain data starting from the root
-    return _parse_evolution_stage(evolution_chain_data['chain'])
+    # The default variety of every species in the chain shares its name
+    species_names = await sync_to_async(_store_evolution_chain)(species_data, evolution_chain_data)
+    await ahydrate_pokemon(species_names, label=f"evolution chain {evolution_chain_data['id']}")
+    return True
 
-def pokemon_detail(request, pokemon_name):
+SIMILAR_PANEL_SIZE = 6
+SIMILAR_MAX_LIMIT = 50
+
+def _similar_pokemon(pokemon_name, pokeapi_id, limit, same_type=False):
+    """
+    Helper: The Pokemon with the closest base stats to pokemon_name (see stats_matrix.similar()), optionally only
+    those sharing a type with it, as dicts for the templates and the API. One query, for the sprites.
+    """
+    bits = filter_index.match(type_names=filter_index.type_names_of(pokeapi_id), type_match='any') if same_type else None
+    neighbours = stats_matrix.similar(pokemon_name, limit, bits)
+    if not neighbours:
+        return []
+    sprite_urls = dict(
+        Pokemon.objects.filter(pokeapi_id__in=[neighbour_id for _, neighbour_id, _ in neighbours]).values_list('pokeapi_id', 'sprite_url')
+    )
+    return [
+        {
+            'name': name,
+            'id': neighbour_id,
+            'distance': distance,
+            'sprite_src': sprite_src(neighbour_id, sprite_urls.get(neighbour_id)),
+            'detail_url': reverse('pokemon_detail', kwargs={'pokemon_name': name}),
+        }
+        for name, neighbour_id, distance in neighbours
+    ]
+
+def _queue_detail_refresh(request, pokemon_name):
+    """Helper: A detail page served from the page cache shows data that has gone stale; re-sync it in the background."""
+    logger.info("Serving cached page of %s, background refresh queued.", pokemon_name.lower())
+    refresh_queue.enqueue(pokemon_name.lower())
+
+@cached_page(lambda request, pokemon_name: detail_key(pokemon_name), on_refresh_due=_queue_detail_refresh)
+async def pokemon_detail(request, pokemon_name):
     pokemon_name_lower = pokemon_name.lower()
-    pokemon_obj = get_or_fetch_pokemon_details(pokemon_name_lower)
-    evolution_chain_data = None
+    name_or_id = int(pokemon_name_lower) if pokemon_name_lower.isdigit() else pokemon_name_lower
+    pokemon_obj = await sync_to_async(_stored_pokemon)(_pokemon_identifier(name_or_id)[0])
+    if pokemon_obj is None or not _has_evolution_chain(pokemon_obj):
+        # The evolution chain is fetched here on the event loop, so rendering only ever reads it from the DB.
+        # Its species usually shares the Pokemon's name: ask for it while the Pokemon itself is fetched.
+        species_lookup = _afetch_or_none(f'pokemon-species/{pokemon_name_lower}/')
+        if pokemon_obj is None:
+            pokemon_obj, species_response = await asyncio.gather(aget_or_fetch_pokemon_details(name_or_id), species_lookup)
+        else:
+            species_response = await species_lookup
+        if pokemon_obj and not _has_evolution_chain(pokemon_obj) and await async_evolution_chain(pokemon_obj, species_response):
+            pokemon_obj = await Pokemon.objects.select_related('species').aget(pk=pokemon_obj.pk)
+    if pokemon_obj is not None and pokemon_obj.name != pokemon_name_lower:
+        # e.g. /pokemon/25/: the page is only cached (and invalidated) under the canonical name
+        return redirect('pokemon_detail', pokemon_name=pokemon_obj.name)
+    return await sync_to_async(_render_pokemon_detail)(request, pokemon_name, pokemon_obj)
 
+def _has_evolution_chain(pokemon_obj):
+    return pokemon_obj.species is not None and pokemon_obj.species.chain_id is not None
+
+def _render_pokemon_detail(request, pokemon_name, pokemon_obj):
     if pokemon_obj:
         pokemon_data_dict = {
             'id': pokemon_obj.pokeapi_id,
@@ -343,16 +759,25 @@ def pokemon_detail(request, pokemon_name):
             'weight': pokemon_obj.weight,
             'abilities': [ability.name.capitalize() for ability in pokemon_obj.abilities.all()],
             'types': [ptype.name.capitalize() for ptype in pokemon_obj.types.all()],
-            'sprite_front': pokemon_obj.sprite_url,
+            'sprite_front': pokemon_obj.sprite_src,
             'stats': pokemon_obj.stats if pokemon_obj.stats else {} 
         }
-        # Fetch evolution chain
-        evolution_chain_data = get_pokemon_evolution_chain(pokemon_obj.name) # Pass name
+        # Nearest neighbours by base stats; a few microseconds from the in-process stats matrix
+        similar_pokemon = _similar_pokemon(pokemon_obj.name, pokemon_obj.pokeapi_id, SIMILAR_PANEL_SIZE)
+        similar_same_type = _similar_pokemon(pokemon_obj.name, pokemon_obj.pokeapi_id, SIMILAR_PANEL_SIZE, same_type=True)
+        # Evolution chain: only built when the template renders it, i.e. when the chain's
+        # fragment is not cached yet
+        evolution_chain_data = SimpleLazyObject(lambda: load_evolution_tree(pokemon_obj))
+        species = pokemon_obj.species
 
         context = {
             'pokemon_name': pokemon_obj.name.capitalize(),
             'pokemon_data': pokemon_data_dict,
             'evolution_chain': evolution_chain_data,
+            'evolution_cache_key': species.chain_id if species else None,
+            'evolution_cache_timeout': settings.POKEDEX_FRAGMENT_CACHE_TIMEOUT,
+            'similar_pokemon': similar_pokemon,
+            'similar_same_type': similar_same_type,
             'error': None
         }
     else:
@@ -362,82 +787,415 @@ def pokemon_detail(request, pokemon_name):
             'evolution_chain': None,
             'error': f"Could not find or fetch data for {pokemon_name.capitalize()}."
         }
-    return render(request, 'pokedex_app/pokemon_detail.html', context)
+        # May be a transient upstream failure; don't pin it in the page cache
+        return skip_page_cache(render(request, 'pokedex_app/pokemon_detail.html', context))
+    return mark_refresh_due(render(request, 'pokedex_app/pokemon_detail.html', context), refresh_due_at(pokemon_obj))
 
-def pokemon_compare(request):
-    pokemon1_name = request.GET.get('pokemon1')
-    pokemon2_name = request.GET.get('pokemon2')
-    pokemon1_data = None
-    pokemon2_data = None
-    comparison_results = None
+COMPARE_MAX_POKEMON = 6
+
+def _compare_names(request):
+    """Names picked for comparison: repeated ?pokemon= params (and the older pokemon1/pokemon2), blanks dropped."""
+    raw_names = request.GET.getlist('pokemon') + [request.GET.get('pokemon1', ''), request.GET.get('pokemon2', '')]
+    return [name.strip().lower() for name in raw_names if name and name.strip()]
+
+def _type_matchup_rows(type_lists):
+    """
+    Helper: Rows of the compare page's type matchup table, one per attacking type: the multiplier it deals
+    to each compared Pokemon and the best multiplier the compared Pokemon's own types deal back to it.
+    The types' relations must have been stored already (see ahydrate_type_relations()).
+    """
+    matchup = type_chart.matchup(type_lists)
+    defensive = matchup['defensive'].T.tolist()
+    coverage = matchup['coverage'].tolist()
+    return [
+        {
+            'type': type_name.capitalize(),
+            'cells': [{'multiplier': multiplier, 'label': _format_multiplier(multiplier)} for multiplier in defensive[column]],
+            'coverage': {'multiplier': coverage[column], 'label': _format_multiplier(coverage[column])},
+        }
+        for column, type_name in enumerate(matchup['types'])
+    ]
+
+def _pokemon_type_lists(pokemon_objs):
+    return [[t.name for t in pokemon_obj.types.all()] for pokemon_obj in pokemon_objs]
+
+@cached_page(listing_key('compare'))
+async def pokemon_compare(request):
+    picked_names = _compare_names(request)
+    compare_names = list(dict.fromkeys(picked_names)) # Duplicates dropped, order kept
+    pokemon_objs = None
     error_message = None
 
-    # Get all Pokemon names for dropdowns
-    all_pokemon_for_select = Pokemon.objects.all().order_by('name')
-    if not all_pokemon_for_select and Pokemon.objects.count() < 151: # Try to fetch more if DB is sparse
-        print("[ComparePage] DB has too few Pokemon for selection, attempting to seed initial 151 from API.")
+    # Seed the dropdowns if the DB is sparse
+    if settings.POKEDEX_INLINE_SEEDING and not await Pokemon.objects.aexists():
+        logger.info("DB has too few Pokemon for selection, attempting to seed initial 151 from API.")
         try:
-            initial_response = requests.get('https://pokeapi.co/api/v2/pokemon?limit=151') # Gen 1 for starters
+            initial_response = await pokeapi.afetch('pokemon?limit=151') # Gen 1 for starters
             if initial_response.status_code == 200:
-                for p_info in initial_response.json().get('results', []):
-                    get_or_fetch_pokemon_details(p_info['name']) # This will save them to DB
-                all_pokemon_for_select = Pokemon.objects.all().order_by('name') # Re-query
+                await ahydrate_pokemon(
+                    [p_info['name'] for p_info in initial_response.json().get('results', [])],
+                    label="compare seed"
+                ) # This will save them to DB
             else:
-                 print("[ComparePage SEED ERROR] Failed to seed initial Pokemon data from API.")
+                 logger.warning("Failed to seed initial Pokemon data from API.")
         except requests.RequestException:
-            print("[ComparePage SEED ERROR] API error during initial Pokemon data seed.")
+            logger.warning("API error during initial Pokemon data seed.")
 
-    if pokemon1_name and pokemon2_name:
-        if pokemon1_name == pokemon2_name:
-            error_message = "Please select two different Pokémon to compare."
+    if len(picked_names) >= 2 and len(compare_names) < 2:
+        error_message = "Please select two different Pokémon to compare."
+    elif len(compare_names) > COMPARE_MAX_POKEMON:
+        error_message = f"Please select at most {COMPARE_MAX_POKEMON} Pokémon to compare."
+    elif len(compare_names) >= 2:
+        # Every compared Pokemon missing from the DB is fetched at the same time
+        pokemon_objs = await asyncio.gather(*map(aget_or_fetch_pokemon_details, compare_names))
+        missing_names = [name for name, pokemon_obj in zip(compare_names, pokemon_objs) if not pokemon_obj]
+        if missing_names:
+            error_message = "Could not retrieve data for one or more selected Pokémon."
+            for name in missing_names:
+                error_message += f" Problem with {name}."
+            pokemon_objs = None
         else:
-            pokemon1_obj = get_or_fetch_pokemon_details(pokemon1_name)
-            pokemon2_obj = get_or_fetch_pokemon_details(pokemon2_name)
-
-            if pokemon1_obj and pokemon2_obj:
-                pokemon1_data = {
-                    'name': pokemon1_obj.name.capitalize(),
-                    'sprite_url': pokemon1_obj.sprite_url,
-                    'types': [t.name.capitalize() for t in pokemon1_obj.types.all()],
-                    'stats': pokemon1_obj.stats or {},
-                    'detail_url': reverse('pokemon_detail', kwargs={'pokemon_name': pokemon1_obj.name})
-                }
-                pokemon2_data = {
-                    'name': pokemon2_obj.name.capitalize(),
-                    'sprite_url': pokemon2_obj.sprite_url,
-                    'types': [t.name.capitalize() for t in pokemon2_obj.types.all()],
-                    'stats': pokemon2_obj.stats or {},
-                    'detail_url': reverse('pokemon_detail', kwargs={'pokemon_name': pokemon2_obj.name})
+            type_lists = await sync_to_async(_pokemon_type_lists)(pokemon_objs)
+            await ahydrate_type_relations(type_name for type_names in type_lists for type_name in type_names)
+
+    response = await sync_to_async(_render_pokemon_compare)(request, compare_names, pokemon_objs, error_message)
+    return skip_page_cache(response) if error_message else response
+
+def _render_pokemon_compare(request, compare_names, pokemon_objs, error_message):
+    compared = []
+    comparison_results = None
+    type_matchups = None
+    if pokemon_objs:
+        # Ranks among the compared Pokemon and percentiles against the whole dex, computed in one pass
+        comparison = stats_matrix.compare([pokemon_obj.stats for pokemon_obj in pokemon_objs])
+        totals = comparison['totals']
+        type_lists = _pokemon_type_lists(pokemon_objs)
+        for position, pokemon_obj in enumerate(pokemon_objs):
+            compared.append({
+                'name': pokemon_obj.name.capitalize(),
+                'sprite_src': pokemon_obj.sprite_src,
+                'types': [type_name.capitalize() for type_name in type_lists[position]],
+                'detail_url': reverse('pokemon_detail', kwargs={'pokemon_name': pokemon_obj.name}),
+                'total': totals['values'][position],
+                'total_rank': totals['ranks'][position],
+                'total_percentile': totals['percentiles'][position],
+            })
+        comparison_results = {}
+        for stat_name, columns in comparison['stats'].items():
+            top_value = max(columns['values'])
+            comparison_results[stat_name.capitalize()] = [
+                {
+                    'value': value,
+                    'rank': rank,
+                    'percentile': percentile,
+                    'best': value == top_value,
+                    'tie': value == top_value and columns['values'].count(top_value) > 1,
                 }
+                for value, rank, percentile in zip(columns['values'], columns['ranks'], columns['percentiles'])
+            ]
+        type_matchups = _type_matchup_rows(type_lists)
+
+    # One dropdown per picked Pokemon plus an empty one to add another, and never fewer than two
+    compare_slots = compare_names[:COMPARE_MAX_POKEMON]
+    if len(compare_slots) < COMPARE_MAX_POKEMON:
+        compare_slots.append('')
+    compare_slots += [''] * (2 - len(compare_slots))
 
-                # Basic stat comparison logic
-                comparison_results = {}
-                all_stat_names = sorted(list(set((pokemon1_data['stats'].keys() | pokemon2_data['stats'].keys()))))
-                
-                for stat_name in all_stat_names:
-                    val1 = pokemon1_data['stats'].get(stat_name, 0)
-                    val2 = pokemon2_data['stats'].get(stat_name, 0)
-                    winner = 'pokemon1' if val1 > val2 else ('pokemon2' if val2 > val1 else 'tie')
-                    comparison_results[stat_name.capitalize()] = {
-                        'pokemon1_value': val1,
-                        'pokemon2_value': val2,
-                        'winner': winner
-                    }
-            else:
-                error_message = "Could not retrieve data for one or both selected Pokémon."
-                if not pokemon1_obj:
-                    error_message += f" Problem with {pokemon1_name}."
-                if not pokemon2_obj:
-                    error_message += f" Problem with {pokemon2_name}."
-    
     context = {
-        'all_pokemon': all_pokemon_for_select,
-        'pokemon1_name': pokemon1_name,
-        'pokemon2_name': pokemon2_name,
-        'pokemon1_data': pokemon1_data,
-        'pokemon2_data': pokemon2_data,
+        'all_pokemon': Pokemon.objects.all().order_by('name'), # For the dropdowns
+        'compare_slots': compare_slots,
+        'compared': compared,
         'comparison_results': comparison_results,
+        'type_matchups': type_matchups,
         'error_message': error_message,
         'title': "Compare Pokémon"
     }
     return render(request, 'pokedex_app/pokemon_compare.html', context)
+
+API_DEFAULT_LIMIT = 100
+API_MAX_LIMIT = 1000
+API_STREAM_BATCH_SIZE = 200
+
+def _stream_pokemon_json(pokemon_queryset, after_id, limit, next_url_for):
+    """
+    Helper: Yields the JSON body of /api/pokemon/ piece by piece. Rows are read in keyset batches of
+    API_STREAM_BATCH_SIZE (one query for the rows, one for their types), so memory stays flat for any limit.
+    """
+    yield '{"results":['
+    emitted = 0
+    last_id = after_id
+    while emitted < limit:
+        batch_queryset = pokemon_queryset if last_id is None else pokemon_queryset.filter(pokeapi_id__gt=last_id)
+        batch_size = min(API_STREAM_BATCH_SIZE, limit - emitted)
+        batch = list(batch_queryset.order_by('pokeapi_id').values_list('pk', 'pokeapi_id', 'name', 'sprite_url')[:batch_size])
+        if not batch:
+            break
+        type_names = {}
+        type_rows = (
+            Pokemon.types.through.objects.filter(pokemon_id__in=[row[0] for row in batch])
+            .order_by('pk') # Insertion order, i.e. the slot order of the API payload
+            .values_list('pokemon_id', 'type__name')
+        )
+        for pokemon_pk, type_name in type_rows:
+            type_names.setdefault(pokemon_pk, []).append(type_name)
+        for pokemon_pk, pokeapi_id, name, sprite_url in batch:
+            row = {'id': pokeapi_id, 'name': name, 'sprite': sprite_url, 'types': type_names.get(pokemon_pk, [])}
+            yield (',' if emitted else '') + json.dumps(row, separators=(',', ':'))
+            emitted += 1
+        last_id = batch[-1][1]
+        if len(batch) < batch_size:
+            break
+
+    has_more = emitted == limit and pokemon_queryset.filter(pokeapi_id__gt=last_id).exists()
+    yield '],"next":' + json.dumps(next_url_for(last_id) if has_more else None) + '}'
+
+def api_pokemon_list(request):
+    """
+    JSON list of Pokemon in pokeapi_id order, keyset-paginated and streamed.
+    Query params: limit (default 100, max 1000), cursor (the opaque token from a previous page's "next"),
+    type and ability (filter by name). Every page costs the same, so clients can walk the whole dex.
+    """
+    try:
+        limit = int(request.GET.get('limit', API_DEFAULT_LIMIT))
+    except ValueError:
+        limit = 0
+    if not 1 <= limit <= API_MAX_LIMIT:
+        return JsonResponse({'error': f"limit must be an integer between 1 and {API_MAX_LIMIT}."}, status=400)
+
+    after_id = None
+    cursor = request.GET.get('cursor')
+    if cursor:
+        try:
+            direction, after_id = decode_cursor(cursor)
+        except InvalidCursor:
+            direction = None
+        if direction != NEXT:
+            return JsonResponse({'error': "Invalid cursor."}, status=400)
+
+    pokemon_queryset = Pokemon.objects.all()
+    filter_params = {}
+    if request.GET.get('type'):
+        filter_params['type'] = request.GET['type'].lower()
+        pokemon_queryset = pokemon_queryset.filter(types__name=filter_params['type'])
+    if request.GET.get('ability'):
+        filter_params['ability'] = request.GET['ability'].lower()
+        pokemon_queryset = pokemon_queryset.filter(abilities__name=filter_params['ability'])
+
+    def next_url_for(last_id):
+        params = dict(filter_params, limit=limit, cursor=encode_cursor(NEXT, last_id))
+        return request.build_absolute_uri(f"{reverse('api_pokemon_list')}?{urlencode(params)}")
+
+    return StreamingHttpResponse(
+        _stream_pokemon_json(pokemon_queryset, after_id, limit, next_url_for), content_type='application/json'
+    )
+
+AUTOCOMPLETE_MAX_LIMIT = 25
+
+def api_pokemon_autocomplete(request):
+    """
+    JSON name suggestions for a search box: names starting with q first, then close matches for typos.
+    Answered from the in-process search index, whose PokeAPI name list is refreshed in the background, so it
+    never waits on PokeAPI. Query params: q, limit (default 10, max 25).
+    """
+    query_name = normalize_name(request.GET.get('q', ''))
+    try:
+        limit = min(max(int(request.GET.get('limit', 10)), 1), AUTOCOMPLETE_MAX_LIMIT)
+    except ValueError:
+        return JsonResponse({'error': "limit must be an integer."}, status=400)
+    names = search_index.suggest(query_name, limit) if query_name else []
+    return JsonResponse({
+        'query': query_name,
+        # id is None for names that exist upstream but have not been synced into the DB yet
+        'results': [{'name': name, 'id': search_index.ids.get(name)} for name in names],
+    })
+
+TOP_MAX_LIMIT = 100
+
+def api_pokemon_top(request):
+    """
+    JSON ranking of synced Pokemon by one base stat (or 'total'), highest first, e.g. the ten fastest
+    Fire types. Answered from the in-process stats matrix and filter index without loading any stats JSON.
+    Query params: stat (required), type_filter_name and ability_filter_name (repeatable), type_match, limit (default 10, max 100).
+    """
+    stat_name = request.GET.get('stat', '')
+    if stat_name != TOTAL and stat_name not in STAT_NAMES:
+        return JsonResponse({'error': f"stat must be one of: {', '.join(STAT_NAMES + (TOTAL,))}."}, status=400)
+    try:
+        limit = min(max(int(request.GET.get('limit', 10)), 1), TOP_MAX_LIMIT)
+    except ValueError:
+        return JsonResponse({'error': "limit must be an integer."}, status=400)
+    type_names = _filter_names(request, 'type_filter_name')
+    ability_names = _filter_names(request, 'ability_filter_name')
+    bits = None
+    if type_names or ability_names:
+        bits = filter_index.match(type_names=type_names, type_match=_type_match(request), ability_names=ability_names)
+    return JsonResponse({
+        'stat': stat_name,
+        'results': [
+            {'name': name, 'id': pokeapi_id, 'value': value}
+            for name, pokeapi_id, value in stats_matrix.top(stat_name, limit, bits)
+        ],
+    })
+
+def api_pokemon_similar(request, pokemon_name):
+    """
+    JSON list of the Pokemon with the most similar base stats to pokemon_name, closest first, with their
+    distance in standard deviations. Query params: limit (default 6, max 50), same_type=1 to only
+    consider Pokemon sharing a type with it. 404 when the Pokemon has no stats in the local DB.
+    """
+    name = normalize_name(pokemon_name)
+    try:
+        limit = min(max(int(request.GET.get('limit', SIMILAR_PANEL_SIZE)), 1), SIMILAR_MAX_LIMIT)
+    except ValueError:
+        return JsonResponse({'error': "limit must be an integer."}, status=400)
+    pokeapi_id = Pokemon.objects.filter(name=name, stat_total__isnull=False).values_list('pokeapi_id', flat=True).first()
+    if pokeapi_id is None:
+        return JsonResponse({'error': f"No stats for {name} in the local Pokedex."}, status=404)
+    same_type = request.GET.get('same_type') in ('1', 'true')
+    return JsonResponse({
+        'name': name,
+        'same_type': same_type,
+        'results': [
+            {key: neighbour[key] for key in ('name', 'id', 'distance')}
+            for neighbour in _similar_pokemon(name, pokeapi_id, limit, same_type=same_type)
+        ],
+    })
+
+MATCHUP_MAX_MEMBERS = 50
+
+def api_type_matchup(request):
+    """
+    JSON type matchups of a team in one pass over the in-process type chart: for each member, the multiplier
+    every attacking type deals to it (a dual type multiplies both), and the best multiplier the team's own
+    types deal to each type. Members are repeated pokemon= names (their types come from the local DB) and/or
+    repeated types= combinations such as types=fire,flying, at most 50 in all. Type relations not stored
+    yet are fetched from PokeAPI; the ones that still could not be are listed in unsynced_types.
+    """
+    pokemon_names = list(dict.fromkeys(normalize_name(name) for name in request.GET.getlist('pokemon') if name.strip()))
+    type_combinations = [
+        [normalize_name(type_name) for type_name in raw_types.split(',') if type_name.strip()]
+        for raw_types in request.GET.getlist('types')
+    ]
+    type_combinations = [type_names for type_names in type_combinations if type_names]
+    if not pokemon_names and not type_combinations:
+        return JsonResponse({'error': "Give at least one pokemon or types parameter."}, status=400)
+    if len(pokemon_names) + len(type_combinations) > MATCHUP_MAX_MEMBERS:
+        return JsonResponse({'error': f"At most {MATCHUP_MAX_MEMBERS} team members."}, status=400)
+
+    known_names = set(Pokemon.objects.filter(name__in=pokemon_names).values_list('name', flat=True))
+    unknown_names = [name for name in pokemon_names if name not in known_names]
+    if unknown_names:
+        return JsonResponse({'error': f"Not in the local Pokedex: {', '.join(unknown_names)}."}, status=404)
+    type_names_by_pokemon = {name: [] for name in pokemon_names}
+    type_rows = (
+        Pokemon.types.through.objects.filter(pokemon__name__in=pokemon_names)
+        .order_by('pk') # Insertion order, i.e. the slot order of the API payload
+        .values_list('pokemon__name', 'type__name')
+    )
+    for name, type_name in type_rows:
+        type_names_by_pokemon[name].append(type_name)
+    members = list(type_names_by_pokemon.items()) + [('/'.join(type_names), type_names) for type_names in type_combinations]
+
+    unsynced_types = hydrate_type_relations(type_name for _, type_names in members for type_name in type_names)
+    matchup = type_chart.matchup([type_names for _, type_names in members])
+    type_order = list(matchup['types'])
+    results = []
+    for (name, type_names), multipliers in zip(members, matchup['defensive'].tolist()):
+        by_type = dict(zip(type_order, multipliers))
+        results.append({
+            'name': name,
+            'types': type_names,
+            'multipliers': by_type,
+            'weak_to': [type_name for type_name, multiplier in by_type.items() if multiplier > 1],
+            'resists': [type_name for type_name, multiplier in by_type.items() if 0 < multiplier < 1],
+            'immune_to': [type_name for type_name, multiplier in by_type.items() if multiplier == 0],
+        })
+    return JsonResponse({
+        'types': type_order,
+        'results': results,
+        'coverage': dict(zip(type_order, matchup['coverage'].tolist())),
+        'unsynced_types': unsynced_types,
+    })
+
+SPRITE_SHEET_MAX_AGE = 365 * 24 * 60 * 60 # A sheet URL names its exact contents
+
+def _png_response(request, etag, load_body, max_age, immutable=False):
+    """Helper: A PNG with a strong ETag and Cache-Control, or a 304 when the client's copy has that ETag."""
+    etag = f'"{etag}"'
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = HttpResponse(load_body(), content_type='image/png')
+    response['ETag'] = etag
+    if immutable:
+        patch_cache_control(response, public=True, max_age=max_age, immutable=True)
+    else:
+        patch_cache_control(response, public=True, max_age=max_age)
+    return response
+
+async def pokemon_sprite(request, pokeapi_id):
+    """
+    The sprite of Pokemon #pokeapi_id from the local sprite cache, downloading it on first request.
+    Only sprite URLs stored on a Pokemon are ever fetched. Redirects to the upstream image when it cannot be cached.
+    """
+    sprite_url = await Pokemon.objects.filter(pokeapi_id=pokeapi_id).values_list('sprite_url', flat=True).afirst()
+    if not sprite_url:
+        raise Http404(f"No sprite for Pokemon #{pokeapi_id}.")
+    sprite = await sprite_store.afetch(sprite_url)
+    if sprite is None:
+        return redirect(sprite_url)
+    # The file is read in a worker thread, off the event loop (a 304 reads nothing)
+    return await sync_to_async(_png_response, thread_sensitive=False)(
+        request, sprite.digest, sprite_store.object_path(sprite.digest).read_bytes, settings.POKEDEX_SPRITE_MAX_AGE
+    )
+
+def pokemon_sprite_sheet(request, sheet_key):
+    """
+    A list page's sprite sheet: the sprites of ?ids=1,2,3 side by side, built from the local cache only.
+    sheet_key is the hash of its members' sprites; 404 when the ids no longer make that sheet.
+    """
+    if get_conditional_response(request, etag=f'"{sheet_key}"') is not None:
+        # The key names the contents, so a client holding it needs nothing looked up
+        return _png_response(request, sheet_key, None, SPRITE_SHEET_MAX_AGE, immutable=True)
+    try:
+        ids = [int(pokeapi_id) for pokeapi_id in request.GET.get('ids', '').split(',')]
+    except ValueError:
+        raise Http404("ids must be comma-separated Pokemon ids.")
+    if len(ids) > SHEET_MAX_MEMBERS:
+        raise Http404(f"A sprite sheet has at most {SHEET_MAX_MEMBERS} members.")
+    sprite_urls = dict(Pokemon.objects.filter(pokeapi_id__in=ids).values_list('pokeapi_id', 'sprite_url'))
+    sprites = [sprite_store.lookup(sprite_urls[pokeapi_id]) if sprite_urls.get(pokeapi_id) else None for pokeapi_id in ids]
+    if None in sprites or not all(map(sprite_store.fits_sheet, sprites)) or sprite_store.sheet_key(sprites) != sheet_key:
+        raise Http404("No such sprite sheet.")
+    return _png_response(request, sheet_key, lambda: sprite_store.sheet(sprites), SPRITE_SHEET_MAX_AGE, immutable=True)
+
+def _process_metrics():
+    """Helper: (name, type, help, value) for the process-wide PokeAPI client and response cache figures."""
+    client = pokeapi.stats.snapshot()
+    extra = [
+        ('pokedex_pokeapi_client_requests_total', 'counter', 'PokeAPI calls made by this process, background work included.', client['requests']),
+        ('pokedex_pokeapi_client_retries_total', 'counter', 'PokeAPI retries made by this process.', client['retries']),
+        ('pokedex_pokeapi_client_errors_total', 'counter', 'PokeAPI calls that failed (connection error, timeout or 5xx).', client['errors']),
+        ('pokedex_pokeapi_client_short_circuited_total', 'counter', 'PokeAPI calls refused by the open circuit breaker.', client['short_circuited']),
+        ('pokedex_pokeapi_breaker_open', 'gauge', '1 while the PokeAPI circuit breaker is open or half-open.', pokeapi.breaker.state != pokeapi.CircuitBreaker.CLOSED),
+        ('pokedex_pokeapi_breaker_trips_total', 'counter', 'Times the PokeAPI circuit breaker opened.', pokeapi.breaker.trips),
+    ]
+    for field, value in response_cache.stats.snapshot().items():
+        extra.append((f'pokedex_response_cache_{field}_total', 'counter', f'PokeAPI response cache {field.replace("_", " ")}.', value))
+    for field, value in response_cache.sizes().items():
+        extra.append((f'pokedex_response_cache_{field}', 'gauge', f'PokeAPI response cache {field.replace("_", " ")}.', value))
+    memory = process_memory()
+    if memory is not None:
+        extra += [
+            ('pokedex_process_resident_memory_bytes', 'gauge', 'Resident memory of this worker, pages shared with other workers included.', memory[0]),
+            ('pokedex_process_private_memory_bytes', 'gauge', 'Memory of this worker shared with no other process.', memory[1]),
+        ]
+    return extra
+
+def metrics(request):
+    """
+    This worker's request metrics (see instrumentation.py) in the Prometheus text format.
+    Only answered to the addresses in POKEDEX_METRICS_ALLOWED_IPS.
+    """
+    if request.META.get('REMOTE_ADDR') not in settings.POKEDEX_METRICS_ALLOWED_IPS:
+        return HttpResponseForbidden("Metrics are only served to local addresses.")
+    return HttpResponse(registry.render(_process_metrics()), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,45 @@
+"""
+In-process cache of the list page's filter vocabularies (every Type and Ability name).
+
+The names change only when a sync adds a type or ability, yet the dropdowns are rendered on
+every list request. Each worker keeps the sorted names in memory, tagged with a version number
+stored in the Django cache; signals.py bumps that version whenever Type or Ability rows change,
+and every worker reloads its copy on its next read.
+"""
+import threading
+import time
+
+from django.core.cache import cache
+
+VERSION_KEY = 'pokedex:vocabulary:version'
+
+_lock = threading.Lock()
+_vocabularies = {} # model label -> (version, tuple of names)
+
+
+def version():
+    value = cache.get(VERSION_KEY)
+    if value is None:
+        cache.add(VERSION_KEY, time.time_ns(), None)
+        value = cache.get(VERSION_KEY)
+    return value
+
+
+def invalidate_vocabularies():
+    cache.set(VERSION_KEY, time.time_ns(), None)
+
+
+def filter_vocabulary(model):
+    """Sorted names of every row of model (Type or Ability). One query when stale, none otherwise."""
+    current_version = version()
+    label = model._meta.label
+    with _lock:
+        cached = _vocabularies.get(label)
+    if cached is not None and cached[0] == current_version:
+        return cached[1]
+
+    # Tagged with the version read *before* the query, so a change racing with it triggers another reload
+    names = tuple(model.objects.order_by('name').values_list('name', flat=True))
+    with _lock:
+        _vocabularies[label] = (current_version, names)
+    return names
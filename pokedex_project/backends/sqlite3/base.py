@@ -0,0 +1,31 @@
+"""
+Django's SQLite backend, tuned for several workers writing to one database file.
+
+Two extra OPTIONS, named as in Django 5.1's own SQLite backend so they carry over unchanged:
+  - init_command: ';'-separated statements run on every new connection (the PRAGMAs in settings.py).
+  - transaction_mode: how atomic() blocks BEGIN. 'IMMEDIATE' takes the write lock up front, so a
+    writer waits out the busy timeout for its turn; with the default DEFERRED, a transaction that
+    read first and then writes fails at once with "database is locked" when another writer is active.
+"""
+from django.db.backends.sqlite3 import base
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    def get_connection_params(self):
+        params = super().get_connection_params()
+        self.init_command = params.pop('init_command', '')
+        self.transaction_mode = params.pop('transaction_mode', None)
+        return params
+
+    def get_new_connection(self, conn_params):
+        conn = super().get_new_connection(conn_params)
+        for statement in self.init_command.split(';'):
+            if statement.strip():
+                conn.execute(statement)
+        return conn
+
+    def _start_transaction_under_autocommit(self):
+        if self.transaction_mode:
+            self.cursor().execute(f'BEGIN {self.transaction_mode}')
+        else:
+            super()._start_transaction_under_autocommit()
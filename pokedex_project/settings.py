@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/4.0/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -20,12 +21,12 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 # See https://docs.djangoproject.com/en/4.0/howto/deployment/checklist/
 
 # SECURITY WARNING: keep the secret key used in production secret!
-SECRET_KEY = 'django-insecure-q+)+z6shyf@xhz^ca1q@yzto@@e!fc0e8c$_db)kga+xfbgyov'
+SECRET_KEY = os.environ.get('POKEDEX_SECRET_KEY', 'django-insecure-q+)+z6shyf@xhz^ca1q@yzto@@e!fc0e8c$_db)kga+xfbgyov')
 
-# SECURITY WARNING: don't run with debug turned on in production!
-DEBUG = True
+# SECURITY WARNING: don't run with debug turned on in production! (The Docker image sets POKEDEX_DEBUG=0.)
+DEBUG = os.environ.get('POKEDEX_DEBUG', '1') == '1'
 
-ALLOWED_HOSTS = []
+ALLOWED_HOSTS = [host.strip() for host in os.environ.get('POKEDEX_ALLOWED_HOSTS', '').split(',') if host.strip()]
 
 
 # Application definition
@@ -41,7 +42,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'pokedex_app.instrumentation.request_metrics_middleware', # First, so it times the whole request
     'django.middleware.security.SecurityMiddleware',
+    'pokedex_project.static_files.StaticFilesMiddleware', # Before the rest, so static files skip sessions and auth
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -73,13 +76,89 @@ WSGI_APPLICATION = 'pokedex_project.wsgi.application'
 
 # Database
 # https://docs.djangoproject.com/en/4.0/ref/settings/#databases
+# POKEDEX_DB_BACKEND: 'sqlite' (default, one file; fine for a single host) or 'postgres' (any number of
+# hosts; needs psycopg2 or psycopg installed, and POKEDEX_DB_NAME/USER/PASSWORD/HOST/PORT).
+
+POKEDEX_DB_BACKEND = os.environ.get('POKEDEX_DB_BACKEND', 'sqlite')
+# Seconds a worker keeps its DB connection open across requests (0 reconnects for every request).
+# Connections are health-checked before they are reused.
+POKEDEX_DB_CONN_MAX_AGE = int(os.environ.get('POKEDEX_DB_CONN_MAX_AGE', 60))
+
+if POKEDEX_DB_BACKEND == 'postgres':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.environ.get('POKEDEX_DB_NAME', 'pokedex'),
+            'USER': os.environ.get('POKEDEX_DB_USER', 'pokedex'),
+            'PASSWORD': os.environ.get('POKEDEX_DB_PASSWORD', ''),
+            'HOST': os.environ.get('POKEDEX_DB_HOST', '127.0.0.1'),
+            'PORT': os.environ.get('POKEDEX_DB_PORT', '5432'),
+            'CONN_MAX_AGE': POKEDEX_DB_CONN_MAX_AGE,
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {'connect_timeout': int(os.environ.get('POKEDEX_DB_CONNECT_TIMEOUT', 5))},
+        }
+    }
+else:
+    # WAL lets readers carry on while one connection writes; synchronous=NORMAL is safe with WAL (a crash
+    # can lose the last commits, never corrupt the file) and saves an fsync per commit; mmap reads pages
+    # without copying them. Writers wait up to POKEDEX_SQLITE_BUSY_TIMEOUT seconds for the write lock,
+    # which BEGIN IMMEDIATE takes at the start of each transaction (pokedex_project/backends/sqlite3).
+    DATABASES = {
+        'default': {
+            'ENGINE': 'pokedex_project.backends.sqlite3',
+            'NAME': os.environ.get('POKEDEX_DB_NAME', str(BASE_DIR / 'db.sqlite3')),
+            'CONN_MAX_AGE': POKEDEX_DB_CONN_MAX_AGE,
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {
+                'timeout': float(os.environ.get('POKEDEX_SQLITE_BUSY_TIMEOUT', 20)),
+                'transaction_mode': 'IMMEDIATE',
+                'init_command': '; '.join([
+                    'PRAGMA journal_mode = WAL',
+                    'PRAGMA synchronous = NORMAL',
+                    f"PRAGMA mmap_size = {int(os.environ.get('POKEDEX_SQLITE_MMAP_SIZE', 256 * 1024 * 1024))}",
+                    'PRAGMA cache_size = -20000', # KiB, per connection
+                    'PRAGMA temp_store = MEMORY',
+                ]),
+            },
+        }
+    }
+
+
+# Cache
+# https://docs.djangoproject.com/en/4.0/topics/cache/
+# POKEDEX_CACHE_BACKEND: 'locmem' (default, per process), 'file' (shared by the workers of one host)
+# or 'redis' (shared by every host; any Redis-compatible server works).
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+POKEDEX_CACHE_BACKEND = os.environ.get('POKEDEX_CACHE_BACKEND', 'locmem')
+
+if POKEDEX_CACHE_BACKEND == 'file':
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': os.environ.get('POKEDEX_CACHE_LOCATION', str(BASE_DIR / '.django_cache')),
+        }
+    }
+elif POKEDEX_CACHE_BACKEND == 'redis':
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ.get('POKEDEX_CACHE_LOCATION', 'redis://127.0.0.1:6379'),
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'pokedex',
+            'OPTIONS': {'MAX_ENTRIES': 5000},
+        }
     }
-}
+
+# Seconds a rendered detail/list/compare page stays cached. Data changes invalidate it
+# earlier (pokedex_app/signals.py), so this is only a safety net.
+POKEDEX_PAGE_CACHE_TIMEOUT = int(os.environ.get('POKEDEX_PAGE_CACHE_TIMEOUT', 15 * 60))
+# Seconds the rendered evolution chain fragment stays cached
+POKEDEX_FRAGMENT_CACHE_TIMEOUT = int(os.environ.get('POKEDEX_FRAGMENT_CACHE_TIMEOUT', 24 * 60 * 60))
 
 
 # Password validation
@@ -117,8 +196,126 @@ USE_TZ = True
 # https://docs.djangoproject.com/en/4.0/howto/static-files/
 
 STATIC_URL = 'static/'
+STATIC_ROOT = BASE_DIR / 'staticfiles' # Filled by `manage.py collectstatic`, served by StaticFilesMiddleware
+
+# Without DEBUG, static files get content-hashed names and compressed copies (collectstatic must have run);
+# with it, Django's plain storage serves them from the apps' static/ directories as they are.
+STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {
+        'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage' if DEBUG
+        else 'whitenoise.storage.CompressedManifestStaticFilesStorage',
+    },
+}
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.0/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+
+# PokeAPI integration
+
+# Point this at a local stub server for tests and benchmarks
+POKEAPI_BASE_URL = os.environ.get('POKEAPI_BASE_URL', 'https://pokeapi.co/api/v2/')
+
+# Seconds; a stalled upstream socket must never pin a worker
+POKEAPI_CONNECT_TIMEOUT = float(os.environ.get('POKEAPI_CONNECT_TIMEOUT', 3.05))
+POKEAPI_READ_TIMEOUT = float(os.environ.get('POKEAPI_READ_TIMEOUT', 10))
+
+# Retries (with exponential backoff) on connection errors, 429 and 5xx responses
+POKEAPI_MAX_RETRIES = int(os.environ.get('POKEAPI_MAX_RETRIES', 3))
+POKEAPI_RETRY_BACKOFF = float(os.environ.get('POKEAPI_RETRY_BACKOFF', 0.3))
+
+# Upper bound on concurrent PokeAPI requests when hydrating many Pokemon at once (e.g. type filter)
+POKEAPI_MAX_CONCURRENCY = int(os.environ.get('POKEAPI_MAX_CONCURRENCY', 8))
+
+# Keep-alive connections held per host; no smaller than the hydration fan-out
+POKEAPI_POOL_SIZE = max(10, POKEAPI_MAX_CONCURRENCY)
+
+# Raw response cache under every PokeAPI call (see pokedex_app/response_cache.py).
+# Per-endpoint TTLs in seconds; PokeAPI data is close to static, so they are long.
+POKEAPI_CACHE_TTL = {
+    'default': 60 * 60,
+    'pokemon': 24 * 60 * 60,
+    'pokemon-species': 7 * 24 * 60 * 60,
+    'evolution-chain': 7 * 24 * 60 * 60,
+    'type': 24 * 60 * 60,
+    'ability': 24 * 60 * 60,
+}
+# In-process LRU tier, per worker
+POKEAPI_CACHE_MEMORY_MAX_BYTES = int(os.environ.get('POKEAPI_CACHE_MEMORY_MAX_BYTES', 32 * 1024 * 1024))
+# Persistent tier shared by all workers; set POKEAPI_CACHE_DIR to an empty string to disable it
+POKEAPI_CACHE_DIR = os.environ.get('POKEAPI_CACHE_DIR', str(BASE_DIR / '.pokeapi_cache'))
+POKEAPI_CACHE_DISK_MAX_BYTES = int(os.environ.get('POKEAPI_CACHE_DISK_MAX_BYTES', 512 * 1024 * 1024))
+
+# Negative cache (per worker): how long failed lookups are answered without asking PokeAPI again.
+# 404s (unknown names) are stable; 5xx/429/timeouts are transient, so they are only held briefly.
+POKEAPI_NEGATIVE_TTL_NOT_FOUND = int(os.environ.get('POKEAPI_NEGATIVE_TTL_NOT_FOUND', 6 * 60 * 60))
+POKEAPI_NEGATIVE_TTL_ERROR = int(os.environ.get('POKEAPI_NEGATIVE_TTL_ERROR', 30))
+POKEAPI_NEGATIVE_MAX_ENTRIES = int(os.environ.get('POKEAPI_NEGATIVE_MAX_ENTRIES', 10000))
+
+# Circuit breaker: open when at least BREAKER_MIN_REQUESTS calls in the last BREAKER_WINDOW seconds
+# failed at BREAKER_ERROR_RATE or worse; stay open (failing fast) for BREAKER_COOLDOWN seconds
+POKEAPI_BREAKER_WINDOW = float(os.environ.get('POKEAPI_BREAKER_WINDOW', 30))
+POKEAPI_BREAKER_MIN_REQUESTS = int(os.environ.get('POKEAPI_BREAKER_MIN_REQUESTS', 10))
+POKEAPI_BREAKER_ERROR_RATE = float(os.environ.get('POKEAPI_BREAKER_ERROR_RATE', 0.5))
+POKEAPI_BREAKER_COOLDOWN = float(os.environ.get('POKEAPI_BREAKER_COOLDOWN', 30))
+
+# Stale-while-revalidate: Pokemon synced longer ago than this (seconds) are still served from the DB,
+# and re-synced in the background (pokedex_app/refresh.py)
+POKEDEX_REFRESH_MAX_AGE = int(os.environ.get('POKEDEX_REFRESH_MAX_AGE', 7 * 24 * 60 * 60))
+# 'thread' (background thread pool), 'eager' (inline, for tests/scripts) or 'off'
+POKEDEX_REFRESH_MODE = os.environ.get('POKEDEX_REFRESH_MODE', 'thread')
+POKEDEX_REFRESH_WORKERS = int(os.environ.get('POKEDEX_REFRESH_WORKERS', 2))
+
+# List page pagination: 'numbered' (Paginator, page links) or 'keyset' (Previous/Next cursors; deep pages
+# cost the same as the first). A ?cursor= parameter switches a single request to keyset mode either way.
+POKEDEX_LIST_PAGINATION = os.environ.get('POKEDEX_LIST_PAGINATION', 'numbered')
+
+# Lock files used to coalesce concurrent syncs of the same Pokemon across worker processes
+# (pokedex_app/single_flight.py); an empty string keeps coalescing per process
+POKEDEX_LOCK_DIR = os.environ.get('POKEDEX_LOCK_DIR', str(BASE_DIR / '.pokedex_locks'))
+
+# Local sprite cache (pokedex_app/sprites.py): pages load sprites from /sprites/<id>.png, which downloads
+# each one once into POKEDEX_SPRITE_DIR. POKEDEX_SPRITE_MAX_AGE is the browser cache lifetime in seconds;
+# POKEDEX_SPRITE_SHEETS bundles each list page's sprites into one image. POKEDEX_SPRITE_PROXY=0 hot-links upstream.
+POKEDEX_SPRITE_PROXY = os.environ.get('POKEDEX_SPRITE_PROXY', '1') == '1'
+POKEDEX_SPRITE_DIR = os.environ.get('POKEDEX_SPRITE_DIR', str(BASE_DIR / '.sprite_cache'))
+POKEDEX_SPRITE_MAX_AGE = int(os.environ.get('POKEDEX_SPRITE_MAX_AGE', 30 * 24 * 60 * 60))
+POKEDEX_SPRITE_SHEETS = os.environ.get('POKEDEX_SPRITE_SHEETS', '1') == '1'
+
+# Views seed a sparse DB from PokeAPI on the fly (carousel starters, first 20 for the list,
+# first 151 for compare, type/ability dropdowns). Turn this off once `manage.py import_pokedex`
+# has loaded the full dex so no visitor ever pays for seeding.
+POKEDEX_INLINE_SEEDING = os.environ.get('POKEDEX_INLINE_SEEDING', '1') == '1'
+
+# Request instrumentation (pokedex_app/instrumentation.py): every response carries a Server-Timing header,
+# and /metrics serves this worker's counters in the Prometheus text format to these addresses only.
+POKEDEX_METRICS_ALLOWED_IPS = [
+    address.strip() for address in os.environ.get('POKEDEX_METRICS_ALLOWED_IPS', '127.0.0.1,::1').split(',') if address.strip()
+]
+
+
+# Logging
+# https://docs.djangoproject.com/en/4.0/topics/logging/
+# POKEDEX_LOG_FORMAT: 'plain' (default) or 'json' (one object per line, with the per-request metrics
+# as fields). The 'pokedex_app.requests' logger writes one line per request at INFO.
+
+POKEDEX_LOG_FORMAT = os.environ.get('POKEDEX_LOG_FORMAT', 'plain')
+POKEDEX_LOG_LEVEL = os.environ.get('POKEDEX_LOG_LEVEL', 'INFO')
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'plain': {'format': '%(asctime)s %(levelname)s %(name)s: %(message)s'},
+        'json': {'()': 'pokedex_app.instrumentation.JsonFormatter'},
+    },
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler', 'formatter': POKEDEX_LOG_FORMAT},
+    },
+    'loggers': {
+        'pokedex_app': {'handlers': ['console'], 'level': POKEDEX_LOG_LEVEL, 'propagate': False},
+    },
+}
@@ -0,0 +1,50 @@
+"""
+Static files for the production server: WhiteNoise, from STATIC_ROOT as filled by collectstatic.
+
+With the manifest storage (settings.py, when DEBUG is off) every file is served under a content
+hash (base.<hash>.css) with a year-long immutable Cache-Control, plus the gzip copies (and Brotli,
+with the brotli package installed) collectstatic wrote, picked by Accept-Encoding.
+
+WhiteNoiseMiddleware is sync-only. Under an ASGI server Django would then run every request,
+not only static ones, through a thread switch around it; this subclass also answers from the
+event loop, and only hands the file read itself to a thread.
+"""
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from whitenoise.middleware import WhiteNoiseMiddleware
+
+
+class StaticFilesMiddleware(WhiteNoiseMiddleware):
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response=None, *args, **kwargs):
+        super().__init__(get_response, *args, **kwargs)
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return super().__call__(request)
+
+    async def __acall__(self, request):
+        if self.autorefresh:
+            static_file = await sync_to_async(self.find_file, thread_sensitive=False)(request.path_info)
+        else:
+            static_file = self.files.get(request.path_info)
+        if static_file is None:
+            return await self.get_response(request)
+        response = await sync_to_async(self.serve, thread_sensitive=False)(static_file, request)
+        if response.streaming and getattr(response, 'file_to_stream', None) is not None:
+            # The file stays in the response's closers, so it is still closed once sent
+            response.streaming_content = _read_async(response.file_to_stream, response.block_size)
+        return response
+
+
+async def _read_async(file, block_size):
+    read = sync_to_async(file.read, thread_sensitive=False)
+    while True:
+        chunk = await read(block_size)
+        if not chunk:
+            break
+        yield chunk
@@ -20,5 +20,13 @@ from pokedex_app import views as pokedex_views
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('pokemon/', include('pokedex_app.urls')),
+    path('api/pokemon/', pokedex_views.api_pokemon_list, name='api_pokemon_list'),
+    path('api/pokemon/autocomplete/', pokedex_views.api_pokemon_autocomplete, name='api_pokemon_autocomplete'),
+    path('api/pokemon/top/', pokedex_views.api_pokemon_top, name='api_pokemon_top'),
+    path('api/pokemon/<str:pokemon_name>/similar/', pokedex_views.api_pokemon_similar, name='api_pokemon_similar'),
+    path('api/matchup/', pokedex_views.api_type_matchup, name='api_type_matchup'),
+    path('sprites/<int:pokeapi_id>.png', pokedex_views.pokemon_sprite, name='pokemon_sprite'),
+    path('sprites/sheets/<str:sheet_key>.png', pokedex_views.pokemon_sprite_sheet, name='pokemon_sprite_sheet'),
+    path('metrics', pokedex_views.metrics, name='metrics'),
     path('', pokedex_views.index, name='index'),
 ]